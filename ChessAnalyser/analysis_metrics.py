@@ -0,0 +1,172 @@
+# analysis_metrics.py
+"""
+Prometheus metrics for the long-running analysis service.
+
+Counters and histograms are updated where events happen; point-in-time values
+(idle engines, queue depths, loaded models) are registered as callbacks and
+read when /metrics is scraped. render() produces the Prometheus text
+exposition format (version 0.0.4).
+"""
+import threading
+from bisect import bisect_left
+
+from ml_training.timings import BUCKET_BOUNDS_MS, histograms as stage_histograms
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join('{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"')) for k, v in labels)
+    return "{" + pairs + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type_name = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram:
+    type_name = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        result = []
+        for key, counts, total, count in series:
+            result += _histogram_samples(self.name, key, self.buckets, counts, total, count)
+        return result
+
+
+def _histogram_samples(name, key, bounds, counts, total, count):
+    samples = []
+    cumulative = 0
+    for bound, n in zip((*bounds, float("inf")), counts):
+        cumulative += n
+        samples.append((name + "_bucket", key + (("le", _format_value(bound)),), cumulative))
+    samples.append((name + "_sum", key, total))
+    samples.append((name + "_count", key, count))
+    return samples
+
+
+class Callback:
+    """Metric whose value(s) are read from func() at scrape time: a number or {labels tuple: number}."""
+
+    def __init__(self, name, help_text, func, type_name="gauge"):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.type_name = type_name
+
+    def samples(self):
+        value = self.func()
+        if isinstance(value, dict):
+            return [(self.name, tuple(sorted(labels)), v) for labels, v in value.items()]
+        return [(self.name, (), value)]
+
+
+class StageHistograms:
+    """Exports the per-stage timing histograms from ml_training/timings.py, in seconds."""
+
+    type_name = "histogram"
+    name = "chess_analysis_stage_duration_seconds"
+    help = "Duration of each analysis stage, for requests with timings enabled"
+
+    def samples(self):
+        bounds = tuple(ms / 1000 for ms in BUCKET_BOUNDS_MS)
+        result = []
+        for stage, histogram in stage_histograms().items():
+            result += _histogram_samples(self.name, (("stage", stage),), bounds, histogram.buckets,
+                                         histogram.sum_ms / 1000, histogram.count)
+        return result
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# --- Metrics recorded by the service ---
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.register(Counter(
+    "chess_analysis_requests_total", "HTTP requests by endpoint and status code"))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    "chess_analysis_request_duration_seconds", "HTTP request latency by endpoint"))
+ANALYSES = REGISTRY.register(Counter(
+    "chess_analysis_analyses_total", "Position analyses by outcome"))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "chess_analysis_cache_requests_total", "Result cache lookups by cache and result (hit/miss)"))
+ENGINE_CHECKOUTS = REGISTRY.register(Counter(
+    "chess_analysis_engine_checkouts_total", "Engines checked out of the pool"))
+ENGINE_CHECKOUT_WAIT = REGISTRY.register(Histogram(
+    "chess_analysis_engine_checkout_wait_seconds", "Time spent waiting for a free engine"))
+ENGINE_RESTARTS = REGISTRY.register(Counter(
+    "chess_analysis_engine_restarts_total", "Engines replaced after they stopped responding"))
+OPENING_INDEX_HITS = REGISTRY.register(Counter(
+    "chess_analysis_opening_index_hits_total", "Analyses answered from the precomputed opening index"))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "chess_analysis_predict_batch_size", "Rows per micro-batched model prediction", BATCH_SIZE_BUCKETS))
+REGISTRY.register(StageHistograms())
+
+
+def register_callback(name, help_text, func, type_name="gauge"):
+    return REGISTRY.register(Callback(name, help_text, func, type_name))
+
+
+def render():
+    return REGISTRY.render()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# analysis_server.py
+"""
+Resident HTTP analysis server (asyncio, standard library only).
+
+Endpoints:
+    POST /api/analyze-chess-position   {"fen", "avgElo", "timeControl"} -> same JSON as chess_analyzer_wrapper.py
+    POST /api/analyze-batch            {"positions": [{"fen", "avgElo", "timeControl"}, ...]} -> {"results": [...]}
+    POST /api/analyze-progressive      same body as analyze-chess-position -> one result per search depth, streamed
+    GET  /api/health
+    GET  /api/timings                  running per-stage timing histograms
+    GET  /metrics                      Prometheus metrics
+
+Add "timings": true to an analysis request body to get per-stage timings in its result,
+and "width": K to search only the engine's top K moves at full depth (faster, with
+slightly less accurate engine features). "tier": "fast" skips Stockfish and predicts
+from the static features with the fast-tier models; results carry the "tier" used.
+"deadlineMs": N returns within about N ms with the deepest search completed by
+then ("depth_reached").
+
+Run with:
+    python analysis_server.py --port 3002 --engines 4
+
+The progressive endpoint streams JSON lines (application/x-ndjson), or Server-Sent
+Events when the request sends "Accept: text/event-stream". Each result has "depth"
+and "final"; the shallow first one arrives within a few tens of milliseconds.
+
+The Node backend forwards to it when CHESS_ANALYSIS_SERVICE_URL is set.
+"""
+import argparse
+import asyncio
+import json
+import time
+from http import HTTPStatus
+
+import analysis_metrics as metrics
+from ml_training.timings import histogram_snapshot
+from analysis_service import AnalysisService, DEFAULT_BATCH_WINDOW_MS, DEFAULT_ENGINES, DEFAULT_MAX_BATCH, STOCKFISH_PATH, TIERS
+
+MAX_BODY_BYTES = 1 << 20
+MAX_BATCH_SIZE = 256
+MISSING_PARAMS_ERROR = "Missing required parameters: fen, avgElo, timeControl"
+
+
+class BadRequest(Exception):
+    pass
+
+
+def parse_position(payload):
+    """(fen, avg_elo, time_control) from a request object, as the Node backend accepts it."""
+    if not isinstance(payload, dict):
+        raise BadRequest(MISSING_PARAMS_ERROR)
+    fen = payload.get("fen")
+    avg_elo = payload.get("avgElo")
+    time_control = payload.get("timeControl")
+    if not fen or avg_elo is None or not time_control:
+        raise BadRequest(MISSING_PARAMS_ERROR)
+    try:
+        avg_elo = int(avg_elo)
+    except (TypeError, ValueError):
+        raise BadRequest("avgElo must be an integer")
+    return fen, avg_elo, time_control
+
+
+def parse_width(payload):
+    """Optional selective search width from a request object."""
+    width = payload.get("width")
+    if width is None:
+        return None
+    if not isinstance(width, int) or isinstance(width, bool) or width < 1:
+        raise BadRequest("width must be a positive integer")
+    return width
+
+
+def parse_deadline(payload):
+    """Optional deadline in milliseconds from a request object."""
+    deadline_ms = payload.get("deadlineMs")
+    if deadline_ms is None:
+        return None
+    if not isinstance(deadline_ms, (int, float)) or isinstance(deadline_ms, bool) or deadline_ms <= 0:
+        raise BadRequest("deadlineMs must be a positive number")
+    return deadline_ms
+
+
+def parse_tier(payload):
+    tier = payload.get("tier", "full")
+    if tier not in TIERS:
+        raise BadRequest(f"tier must be one of: {', '.join(TIERS)}")
+    return tier
+
+
+class AnalysisServer:
+    def __init__(self, service):
+        self.service = service
+        self.routes = {
+            ("POST", "/api/analyze-chess-position"): self.handle_analyze,
+            ("POST", "/api/analyze-batch"): self.handle_batch,
+            ("POST", "/api/analyze-progressive"): self.handle_progressive,
+            ("GET", "/api/health"): self.handle_health,
+            ("GET", "/api/timings"): self.handle_timings,
+            ("GET", "/metrics"): self.handle_metrics,
+        }
+
+    # --- Handlers: (payload) -> (status, body) ---
+    async def handle_analyze(self, payload):
+        position = parse_position(payload)
+        return HTTPStatus.OK, await self.service.analyze(
+            *position, timings=payload.get("timings") is True, width=parse_width(payload), tier=parse_tier(payload),
+            deadline_ms=parse_deadline(payload))
+
+    async def handle_batch(self, payload):
+        items = payload.get("positions") if isinstance(payload, dict) else None
+        if not isinstance(items, list):
+            raise BadRequest("Missing required parameter: positions")
+        if len(items) > MAX_BATCH_SIZE:
+            raise BadRequest(f"At most {MAX_BATCH_SIZE} positions per batch")
+        width = parse_width(payload)
+        tier = parse_tier(payload)
+        deadline_ms = parse_deadline(payload)
+
+        # Invalid entries get an error result in place instead of failing the whole batch
+        results = [None] * len(items)
+        valid = []
+        for i, item in enumerate(items):
+            try:
+                valid.append((i, parse_position(item)))
+            except BadRequest as e:
+                results[i] = {"success": False, "error": str(e)}
+        analyzed = await self.service.analyze_batch([position for _, position in valid],
+                                                    timings=payload.get("timings") is True, width=width, tier=tier,
+                                                    deadline_ms=deadline_ms)
+        for (i, _), result in zip(valid, analyzed):
+            results[i] = result
+        return HTTPStatus.OK, {"results": results}
+
+    async def handle_progressive(self, payload):
+        # An async iterator body is streamed, one result per event
+        position = parse_position(payload)
+        return HTTPStatus.OK, self.service.analyze_progressive(
+            *position, width=parse_width(payload), tier=parse_tier(payload), timings=payload.get("timings") is True,
+            deadline_ms=parse_deadline(payload))
+
+    async def handle_health(self, payload):
+        return HTTPStatus.OK, {"status": "ok", "message": "Chess Analyzer service is running"}
+
+    async def handle_timings(self, payload):
+        return HTTPStatus.OK, histogram_snapshot()
+
+    async def handle_metrics(self, payload):
+        # A str body is sent as-is instead of as JSON
+        return HTTPStatus.OK, metrics.render()
+
+    # --- HTTP/1.1 plumbing ---
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                start = time.perf_counter()
+                status, response = await self.dispatch(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if hasattr(response, "__aiter__"):
+                    sse = "text/event-stream" in headers.get("accept", "")
+                    await self.write_stream(writer, status, response, sse, keep_alive)
+                else:
+                    await self.write_response(writer, status, response, keep_alive)
+                endpoint = path if (method, path) in self.routes else "other"
+                metrics.REQUESTS.inc(endpoint=endpoint, status=status.value)
+                metrics.REQUEST_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # Client went away or sent something that is not HTTP
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY_BYTES:
+            raise ConnectionError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), target.split("?", 1)[0], headers, body
+
+    async def dispatch(self, method, path, body):
+        if method == "OPTIONS":
+            return HTTPStatus.NO_CONTENT, None
+        handler = self.routes.get((method, path))
+        if handler is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"Cannot {method} {path}"}
+        try:
+            payload = json.loads(body) if body else {}
+            return await handler(payload)
+        except (BadRequest, json.JSONDecodeError) as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal server error", "details": str(e)}
+
+    def _head(self, status, content_type, keep_alive, length=None):
+        head = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}",
+            f"Content-Length: {length}" if length is not None else "Transfer-Encoding: chunked",
+            # Same as the Node backend's cors() defaults
+            "Access-Control-Allow-Origin: *",
+            "Access-Control-Allow-Methods: GET,HEAD,PUT,PATCH,POST,DELETE",
+            "Access-Control-Allow-Headers: Content-Type",
+            "Connection: " + ("keep-alive" if keep_alive else "close"),
+        ]
+        return ("\r\n".join(head) + "\r\n\r\n").encode("latin-1")
+
+    async def write_response(self, writer, status, body, keep_alive=True):
+        if isinstance(body, str):
+            data, content_type = body.encode("utf-8"), metrics.CONTENT_TYPE
+        else:
+            data, content_type = b"" if body is None else json.dumps(body).encode("utf-8"), "application/json"
+        writer.write(self._head(status, content_type, keep_alive, len(data)) + data)
+        await writer.drain()
+
+    async def write_stream(self, writer, status, events, sse=False, keep_alive=True):
+        """Send each object from an async iterator as a chunk: a JSON line, or an SSE event."""
+        content_type = "text/event-stream" if sse else "application/x-ndjson"
+        writer.write(self._head(status, content_type, keep_alive))
+        try:
+            async for event in events:
+                line = json.dumps(event)
+                data = f"data: {line}\n\n" if sse else line + "\n"
+                chunk = data.encode("utf-8")
+                writer.write(f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n")
+                await writer.drain()
+        finally:
+            # Releases the stream's engine right away if the client went away mid-stream
+            await events.aclose()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+
+async def serve(host, port, stockfish_path, engines, batch_window_ms, max_batch):
+    service = AnalysisService(stockfish_path, engines, batch_window_ms, max_batch)
+    await service.start()
+    server = await asyncio.start_server(AnalysisServer(service).handle_connection, host, port)
+    print(f"🚀 Chess Analyzer service running on http://{host}:{port} ({engines} engines)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Resident chess position analysis server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3002)
+    parser.add_argument("--engines", type=int, default=DEFAULT_ENGINES, help="Stockfish processes kept warm")
+    parser.add_argument("--stockfish", default=STOCKFISH_PATH, help="Stockfish binary (default: $STOCKFISH_PATH)")
+    parser.add_argument("--batch-window-ms", type=float, default=DEFAULT_BATCH_WINDOW_MS,
+                        help="How long model inputs are collected before a batch is predicted")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH,
+                        help="Predict as soon as this many rows are waiting for one model")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.stockfish, args.engines, args.batch_window_ms, args.max_batch))
+    except KeyboardInterrupt:
+        pass
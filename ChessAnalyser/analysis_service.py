@@ -0,0 +1,417 @@
+# analysis_service.py
+"""
+Resident analysis service used by analysis_server.py.
+
+Keeps the models loaded and a pool of warm Stockfish engines, and runs each
+analysis on a worker thread with an engine checked out of the pool. Stockfish
+searches run in the engine processes, so requests overlap even though the
+feature code itself shares the GIL.
+
+Concurrent requests for the same position, Elo range and time control are
+coalesced: they all wait on the one analysis already in flight. Model inputs
+from different requests are micro-batched: rows are collected per model for a
+few milliseconds (or until the batch is full) and each model runs once per batch.
+Fast-tier requests compute static features only and never touch the engine pool.
+analyze_progressive() streams a shallow result first, then refined ones. With a
+deadline_ms, analyze() deepens the search only as far as the deadline allows,
+counting the wait for a free engine.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import chess
+import numpy as np
+
+import analysis_metrics as metrics
+import chess_analyzer_wrapper as wrapper
+from ml_training.engine_replay import open_engine
+from ml_training.timings import StageTimings, record_timings
+
+DEFAULT_ENGINES = max(1, min(4, (os.cpu_count() or 2) // 2))
+DEFAULT_BATCH_WINDOW_MS = 2.0
+DEFAULT_MAX_BATCH = 64
+STOCKFISH_PATH = wrapper.STOCKFISH_PATH
+TIERS = tuple(wrapper.TIER_TARGETS)
+
+
+def analysis_key(fen, avg_elo, time_control):
+    """
+    Key under which identical requests share one analysis: the position without
+    move counters, the Elo bucket (models are per bucket) and the time control.
+    None if the FEN does not parse; such requests are not coalesced.
+    """
+    try:
+        epd = chess.Board(fen).epd()
+    except ValueError:
+        return None
+    return epd, wrapper.categorize_elo(avg_elo), time_control
+
+
+class EnginePool:
+    """Fixed-size pool of running engines. Engines that stop responding are replaced."""
+
+    def __init__(self, stockfish_path=STOCKFISH_PATH, size=DEFAULT_ENGINES):
+        self.stockfish_path = stockfish_path
+        self.size = size
+        self._idle = None
+        self._engines = []
+        self.waiting = 0
+
+    def _open_engine(self):
+        return open_engine(self.stockfish_path)
+
+    async def start(self, executor=None):
+        loop = asyncio.get_running_loop()
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            engine = await loop.run_in_executor(executor, self._open_engine)
+            self._engines.append(engine)
+            self._idle.put_nowait(engine)
+
+    async def acquire(self):
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            engine = await self._idle.get()
+        finally:
+            self.waiting -= 1
+        metrics.ENGINE_CHECKOUTS.inc()
+        metrics.ENGINE_CHECKOUT_WAIT.observe(time.perf_counter() - start)
+        return engine
+
+    def idle(self):
+        return self._idle.qsize() if self._idle is not None else 0
+
+    async def release(self, engine, check=False, executor=None):
+        """Return an engine to the pool; with check=True it is pinged first and replaced if dead."""
+        if check:
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(executor, engine.ping)
+            except Exception:
+                engine = await loop.run_in_executor(executor, self._replace, engine)
+        self._idle.put_nowait(engine)
+
+    def _replace(self, engine):
+        metrics.ENGINE_RESTARTS.inc()
+        try:
+            engine.quit()
+        except Exception:
+            pass
+        new_engine = self._open_engine()
+        self._engines[self._engines.index(engine)] = new_engine
+        return new_engine
+
+    def close(self):
+        for engine in self._engines:
+            try:
+                engine.quit()
+            except Exception:
+                pass
+        self._engines.clear()
+
+
+class MicroBatcher:
+    """Collects model input rows per (elo_range, time_control, target) and predicts them together."""
+
+    def __init__(self, window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch=DEFAULT_MAX_BATCH, executor=None):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._executor = executor
+        self._pending = {}
+        self._timers = {}
+        self._running = set()
+
+    def pending_rows(self):
+        return sum(len(batch) for batch in self._pending.values())
+
+    async def predict(self, elo_range, time_control, target, features):
+        """Predicted score for one position's features, or None if no model exists."""
+        loop = asyncio.get_running_loop()
+        key = (elo_range, time_control, target)
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((features.select(wrapper.select_feature_index(*key)), future))
+
+        if len(batch) >= self.max_batch:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.ensure_future(self._run(key, batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, key, batch):
+        loop = asyncio.get_running_loop()
+        rows = np.vstack([row for row, _ in batch])
+        metrics.BATCH_SIZE.observe(len(batch))
+        try:
+            scores = await loop.run_in_executor(self._executor, wrapper.predict_rows, *key, rows)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for i, (_, future) in enumerate(batch):
+            if not future.done():
+                future.set_result(None if scores is None else scores[i])
+
+
+class AnalysisService:
+    """Runs analyze_position() against resident models and a warm engine pool."""
+
+    def __init__(self, stockfish_path=STOCKFISH_PATH, engines=DEFAULT_ENGINES,
+                 batch_window_ms=DEFAULT_BATCH_WINDOW_MS, max_batch=DEFAULT_MAX_BATCH):
+        self.engine_pool = EnginePool(stockfish_path, engines)
+        # One thread per engine: a request only needs a thread once it holds an engine
+        self._executor = ThreadPoolExecutor(max_workers=engines, thread_name_prefix="analysis")
+        # Predictions get their own thread so batches never queue behind feature extraction
+        self._predict_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+        self.batcher = MicroBatcher(batch_window_ms, max_batch, self._predict_executor)
+        self._in_flight = {}
+        self.coalesced = 0
+
+    async def start(self):
+        if wrapper.model_bundle is not None:
+            wrapper.model_bundle.preload()
+        await self.engine_pool.start(self._executor)
+        self.register_metrics()
+
+    def register_metrics(self):
+        """Scrape-time gauges for the pool, queues and loaded models."""
+        metrics.register_callback(
+            "chess_analysis_engines_idle", "Engines in the pool not running an analysis", self.engine_pool.idle)
+        metrics.register_callback(
+            "chess_analysis_engine_queue_depth", "Analyses waiting for a free engine", lambda: self.engine_pool.waiting)
+        metrics.register_callback(
+            "chess_analysis_in_flight", "Distinct analyses currently running", lambda: len(self._in_flight))
+        metrics.register_callback(
+            "chess_analysis_predict_queue_depth", "Rows waiting for their micro-batch", self.batcher.pending_rows)
+        metrics.register_callback(
+            "chess_analysis_model_loads_total", "Models loaded into this process, by source", self._model_loads, "counter")
+
+    def _model_loads(self):
+        bundle_loads = wrapper.model_bundle.loads if wrapper.model_bundle is not None else 0
+        return {(("source", "bundle"),): bundle_loads, (("source", "pickle"),): len(wrapper._pickled_models)}
+
+    async def analyze(self, fen, avg_elo=1500, time_control="blitz", timings=False, width=None, tier="full",
+                      deadline_ms=None):
+        """Same result dict as chess_analyzer_wrapper.analyze_position (timings=True adds "timings")."""
+        key = analysis_key(fen, avg_elo, time_control)
+        if key is None:
+            return await self._analyze(fen, avg_elo, time_control, timings, width, tier, deadline_ms)
+
+        key += (bool(timings), width, tier, deadline_ms)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(
+                self._analyze(fen, avg_elo, time_control, timings, width, tier, deadline_ms))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+            metrics.CACHE_REQUESTS.inc(cache="in_flight", result="miss")
+        else:
+            self.coalesced += 1
+            metrics.CACHE_REQUESTS.inc(cache="in_flight", result="hit")
+        # shield: one client disconnecting must not cancel the analysis the others wait on
+        result = await asyncio.shield(future)
+        return dict(result)
+
+    async def _analyze(self, fen, avg_elo, time_control, timings=False, width=None, tier="full", deadline_ms=None):
+        result = await self._compute(fen, avg_elo, time_control, timings, width, tier, deadline_ms)
+        metrics.ANALYSES.inc(outcome="success" if result.get("success") else "error")
+        return result
+
+    async def _compute(self, fen, avg_elo, time_control, timings, width=None, tier="full", deadline_ms=None):
+        stage_timings = StageTimings() if timings else None
+        start = time.perf_counter()
+        depth = None
+        try:
+            elo_range = wrapper.categorize_elo(avg_elo)
+            board = chess.Board(fen)
+            model_targets = wrapper.tier_targets(tier)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+        # --- Common opening positions come precomputed ---
+        indexed = wrapper.lookup_opening(board, elo_range, time_control, tier, stage_timings)
+        if indexed is not None:
+            features, raw_scores = indexed
+            result = wrapper.build_result(elo_range, time_control, features, raw_scores, tier)
+            result["source"] = "opening_index"
+            if deadline_ms is not None:
+                result["deadline_ms"] = deadline_ms
+                result["depth_reached"] = wrapper.opening_index.depth
+            if stage_timings is not None:
+                stage_timings.add("total", (time.perf_counter() - start) * 1000)
+                record_timings(stage_timings)
+                result["timings"] = stage_timings.to_dict()
+            metrics.OPENING_INDEX_HITS.inc()
+            return result
+
+        try:
+            if tier == "fast":
+                # Static features only: a millisecond or two, computed right here without an engine
+                features = wrapper.extract_features(board, elo_range, time_control, None, stage_timings, tier=tier)
+            elif deadline_ms is None:
+                features = await self._engine_features(board, elo_range, time_control, stage_timings, start, width)
+            else:
+                deadline = start + (deadline_ms - wrapper.DEADLINE_RESERVE_MS) / 1000
+                features, depth = await self._engine_features(
+                    board, elo_range, time_control, stage_timings, start, width, deadline)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+        # --- Predictions, batched with other requests for the same models ---
+        try:
+            predict_start = time.perf_counter()
+            scores = await asyncio.gather(*(
+                self.batcher.predict(elo_range, time_control, target, features) for target in model_targets))
+            result = wrapper.build_result(
+                elo_range, time_control, features, dict(zip(wrapper.TARGETS, scores)), tier)
+            if width is not None and tier == "full":
+                # The fast tier ran no search at that width
+                result["search_width"] = width
+            if deadline_ms is not None:
+                result["deadline_ms"] = deadline_ms
+                result["depth_reached"] = depth or 0
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+        if stage_timings is not None:
+            done = time.perf_counter()
+            # Includes the batching window
+            stage_timings.add("predict_batched", (done - predict_start) * 1000)
+            stage_timings.add("total", (done - start) * 1000)
+            record_timings(stage_timings)
+            result["timings"] = stage_timings.to_dict()
+        return result
+
+    async def _engine_features(self, board, elo_range, time_control, stage_timings, start, width, deadline=None):
+        """
+        Features computed on a worker thread with an engine checked out of the pool.
+        With a deadline, (features, depth reached) from extract_features_by_deadline.
+        """
+        loop = asyncio.get_running_loop()
+        engine = await self.engine_pool.acquire()
+        if stage_timings is not None:
+            stage_timings.add("engine_checkout", (time.perf_counter() - start) * 1000)
+        failed = True
+        try:
+            if deadline is None:
+                features = await loop.run_in_executor(
+                    self._executor, wrapper.extract_features, board, elo_range, time_control, engine, stage_timings,
+                    width)
+            else:
+                features = await loop.run_in_executor(
+                    self._executor, wrapper.extract_features_by_deadline, board, elo_range, time_control, engine,
+                    deadline, width, "full", stage_timings)
+            failed = False
+        finally:
+            # Make sure an error didn't kill the engine before handing it to the next request
+            await self.engine_pool.release(engine, check=failed, executor=self._executor)
+        return features
+
+    async def analyze_progressive(self, fen, avg_elo=1500, time_control="blitz", width=None, tier="full",
+                                  timings=False, deadline_ms=None):
+        """
+        Async generator of results per search depth, as chess_analyzer_wrapper.analyze_position_progressive,
+        including its timings and deadline_ms handling; the deadline counts the wait for a free engine.
+        Not coalesced; one pooled engine is held for the whole stream.
+        """
+        stage_timings = StageTimings() if timings else None
+        start = time.perf_counter()
+        deadline = None
+        depths = wrapper.PROGRESSIVE_DEPTHS
+        if deadline_ms is not None:
+            deadline = start + (deadline_ms - wrapper.DEADLINE_RESERVE_MS) / 1000
+            depths = wrapper.DEADLINE_DEPTHS
+
+        def finish(result):
+            if deadline_ms is not None:
+                result["deadline_ms"] = deadline_ms
+            if stage_timings is not None:
+                elapsed = (time.perf_counter() - start) * 1000
+                if result["final"]:
+                    stage_timings.add("total", elapsed)
+                    record_timings(stage_timings)
+                    result["timings"] = stage_timings.to_dict()
+                else:
+                    result["timings"] = dict(stage_timings.to_dict(), total=round(elapsed, 3))
+            return result
+
+        try:
+            elo_range = wrapper.categorize_elo(avg_elo)
+            board = chess.Board(fen)
+            model_targets = wrapper.tier_targets(tier)
+        except Exception as e:
+            yield {"success": False, "error": str(e)}
+            return
+
+        indexed = wrapper.lookup_opening(board, elo_range, time_control, tier, stage_timings)
+        if indexed is not None:
+            features, raw_scores = indexed
+            result = wrapper.build_result(elo_range, time_control, features, raw_scores, tier)
+            result.update(source="opening_index", depth=wrapper.opening_index.depth, final=True)
+            metrics.OPENING_INDEX_HITS.inc()
+            yield finish(result)
+            return
+
+        loop = asyncio.get_running_loop()
+        engine = None
+        if tier != "fast":
+            engine = await self.engine_pool.acquire()
+            if stage_timings is not None:
+                stage_timings.add("engine_checkout", (time.perf_counter() - start) * 1000)
+        failed = True
+        try:
+            steps = wrapper.iter_features(board, elo_range, time_control, engine, depths, width, tier,
+                                          deadline, stage_timings)
+            result = None
+            while True:
+                # Each depth's search runs on a worker thread, like _engine_features
+                step = await loop.run_in_executor(self._executor, next, steps, None)
+                if step is None:
+                    break
+                depth, features, final = step
+                predict_start = time.perf_counter()
+                scores = await asyncio.gather(*(
+                    self.batcher.predict(elo_range, time_control, target, features) for target in model_targets))
+                if stage_timings is not None:
+                    stage_timings.add("predict_batched", (time.perf_counter() - predict_start) * 1000)
+                result = wrapper.build_result(
+                    elo_range, time_control, features, dict(zip(wrapper.TARGETS, scores)), tier)
+                result["depth"] = depth
+                result["final"] = final
+                yield finish(result)
+            if result is not None and not result["final"]:
+                # The next depth was cut off by the deadline: the last result stands
+                yield finish(dict(result, final=True))
+            failed = False
+            metrics.ANALYSES.inc(outcome="success")
+        except Exception as e:
+            metrics.ANALYSES.inc(outcome="error")
+            yield {"success": False, "error": str(e)}
+        finally:
+            if engine is not None:
+                await self.engine_pool.release(engine, check=failed, executor=self._executor)
+
+    async def analyze_batch(self, positions, timings=False, width=None, tier="full", deadline_ms=None):
+        """Analyze (fen, avg_elo, time_control) tuples concurrently, results in the same order."""
+        return await asyncio.gather(*(
+            self.analyze(*position, timings=timings, width=width, tier=tier, deadline_ms=deadline_ms)
+            for position in positions))
+
+    def close(self):
+        self.engine_pool.close()
+        self._executor.shutdown(wait=False)
+        self._predict_executor.shutdown(wait=False)
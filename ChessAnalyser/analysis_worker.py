@@ -0,0 +1,104 @@
+# analysis_worker.py
+"""
+Runs position analysis for the desktop UI in a separate process, so the
+pure-Python feature extraction never holds the Tk main loop's GIL.
+
+The worker keeps one Stockfish engine and the models resident. Requests go in
+on one queue and status/result messages come back on another, which the UI
+polls from its main loop with after().
+"""
+import multiprocessing
+import queue
+
+
+def _latest_request(request_queue, request):
+    """Skip requests that were superseded while the previous one was running."""
+    while True:
+        try:
+            newer = request_queue.get_nowait()
+        except queue.Empty:
+            return request
+        if newer is None:
+            return None
+        request = newer
+
+
+def run_worker(request_queue, result_queue, stockfish_path):
+    """Worker process entry point. A None request shuts it down."""
+    import chess
+    from ml_training.engine_replay import open_engine
+    from chess_analyzer_wrapper import categorize_elo, extract_features, predict_target, TARGETS
+
+    engine = None
+    try:
+        while True:
+            request = _latest_request(request_queue, request_queue.get())
+            if request is None:
+                break
+            request_id, fen, avg_elo, time_control = request
+
+            try:
+                result_queue.put((request_id, "status", ("⚙️ Computing position features...", "loading")))
+                if engine is None:
+                    engine = open_engine(stockfish_path)
+
+                elo_range = categorize_elo(avg_elo)
+                features = extract_features(chess.Board(fen), elo_range, time_control, engine)
+
+                result_queue.put((request_id, "status", ("🧠 Running ML predictions...", "loading")))
+                scores = {}
+                for target in TARGETS:
+                    score = predict_target(elo_range, time_control, target, features)
+                    scores[target] = None if score is None else float(score)
+                result_queue.put((request_id, "result", scores))
+
+            except ValueError:
+                result_queue.put((request_id, "error", ("Invalid Elo rating", "Invalid input")))
+            except Exception as e:
+                # Engine may be in a bad state; start a fresh one next time
+                if engine is not None:
+                    try:
+                        engine.quit()
+                    except Exception:
+                        pass
+                    engine = None
+                result_queue.put((request_id, "error", (f"Analysis failed: {str(e)}", "Analysis failed")))
+    finally:
+        if engine is not None:
+            engine.quit()
+
+
+class AnalysisWorker:
+    """Handle to the worker process, used from the Tk main thread only."""
+
+    def __init__(self, stockfish_path):
+        # spawn, not fork: forking a process that owns a Tk connection is unsafe
+        ctx = multiprocessing.get_context("spawn")
+        self.request_queue = ctx.Queue()
+        self.result_queue = ctx.Queue()
+        self.next_request_id = 0
+        self.process = ctx.Process(target=run_worker,
+                                   args=(self.request_queue, self.result_queue, stockfish_path),
+                                   daemon=True)
+        self.process.start()
+
+    def submit(self, fen, avg_elo, time_control):
+        """Queue an analysis and return its request id."""
+        self.next_request_id += 1
+        self.request_queue.put((self.next_request_id, fen, avg_elo, time_control))
+        return self.next_request_id
+
+    def poll(self):
+        """Return every (request_id, kind, payload) message available right now, without blocking."""
+        messages = []
+        while True:
+            try:
+                messages.append(self.result_queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+    def close(self, timeout=2):
+        self.request_queue.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
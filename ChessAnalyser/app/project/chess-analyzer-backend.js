@@ -5,6 +5,8 @@ const path = require('path');
 
 const app = express();
 const PORT = process.env.PORT || 3001;
+// Resident Python service (analysis_server.py); when unset, the wrapper is spawned per request
+const ANALYSIS_SERVICE_URL = process.env.CHESS_ANALYSIS_SERVICE_URL;
 
 // Middleware
 app.use(cors());
@@ -13,7 +15,9 @@ app.use(express.json());
 // Chess analysis endpoint
 app.post('/api/analyze-chess-position', async (req, res) => {
   try {
-    const { fen, avgElo, timeControl } = req.body;
+    // tier: 'full' (default) or 'fast' (static features only, no Stockfish)
+    // deadlineMs: answer within this many ms with the deepest search completed by then
+    const { fen, avgElo, timeControl, tier, deadlineMs } = req.body;
 
     if (!fen || avgElo === undefined || !timeControl) {
       return res.status(400).json({
@@ -23,11 +27,27 @@ app.post('/api/analyze-chess-position', async (req, res) => {
 
     console.log(`🧠 Analyzing chess position: Elo=${avgElo}, TimeControl=${timeControl}`);
 
+    if (ANALYSIS_SERVICE_URL) {
+      const response = await fetch(`${ANALYSIS_SERVICE_URL}/api/analyze-chess-position`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ fen, avgElo, timeControl, tier, deadlineMs })
+      });
+      return res.status(response.status).json(await response.json());
+    }
+
     // Path to Python wrapper (adjust relative to the server location)
     const scriptPath = path.join(__dirname, '..', '..', 'chess_analyzer_wrapper.py');
 
     // Spawn Python process for analysis
-    const pythonProcess = spawn('python', [scriptPath, fen, avgElo.toString(), timeControl], {
+    const args = [scriptPath, fen, avgElo.toString(), timeControl];
+    if (tier === 'fast' || tier === 'full') {
+      args.push(`--tier=${tier}`);
+    }
+    if (Number(deadlineMs) > 0) {
+      args.push(`--deadline-ms=${Number(deadlineMs)}`);
+    }
+    const pythonProcess = spawn('python', args, {
       cwd: path.join(__dirname, '..', '..')
     });
 
@@ -81,6 +101,91 @@ app.post('/api/analyze-chess-position', async (req, res) => {
   }
 });
 
+// Batch analysis endpoint (only available through the resident service)
+app.post('/api/analyze-batch', async (req, res) => {
+  if (!ANALYSIS_SERVICE_URL) {
+    return res.status(501).json({
+      error: 'Batch analysis requires the analysis service (set CHESS_ANALYSIS_SERVICE_URL)'
+    });
+  }
+  try {
+    const response = await fetch(`${ANALYSIS_SERVICE_URL}/api/analyze-batch`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(req.body)
+    });
+    res.status(response.status).json(await response.json());
+  } catch (error) {
+    console.error('❌ Analysis service request failed:', error);
+    res.status(502).json({
+      error: 'Analysis service unavailable',
+      details: error.message
+    });
+  }
+});
+
+// Progressive analysis: one JSON line per search depth, shallow result first
+app.post('/api/analyze-progressive', async (req, res) => {
+  // deadlineMs and timings as for /api/analyze-chess-position
+  const { fen, avgElo, timeControl, tier, deadlineMs, timings } = req.body;
+  if (!fen || avgElo === undefined || !timeControl) {
+    return res.status(400).json({
+      error: 'Missing required parameters: fen, avgElo, timeControl'
+    });
+  }
+
+  try {
+    if (ANALYSIS_SERVICE_URL) {
+      const response = await fetch(`${ANALYSIS_SERVICE_URL}/api/analyze-progressive`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ fen, avgElo, timeControl, tier, deadlineMs, timings })
+      });
+      res.status(response.status).type(response.headers.get('content-type') || 'application/x-ndjson');
+      for await (const chunk of response.body) {
+        res.write(chunk);
+      }
+      return res.end();
+    }
+
+    // The wrapper prints the same JSON lines with --progressive
+    const scriptPath = path.join(__dirname, '..', '..', 'chess_analyzer_wrapper.py');
+    const args = [scriptPath, fen, avgElo.toString(), timeControl, '--progressive'];
+    if (tier === 'fast' || tier === 'full') {
+      args.push(`--tier=${tier}`);
+    }
+    if (Number(deadlineMs) > 0) {
+      args.push(`--deadline-ms=${Number(deadlineMs)}`);
+    }
+    if (timings === true) {
+      args.push('--timings');
+    }
+    const pythonProcess = spawn('python', args, {
+      cwd: path.join(__dirname, '..', '..')
+    });
+    res.type('application/x-ndjson');
+    pythonProcess.stdout.pipe(res);
+    pythonProcess.stderr.on('data', (data) => {
+      console.error('❌ Python analysis stderr:', data.toString());
+    });
+    pythonProcess.on('error', (error) => {
+      console.error('❌ Failed to start Python process:', error);
+      res.end(JSON.stringify({ success: false, error: 'Failed to start analysis', details: error.message }) + '\n');
+    });
+    // Stop the analysis if the client goes away mid-stream
+    res.on('close', () => pythonProcess.kill());
+  } catch (error) {
+    console.error('❌ Analysis service request failed:', error);
+    if (res.headersSent) {
+      return res.end();
+    }
+    res.status(502).json({
+      error: 'Analysis service unavailable',
+      details: error.message
+    });
+  }
+});
+
 // Health check endpoint
 app.get('/api/health', (req, res) => {
   res.json({ status: 'ok', message: 'Chess Analyzer Backend is running' });
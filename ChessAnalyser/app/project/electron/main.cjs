@@ -54,6 +54,21 @@ app.on('window-all-closed', () => {
 
 // Chess analysis IPC handler
 ipcMain.handle('analyze-chess-position', async (event, { fen, avgElo, timeControl }) => {
+  // Use the resident Python service (analysis_server.py) when one is configured
+  const serviceUrl = process.env.CHESS_ANALYSIS_SERVICE_URL;
+  if (serviceUrl) {
+    const response = await fetch(`${serviceUrl}/api/analyze-chess-position`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ fen, avgElo, timeControl })
+    });
+    const result = await response.json();
+    if (!response.ok) {
+      throw { error: result.error || 'Analysis service failed', details: result.details };
+    }
+    return result;
+  }
+
   return new Promise((resolve, reject) => {
     console.log(`🧠 Analyzing chess position: Elo=${avgElo}, TimeControl=${timeControl}`);
     
@@ -98,6 +113,91 @@ ipcMain.handle('analyze-chess-position', async (event, { fen, avgElo, timeContro
   });
 });
 
+// Progressive analysis: every refined result is sent to the renderer as a
+// 'chess-analysis-progress' event tagged with requestId; resolves with the final one.
+// deadlineMs stops deepening at the deadline; timings adds per-stage timings to every result
+ipcMain.handle('analyze-chess-position-progressive', async (event, { requestId, fen, avgElo, timeControl, deadlineMs, timings }) => {
+  let last = null;
+  const emit = (line) => {
+    if (!line.trim()) return;
+    last = JSON.parse(line);
+    event.sender.send('chess-analysis-progress', { requestId, result: last });
+  };
+
+  const serviceUrl = process.env.CHESS_ANALYSIS_SERVICE_URL;
+  if (serviceUrl) {
+    const response = await fetch(`${serviceUrl}/api/analyze-progressive`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ fen, avgElo, timeControl, deadlineMs, timings })
+    });
+    if (!response.ok) {
+      const result = await response.json();
+      throw { error: result.error || 'Analysis service failed', details: result.details };
+    }
+    const decoder = new TextDecoder();
+    let buffered = '';
+    for await (const chunk of response.body) {
+      buffered += decoder.decode(chunk, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      lines.forEach(emit);
+    }
+    emit(buffered);
+    return last;
+  }
+
+  return new Promise((resolve, reject) => {
+    const scriptPath = path.join(__dirname, '..', '..', '..', 'chess_analyzer_wrapper.py');
+    const args = [scriptPath, fen, avgElo.toString(), timeControl, '--progressive'];
+    if (Number(deadlineMs) > 0) {
+      args.push(`--deadline-ms=${Number(deadlineMs)}`);
+    }
+    if (timings === true) {
+      args.push('--timings');
+    }
+    const pythonProcess = spawn('python', args, {
+      cwd: path.join(__dirname, '..', '..', '..')
+    });
+
+    let buffered = '';
+    let errorData = '';
+    pythonProcess.stdout.on('data', (data) => {
+      buffered += data.toString();
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      try {
+        lines.forEach(emit);
+      } catch (error) {
+        reject({ error: 'Failed to parse analysis results', details: error.message });
+      }
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      errorData += data.toString();
+    });
+
+    pythonProcess.on('close', (code) => {
+      try {
+        emit(buffered);
+      } catch (error) {
+        return reject({ error: 'Failed to parse analysis results', details: error.message });
+      }
+      if (code === 0 && last) {
+        resolve(last);
+      } else {
+        console.error('❌ Python analysis failed:', errorData);
+        reject({ error: 'Python script failed', details: errorData || 'Unknown error' });
+      }
+    });
+
+    pythonProcess.on('error', (error) => {
+      console.error('❌ Failed to start Python process:', error);
+      reject({ error: 'Failed to start analysis', details: error.message });
+    });
+  });
+});
+
 app.whenReady().then(() => {
   createWindow();
 
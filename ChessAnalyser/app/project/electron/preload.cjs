@@ -15,5 +15,25 @@ contextBridge.exposeInMainWorld('electron', {
       console.error('Chess analysis failed:', error);
       throw error;
     }
+  },
+
+  // Progressive analysis: onResult gets a quick shallow result, then refined ones;
+  // resolves with the final result. options: { deadlineMs, timings }
+  analyzeChessPositionProgressive: async (fen, avgElo, timeControl, onResult, options = {}) => {
+    const requestId = `${Date.now()}-${Math.random()}`;
+    const listener = (_event, message) => {
+      if (message.requestId === requestId) onResult(message.result);
+    };
+    ipcRenderer.on('chess-analysis-progress', listener);
+    try {
+      return await ipcRenderer.invoke('analyze-chess-position-progressive', {
+        requestId, fen, avgElo, timeControl, deadlineMs: options.deadlineMs, timings: options.timings
+      });
+    } catch (error) {
+      console.error('Chess analysis failed:', error);
+      throw error;
+    } finally {
+      ipcRenderer.removeListener('chess-analysis-progress', listener);
+    }
   }
 });
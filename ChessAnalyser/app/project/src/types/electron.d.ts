@@ -1,23 +1,39 @@
 // Ambient declaration for the preload-exposed API
 export {}; // ensure this is a module
 
+interface ChessAnalysisResult {
+  success: boolean;
+  position_quality: number;
+  move_ease: number;
+  features: Record<string, number | string>;
+  elo_range: string;
+  time_control: string;
+  tier?: string;
+  raw_scores?: {
+    position_quality: number;
+    move_ease: number;
+  };
+  // Progressive results only: search depth of this result, and whether it is the last one
+  depth?: number;
+  final?: boolean;
+  // Only when requested: the deadline in ms, and per-stage timings in ms
+  deadline_ms?: number;
+  timings?: Record<string, number>;
+  error?: string;
+}
+
 declare global {
   interface Window {
     electron: {
       ping: () => string;
-      analyzeChessPosition: (fen: string, avgElo: number, timeControl: string) => Promise<{
-        success: boolean;
-        position_quality: number;
-        move_ease: number;
-        features: Record<string, number | string>;
-        elo_range: string;
-        time_control: string;
-        raw_scores?: {
-          position_quality: number;
-          move_ease: number;
-        };
-        error?: string;
-      }>;
+      analyzeChessPosition: (fen: string, avgElo: number, timeControl: string) => Promise<ChessAnalysisResult>;
+      analyzeChessPositionProgressive: (
+        fen: string,
+        avgElo: number,
+        timeControl: string,
+        onResult: (result: ChessAnalysisResult) => void,
+        options?: { deadlineMs?: number; timings?: boolean }
+      ) => Promise<ChessAnalysisResult>;
     };
   }
 }
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# run_benchmarks.py
+"""
+Benchmark suite for the analysis pipeline.
+
+Times each stage separately over a fixed corpus of positions (corpus.json:
+openings, middlegames, endgames, high-branching positions) and writes the
+results to JSON. `compare` flags benchmarks whose median got slower than a
+stored baseline.
+
+Usage:
+    python benchmarks/run_benchmarks.py run --output benchmarks/results/latest.json
+    python benchmarks/run_benchmarks.py compare benchmarks/baseline.json benchmarks/results/latest.json
+
+The engine is taken from --engine or $STOCKFISH_PATH (a binary, or a *.replay
+file recorded with ml_training/engine_replay.py); without one a deterministic
+stub engine is used. With a replay or the stub, engine-bound stages only
+measure the Python side. model_load times the model bundle, or the per-model
+.pkl files when there is no bundle with the models ("source" says which).
+The opening index is disabled, so analyze_position always analyzes.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+
+import chess
+
+import chess_analyzer_wrapper as wrapper
+from ml_training.feature_extraction import (
+    DEPTH, ENGINE_FEATURES, FEATURES, compute_features, compute_trap_susceptibility, evaluate_all_moves)
+from ml_training.engine_replay import open_engine
+from ml_training.model_bundle import ModelBundle
+from stub_engine import StubEngine
+
+CORPUS_FILE = os.path.join(SCRIPT_DIR, "corpus.json")
+RESULTS_FILE = os.path.join(SCRIPT_DIR, "results", "latest.json")
+
+STATIC_COLUMNS = tuple(name for name in FEATURES if name not in ENGINE_FEATURES)
+
+DEFAULT_THRESHOLD = 0.15  # flag a benchmark once its median is 15% slower
+MIN_DELTA_MS = 0.05       # ...and slower by more than timer noise
+
+
+# --- Timing helpers ---
+def time_call(func, repeat, warmup=1):
+    """Durations in ms of `repeat` calls, after `warmup` untimed ones."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 4),
+        "median_ms": round(statistics.median(ordered), 4),
+        "p90_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))], 4),
+        "min_ms": round(ordered[0], 4),
+    }
+
+
+def summarize_by_category(samples_by_category):
+    all_samples = [s for samples in samples_by_category.values() for s in samples]
+    result = summarize(all_samples)
+    result["by_category"] = {category: summarize(samples) for category, samples in samples_by_category.items()}
+    return result
+
+
+def per_position(corpus, func, repeat):
+    """Time func(board) for every corpus position, grouped by category."""
+    return summarize_by_category({
+        category: [s for fen in fens for s in time_call(lambda: func(chess.Board(fen)), repeat)]
+        for category, fens in corpus.items()
+    })
+
+
+# --- Benchmarks ---
+def bench_static_features(corpus, engine, repeat):
+    return per_position(corpus, lambda board: compute_features(board, None, columns=STATIC_COLUMNS), repeat)
+
+
+def bench_evaluate_all_moves(corpus, engine, repeat):
+    return per_position(corpus, lambda board: evaluate_all_moves(board, engine, DEPTH), repeat)
+
+
+def bench_trap_susceptibility(corpus, engine, repeat):
+    samples = {}
+    for category, fens in corpus.items():
+        samples[category] = []
+        for fen in fens:
+            board = chess.Board(fen)
+            _, evals_dict = evaluate_all_moves(board, engine, DEPTH)
+            samples[category] += time_call(lambda: compute_trap_susceptibility(board, engine, evals_dict), repeat)
+    return summarize_by_category(samples)
+
+
+def bench_model_load(bundle_path, repeat):
+    def load():
+        bundle = ModelBundle(bundle_path)
+        bundle.preload()
+        bundle.close()
+    return dict(summarize(time_call(load, repeat)), source="bundle")
+
+
+def bench_pickle_load(elo_range, time_control, repeat):
+    """Unpickling every target's .pkl model, as the wrapper does without a bundle"""
+    def load():
+        wrapper._pickled_models.clear()
+        for target in wrapper.TARGETS:
+            wrapper.load_model(elo_range, time_control, target)
+    return dict(summarize(time_call(load, repeat)), source="pickle")
+
+
+def bench_predict(corpus, engine, repeat, elo_range, time_control):
+    samples = {}
+    for category, fens in corpus.items():
+        samples[category] = []
+        for fen in fens:
+            features = wrapper.extract_features(chess.Board(fen), elo_range, time_control, engine)
+            for target in wrapper.TARGETS:
+                rows = features.select(wrapper.select_feature_index(elo_range, time_control, target))[None, :]
+                samples[category] += time_call(
+                    lambda: wrapper.predict_rows(elo_range, time_control, target, rows), repeat)
+    return summarize_by_category(samples)
+
+
+def bench_analyze_position(corpus, engine, repeat, avg_elo, time_control):
+    errors = set()
+
+    def analyze(board):
+        result = wrapper.analyze_position(board.fen(), avg_elo, time_control, engine)
+        if not result["success"]:
+            errors.add(result["error"])
+
+    result = per_position(corpus, analyze, repeat)
+    if errors:
+        result["errors"] = sorted(errors)
+    return result
+
+
+def run(args):
+    with open(args.corpus, "r") as f:
+        corpus = json.load(f)
+
+    if args.engine and args.engine != "stub":
+        engine = open_engine(args.engine)
+        engine_name = engine.id.get("name", args.engine)
+    else:
+        engine = StubEngine()
+        engine_name = "stub"
+
+    if args.bundle and os.path.exists(args.bundle):
+        wrapper.model_bundle = ModelBundle(args.bundle)
+    # Opening positions would be answered from the index: time the analysis itself
+    wrapper.opening_index = None
+    elo_range = wrapper.categorize_elo(args.elo)
+    in_bundle = all(
+        wrapper.model_bundle is not None and wrapper.model_bundle.has(elo_range, args.time_control, target)
+        for target in wrapper.TARGETS)
+    # Without them in the bundle, the wrapper falls back to the per-model .pkl files
+    skip_reason = None
+    try:
+        has_models = in_bundle or all(
+            wrapper.load_model(elo_range, args.time_control, target) is not None for target in wrapper.TARGETS)
+    except Exception as e:
+        has_models = False
+        skip_reason = f"{elo_range}/{args.time_control} .pkl models failed to load: {type(e).__name__}: {e}"
+
+    benchmarks = {}
+    try:
+        print("static_features...")
+        benchmarks["static_features"] = bench_static_features(corpus, engine, args.repeat)
+        print("evaluate_all_moves...")
+        benchmarks["evaluate_all_moves"] = bench_evaluate_all_moves(corpus, engine, args.repeat)
+        print("trap_susceptibility...")
+        benchmarks["trap_susceptibility"] = bench_trap_susceptibility(corpus, engine, args.repeat)
+        if has_models:
+            print("model_load...")
+            if in_bundle:
+                benchmarks["model_load"] = bench_model_load(wrapper.model_bundle.path, args.repeat)
+            else:
+                benchmarks["model_load"] = bench_pickle_load(elo_range, args.time_control, args.repeat)
+            print("predict...")
+            benchmarks["predict"] = bench_predict(corpus, engine, args.repeat, elo_range, args.time_control)
+        else:
+            reason = skip_reason or f"no {elo_range}/{args.time_control} models in the bundle or as .pkl files"
+            benchmarks["model_load"] = {"skipped": reason}
+            benchmarks["predict"] = {"skipped": reason}
+        print("analyze_position...")
+        benchmarks["analyze_position"] = bench_analyze_position(corpus, engine, args.repeat, args.elo, args.time_control)
+    finally:
+        engine.quit()
+
+    results = {
+        "meta": {
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "engine": engine_name,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "positions": sum(len(fens) for fens in corpus.values()),
+            "model_version": wrapper.model_bundle.version if wrapper.model_bundle is not None else None,
+        },
+        "benchmarks": benchmarks,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for name, result in benchmarks.items():
+        if "skipped" in result:
+            print(f"{name:<22} skipped: {result['skipped']}")
+        else:
+            print(f"{name:<22} median {result['median_ms']:>10.3f} ms   p90 {result['p90_ms']:>10.3f} ms")
+    print(f"Results written to {args.output}")
+
+
+# --- Compare ---
+def compare_results(baseline, current, threshold=DEFAULT_THRESHOLD, min_delta_ms=MIN_DELTA_MS):
+    """[(name, baseline_ms, current_ms, change, regressed)] over benchmarks and their categories."""
+    rows = []
+
+    def check(name, base, cur):
+        change = cur["median_ms"] / base["median_ms"] - 1 if base["median_ms"] > 0 else 0.0
+        regressed = change > threshold and cur["median_ms"] - base["median_ms"] > min_delta_ms
+        rows.append((name, base["median_ms"], cur["median_ms"], change, regressed))
+
+    for name, base in baseline["benchmarks"].items():
+        cur = current["benchmarks"].get(name)
+        if cur is None or "skipped" in base or "skipped" in cur:
+            continue
+        # Bundle vs .pkl model loads are not the same thing timed (older results only timed the bundle)
+        if base.get("source", "bundle") != cur.get("source", "bundle"):
+            print(f"Warning: {name} timed {base.get('source', 'bundle')} vs {cur.get('source', 'bundle')}; not compared")
+            continue
+        check(name, base, cur)
+        for category, base_stats in base.get("by_category", {}).items():
+            cur_stats = cur.get("by_category", {}).get(category)
+            if cur_stats is not None:
+                check(f"{name}[{category}]", base_stats, cur_stats)
+    return rows
+
+
+def compare(args):
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    with open(args.current, "r") as f:
+        current = json.load(f)
+
+    if baseline["meta"]["engine"] != current["meta"]["engine"]:
+        print(f"Warning: engines differ ({baseline['meta']['engine']} vs {current['meta']['engine']})")
+
+    rows = compare_results(baseline, current, args.threshold)
+    print(f"{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>9}")
+    for name, base_ms, cur_ms, change, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<40} {base_ms:>10.3f}ms {cur_ms:>10.3f}ms {change:>+8.1%}{flag}")
+
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chess analysis benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Run the benchmarks")
+    run_parser.add_argument("--output", default=RESULTS_FILE)
+    run_parser.add_argument("--corpus", default=CORPUS_FILE)
+    run_parser.add_argument("--repeat", type=int, default=5, help="Timed calls per position")
+    run_parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"),
+                            help="UCI engine binary, a recorded *.replay file, or 'stub' (default: $STOCKFISH_PATH, else stub)")
+    run_parser.add_argument("--bundle", default=wrapper.MODEL_BUNDLE_FILE, help="Model bundle to load")
+    run_parser.add_argument("--elo", type=int, default=1500)
+    run_parser.add_argument("--time-control", default="blitz")
+
+    compare_parser = commands.add_parser("compare", help="Compare results against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="Relative slowdown of the median that counts as a regression")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        compare(args)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# selective_width_report.py
+"""
+Drift report for selective-width multipv searches.
+
+For every corpus position, computes the features (and the model predictions,
+when a bundle with models for --elo/--time-control is available) once with the
+full-width search and once per --widths value, and reports how far each width
+drifts from full width, next to the evaluate_all_moves latency it buys.
+
+Usage:
+    python benchmarks/selective_width_report.py --widths 4 8 12 --output benchmarks/results/width_drift.json
+
+The engine is chosen as in run_benchmarks.py. A replay file only answers the
+selective searches if they were recorded, so use a real engine or the stub.
+As in run_benchmarks.py, the opening index is disabled so that every position
+is analyzed at every width.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(SCRIPT_DIR))
+
+import chess
+
+import chess_analyzer_wrapper as wrapper
+from ml_training.feature_extraction import DEPTH, compute_features, evaluate_all_moves
+from ml_training.engine_replay import open_engine
+from ml_training.model_bundle import ModelBundle
+from run_benchmarks import CORPUS_FILE, summarize, time_call
+from stub_engine import StubEngine
+
+RESULTS_FILE = os.path.join(SCRIPT_DIR, "results", "width_drift.json")
+DEFAULT_WIDTHS = (4, 8, 12)
+
+
+def drift_stats(deltas):
+    deltas = [abs(d) for d in deltas]
+    return {
+        "mean_abs": round(statistics.fmean(deltas), 4),
+        "max_abs": round(max(deltas), 4),
+        "changed": sum(1 for d in deltas if d > 1e-9),
+    }
+
+
+def feature_drift(full, selective):
+    """{feature: [selective - full, ...]} over the numeric features of one position."""
+    return {name: selective[name] - value for name, value in full.items()
+            if isinstance(value, (int, float)) and isinstance(selective.get(name), (int, float))}
+
+
+def report(corpus, engine, widths, repeat, elo, time_control, has_models):
+    fens = [fen for fens in corpus.values() for fen in fens]
+    full_features = [compute_features(chess.Board(fen), engine) for fen in fens]
+    full_scores = ([wrapper.analyze_position(fen, elo, time_control, engine)["raw_scores"] for fen in fens]
+                   if has_models else None)
+
+    latency = {"full": summarize([
+        s for fen in fens for s in time_call(lambda: evaluate_all_moves(chess.Board(fen), engine, DEPTH), repeat)])}
+    drift = {}
+    for width in widths:
+        latency[str(width)] = summarize([
+            s for fen in fens
+            for s in time_call(lambda: evaluate_all_moves(chess.Board(fen), engine, DEPTH, width), repeat)])
+
+        deltas = {}
+        for fen, full in zip(fens, full_features):
+            selective = compute_features(chess.Board(fen), engine, width=width)
+            for name, delta in feature_drift(full, selective).items():
+                deltas.setdefault(name, []).append(delta)
+        width_drift = {"features": {name: drift_stats(values) for name, values in deltas.items()}}
+
+        if has_models:
+            predictions = {}
+            for fen, full in zip(fens, full_scores):
+                scores = wrapper.analyze_position(fen, elo, time_control, engine, width=width)["raw_scores"]
+                for target, value in scores.items():
+                    predictions.setdefault(target, []).append(value - full[target])
+            width_drift["predictions"] = {target: drift_stats(values) for target, values in predictions.items()}
+        drift[str(width)] = width_drift
+    return {"latency": latency, "drift": drift}
+
+
+def main(args):
+    with open(args.corpus, "r") as f:
+        corpus = json.load(f)
+
+    if args.engine and args.engine != "stub":
+        engine = open_engine(args.engine)
+        engine_name = engine.id.get("name", args.engine)
+    else:
+        engine = StubEngine()
+        engine_name = "stub"
+
+    if args.bundle and os.path.exists(args.bundle):
+        wrapper.model_bundle = ModelBundle(args.bundle)
+    # Indexed openings would come back at full width whatever the width asked for
+    wrapper.opening_index = None
+    elo_range = wrapper.categorize_elo(args.elo)
+    has_models = all(
+        wrapper.model_bundle is not None and wrapper.model_bundle.has(elo_range, args.time_control, target)
+        for target in wrapper.TARGETS)
+
+    try:
+        results = report(corpus, engine, args.widths, args.repeat, args.elo, args.time_control, has_models)
+    finally:
+        engine.quit()
+    results["meta"] = {
+        "engine": engine_name,
+        "depth": DEPTH,
+        "positions": sum(len(fens) for fens in corpus.values()),
+        "widths": args.widths,
+        "model_version": wrapper.model_bundle.version if has_models else None,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'width':<8} {'median ms':>10} {'worst feature drift':>40}")
+    print(f"{'full':<8} {results['latency']['full']['median_ms']:>10.3f}")
+    for width in map(str, args.widths):
+        features = results["drift"][width]["features"]
+        worst = max(features, key=lambda name: features[name]["mean_abs"], default=None)
+        worst_text = f"{worst} (mean {features[worst]['mean_abs']})" if worst else "-"
+        print(f"{width:<8} {results['latency'][width]['median_ms']:>10.3f} {worst_text:>40}")
+        for target, stats in results["drift"][width].get("predictions", {}).items():
+            print(f"{'':<8} {target}: mean {stats['mean_abs']}, max {stats['max_abs']}")
+    if not has_models:
+        print(f"No {elo_range}/{args.time_control} models in the bundle; prediction drift skipped")
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Feature and prediction drift of selective-width searches")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(DEFAULT_WIDTHS))
+    parser.add_argument("--output", default=RESULTS_FILE)
+    parser.add_argument("--corpus", default=CORPUS_FILE)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed evaluate_all_moves calls per position")
+    parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"),
+                        help="UCI engine binary, a recorded *.replay file, or 'stub' (default: $STOCKFISH_PATH, else stub)")
+    parser.add_argument("--bundle", default=wrapper.MODEL_BUNDLE_FILE, help="Model bundle to load")
+    parser.add_argument("--elo", type=int, default=1500)
+    parser.add_argument("--time-control", default="blitz")
+    main(parser.parse_args())
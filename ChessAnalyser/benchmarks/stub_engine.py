@@ -0,0 +1,78 @@
+# stub_engine.py
+"""
+Deterministic stand-in for a Stockfish SimpleEngine, for benchmarking the
+Python side where no engine binary is available.
+
+Scores are derived from a CRC of (position, move, depth), so every run sees
+the same evaluations and the search itself costs next to nothing. Only the
+calls feature extraction makes are supported: analyse(), analysis(), ping()
+and quit().
+"""
+import zlib
+
+import chess
+import chess.engine
+
+
+def _score(board, move, depth):
+    h = zlib.crc32(f"{board.epd()} {move.uci()} {depth}".encode("ascii"))
+    if h % 97 == 0:
+        return chess.engine.Mate(1 + h % 5)
+    return chess.engine.Cp(h % 1201 - 600)
+
+
+class _StubAnalysis:
+    """Finished search with the SimpleAnalysisResult interface feature extraction uses."""
+
+    def __init__(self, infos):
+        self.multipv = infos
+
+    def wait(self):
+        return self.multipv[0] if self.multipv else {}
+
+    def stop(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class StubEngine:
+    def _infos(self, board, limit, multipv=None, root_moves=None):
+        moves = list(root_moves) if root_moves else list(board.legal_moves)
+        depth = limit.depth or 1
+        infos = [
+            {"pv": [move], "score": chess.engine.PovScore(_score(board, move, depth), board.turn), "depth": depth}
+            for move in moves
+        ]
+        infos.sort(key=lambda info: info["score"].relative.score(mate_score=100000), reverse=True)
+        for i, info in enumerate(infos, 1):
+            info["multipv"] = i
+        return infos[:multipv or 1]
+
+    def analysis(self, board, limit=None, multipv=None, root_moves=None, **kwargs):
+        return _StubAnalysis(self._infos(board, limit, multipv, root_moves))
+
+    def analyse(self, board, limit, multipv=None, root_moves=None, **kwargs):
+        infos = self._infos(board, limit, multipv, root_moves)
+        if multipv is None:
+            return infos[0] if infos else {}
+        return infos
+
+    def ping(self):
+        pass
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
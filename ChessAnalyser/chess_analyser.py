@@ -7,7 +7,8 @@ import json
 import os
 import math
 from position_commentary import describe_position
-from ml_training.feature_extraction import compute_features
+from ml_training.feature_extraction import compute_feature_vector
+from ml_training.feature_vector import compile_feature_sets
 
 
 # --- Paths ---
@@ -23,6 +24,7 @@ with open(METRICS_FILE, "r") as f:
 
 with open(FEATURE_SETS_FILE, "r") as f:
     FEATURE_SETS = json.load(f)
+FEATURE_SET_INDEX = compile_feature_sets(FEATURE_SETS)
 
 # --- Elo categorization ---
 def categorize_elo(avg_elo):
@@ -58,7 +60,7 @@ if time_control not in ["blitz", "rapid_classical"]:
 # --- Start Stockfish & extract features ---
 board = chess.Board(fen)
 with chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH) as engine:
-    features = compute_features(board, engine)
+    features = compute_feature_vector(board, engine)
 
 # --- Targets ---
 targets = ["label_position_quality", "label_move_ease"]
@@ -84,11 +86,13 @@ for target in targets:
     # Select feature columns (fall back to default if not specified for this elo range)
     if elo_range in FEATURE_SETS and target in FEATURE_SETS[elo_range]:
         feature_cols = FEATURE_SETS[elo_range][target]
+        feature_index = FEATURE_SET_INDEX[(elo_range, target)]
     else:
         feature_cols = FEATURE_SETS["default"][target]
+        feature_index = FEATURE_SET_INDEX[("default", target)]
 
     # Prepare input
-    X = pd.DataFrame([{k: features[k] for k in feature_cols}])
+    X = pd.DataFrame(features.select(feature_index)[None, :], columns=feature_cols)
 
     # Load model
     model_path = os.path.join(MODEL_DIR, f"model_{elo_range}_{time_control}_{target}.pkl")
@@ -131,9 +135,5 @@ eval_bars = {
 
 # --- Raw feature values ---
 print("\n--- Raw Features ---")
-for k, v in features.items():
-    if k not in ["top_moves", "evals_dict"]:
-        try:
-            print(f"{k}: {float(v):.2f}")
-        except (ValueError, TypeError):
-            print(f"{k}: {v}")
+for k, v in features.to_dict().items():
+    print(f"{k}: {v:.2f}")
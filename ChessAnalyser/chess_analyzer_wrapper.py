@@ -1,26 +1,54 @@
 #!/usr/bin/env python3
 """
 Python wrapper that uses the chess_analyser.py logic and returns JSON
-This script takes FEN, ELO, and time control as command line arguments
+This script takes FEN, ELO, and time control as command line arguments.
+Pass --profile-startup to add import and time-to-first-result timings to the output,
+and --timings to add per-stage analysis timings. --width=K searches only the
+engine's top K moves at full depth (faster, slightly less accurate features).
+--tier=fast skips Stockfish entirely and predicts from the static features with
+the fast-tier models. --progressive prints one JSON line per search depth: a quick
+shallow result first, then refined ones. --deadline-ms=N deepens the search only as
+far as it can finish within N ms and reports the depth reached.
+Common opening positions are answered from a precomputed index
+(ml_training/opening_index.py) when one has been built for the loaded models.
 """
 
+import sys
+import time
+
+_START_TIME = time.perf_counter()
+
+# --- Startup profiling: must be installed before the heavy imports below ---
+_import_profiler = None
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    from startup_profile import ImportProfiler
+    _import_profiler = ImportProfiler()
+    _import_profiler.install()
+
+# pandas, joblib (and through them sklearn/xgboost) are only needed for the .pkl
+# fallback and are imported there; this process is spawned once per request
 import chess
 import chess.engine
-import pandas as pd
-import joblib
 import json
 import os
 import math
-import sys
 import numpy as np
-from ml_training.feature_extraction import compute_features
+from ml_training.engine_replay import open_engine
+from ml_training.feature_extraction import DEPTH, DeadlineExceeded, compute_feature_vector, ENGINE_FEATURES, fast_target, with_fast_feature_sets
+from ml_training.feature_vector import FeatureVector, column_index, compile_feature_sets
+from ml_training.model_bundle import load_bundle
+from ml_training.opening_index import load_index
+from ml_training.timings import StageTimings, record_timings
 
 # --- Paths (copied from chess_analyser.py) ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_DIR = os.path.join(SCRIPT_DIR, "ml_training", "elo_models")
 METRICS_FILE = os.path.join(MODEL_DIR, "model_metrics.json")
 FEATURE_SETS_FILE = os.path.join(SCRIPT_DIR, "ml_training", "feature_sets.json")
-STOCKFISH_PATH = os.path.join(SCRIPT_DIR, "stockfish-windows-x86-64-avx2.exe")
+MODEL_BUNDLE_FILE = os.path.join(MODEL_DIR, "models.bundle")
+OPENING_INDEX_FILE = os.path.join(MODEL_DIR, "openings.index")
+# $STOCKFISH_PATH may name another engine binary, or a recorded *.replay file
+STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH", os.path.join(SCRIPT_DIR, "stockfish-windows-x86-64-avx2.exe"))
 
 # --- Load metrics and feature sets (copied from chess_analyser.py) ---
 try:
@@ -34,6 +62,26 @@ except Exception as e:
     model_metrics = {}
     FEATURE_SETS = {"default": {"label_position_quality": [], "label_move_ease": []}}
 
+# Static-only "<target>_fast" sets for the engine-free fast tier
+FEATURE_SETS = with_fast_feature_sets(FEATURE_SETS)
+
+# --- Feature sets compiled to index arrays into the fixed-schema feature vector ---
+FEATURE_SET_INDEX = compile_feature_sets(FEATURE_SETS)
+
+# --- Single-file model bundle (falls back to the per-model .pkl files if not built) ---
+try:
+    model_bundle = load_bundle(MODEL_BUNDLE_FILE)
+except Exception:
+    model_bundle = None
+
+# --- Precomputed opening positions (only used if built with the loaded bundle's models) ---
+try:
+    opening_index = load_index(OPENING_INDEX_FILE)
+    if opening_index is not None and (model_bundle is None or opening_index.model_version != model_bundle.version):
+        opening_index = None
+except Exception:
+    opening_index = None
+
 # --- Elo categorization (copied from chess_analyser.py) ---
 def categorize_elo(avg_elo):
     if avg_elo is None:
@@ -81,73 +129,387 @@ def convert_to_json_serializable(obj):
     else:
         return obj
 
-def analyze_position(fen, avg_elo=1500, time_control="blitz"):
+def select_feature_cols(elo_range, time_control, target):
     """
-    Analyze a chess position using the exact logic from chess_analyser.py
+    Feature columns the model for (elo_range, time_control, target) expects
+    """
+    if model_bundle is not None and model_bundle.has(elo_range, time_control, target):
+        # Bundle stores the exact columns each booster was trained on
+        return model_bundle.feature_cols(elo_range, time_control, target)
+    # Select feature columns (fall back to default if not specified for this elo range)
+    if elo_range in FEATURE_SETS and target in FEATURE_SETS[elo_range]:
+        return FEATURE_SETS[elo_range][target]
+    return FEATURE_SETS["default"][target]
+
+# Index arrays for bundle models, whose columns may differ from feature_sets.json
+_bundle_feature_index = {}
+
+def select_feature_index(elo_range, time_control, target):
+    """
+    Index array picking select_feature_cols() out of a FeatureVector, compiled once per model
+    """
+    if model_bundle is not None and model_bundle.has(elo_range, time_control, target):
+        key = (elo_range, time_control, target)
+        index = _bundle_feature_index.get(key)
+        if index is None:
+            index = _bundle_feature_index[key] = column_index(model_bundle.feature_cols(*key))
+        return index
+    if (elo_range, target) in FEATURE_SET_INDEX:
+        return FEATURE_SET_INDEX[(elo_range, target)]
+    return FEATURE_SET_INDEX[("default", target)]
+
+# --- Targets (copied from chess_analyser.py) ---
+TARGETS = ["label_position_quality", "label_move_ease"]
+
+# Models used per analysis tier, in TARGETS order. "fast" models only use static features.
+TIER_TARGETS = {
+    "full": TARGETS,
+    "fast": [fast_target(target) for target in TARGETS],
+}
+
+def tier_targets(tier):
+    if tier not in TIER_TARGETS:
+        raise ValueError(f"Unknown analysis tier: {tier} (expected one of {', '.join(TIER_TARGETS)})")
+    return TIER_TARGETS[tier]
+
+# Search depths of a progressive analysis: a near-instant first result, then refinements
+PROGRESSIVE_DEPTHS = (1, 4, DEPTH)
+
+# --- Anytime analysis (deadline_ms) ---
+DEADLINE_DEPTHS = tuple(range(1, DEPTH + 1))
+# Kept back from the deadline for the model predictions
+DEADLINE_RESERVE_MS = 5.0
+# Expected cost ratio of one search depth to the previous one; a depth predicted
+# to overrun the deadline is not started
+DEPTH_GROWTH = 2.0
+
+def model_columns(elo_range, time_control, tier="full"):
+    """
+    Every feature column the tier's models for this Elo range and time control use
+    """
+    columns = set()
+    for target in tier_targets(tier):
+        columns.update(select_feature_cols(elo_range, time_control, target))
+    return columns
+
+# Unpickled fallback models, kept for the lifetime of the process
+_pickled_models = {}
+
+def extract_features(board, elo_range, time_control, engine=None, timings=None, width=None, tier="full"):
+    """
+    Compute only the features the models for this Elo range and time control need,
+    as a FeatureVector. Uses the given engine, or starts Stockfish for this call if the features need one.
+    width limits the full-depth multipv search to the engine's top moves (see compute_features).
+    The fast tier's models need no engine features, so it never starts Stockfish.
+    """
+    columns = model_columns(elo_range, time_control, tier)
+
+    if engine is not None or not any(c in ENGINE_FEATURES for c in columns):
+        return compute_feature_vector(board, engine, columns=columns, timings=timings, width=width)
+    if timings is None:
+        with open_engine(STOCKFISH_PATH) as engine:
+            return compute_feature_vector(board, engine, columns=columns, width=width)
+    with timings.stage("engine_spawn"):
+        engine = open_engine(STOCKFISH_PATH)
+    with engine:
+        return compute_feature_vector(board, engine, columns=columns, timings=timings, width=width)
+
+def iter_features(board, elo_range, time_control, engine=None, depths=PROGRESSIVE_DEPTHS, width=None, tier="full",
+                  deadline=None, timings=None):
+    """
+    Progressive extract_features(): yields (depth, FeatureVector, final) once per
+    search depth. Static features are computed once; only the engine features are
+    recomputed at each depth. Yields a single (0, features, True) when the models
+    need no engine features. Starts Stockfish for the run if no engine is given.
+
+    With a deadline (time.perf_counter() timestamp) every search is capped to it,
+    and the run ends early once the next depth would not finish in time: its
+    predicted cost is the previous depth's time times DEPTH_GROWTH, which already
+    reflects how many legal moves the multipv search covers; a depth after which
+    no other is predicted to fit is yielded as final. If a search is still cut
+    off by the deadline, the run ends without a final one. If not even the
+    first depth completes, the static-only features are yielded as depth 0.
+    Searches shared between depths (the depth-1 lower search) run only once.
+    Pass a StageTimings to time the searches and feature groups of every depth.
+    """
+    columns = model_columns(elo_range, time_control, tier)
+    engine_columns = [c for c in columns if c in ENGINE_FEATURES]
+    static = compute_feature_vector(board, None, columns=[c for c in columns if c not in ENGINE_FEATURES],
+                                    timings=timings)
+    if not engine_columns:
+        yield 0, static, True
+        return
+    if engine is None:
+        if timings is None:
+            engine = open_engine(STOCKFISH_PATH)
+        else:
+            with timings.stage("engine_spawn"):
+                engine = open_engine(STOCKFISH_PATH)
+        with engine:
+            yield from iter_features(board, elo_range, time_control, engine, depths, width, tier, deadline, timings)
+        return
+
+    searches = {}
+    last_ms = None
+    for i, depth in enumerate(depths):
+        started = time.perf_counter()
+        if deadline is not None and last_ms is not None and started + last_ms * DEPTH_GROWTH / 1000 > deadline:
+            return
+        try:
+            searched = compute_feature_vector(board, engine, depth=depth, columns=engine_columns, timings=timings,
+                                              width=width, deadline=deadline, searches=searches)
+        except DeadlineExceeded:
+            if i == 0:
+                yield 0, static, True
+            return
+        last_ms = (time.perf_counter() - started) * 1000
+        values = np.where(np.isnan(searched.values), static.values, searched.values)
+        final = i == len(depths) - 1 or (
+            deadline is not None and time.perf_counter() + last_ms * DEPTH_GROWTH / 1000 > deadline)
+        yield depth, FeatureVector(values, searched.move_evals), final
+        if final:
+            return
+
+def extract_features_by_deadline(board, elo_range, time_control, engine, deadline, width=None, tier="full",
+                                 timings=None):
+    """
+    Anytime extract_features(): iterative deepening until `deadline` (a time.perf_counter()
+    timestamp). Returns (features of the deepest completed search, depth reached);
+    at depth 0 only the static features are set and the models treat the rest as missing.
+    """
+    depth, features = 0, None
+    for depth, features, _ in iter_features(board, elo_range, time_control, engine, DEADLINE_DEPTHS,
+                                            width, tier, deadline, timings):
+        pass
+    return features, depth
+
+def lookup_opening(board, elo_range, time_control, tier="full", timings=None):
+    """
+    (features, {target: score}) from the opening index, or None if the position is
+    not indexed. Only full-tier results are indexed.
+    """
+    if opening_index is None or tier != "full":
+        return None
+    if timings is None:
+        return opening_index.lookup(board, elo_range, time_control)
+    with timings.stage("opening_index"):
+        return opening_index.lookup(board, elo_range, time_control)
+
+def load_model(elo_range, time_control, target):
+    """
+    The booster or unpickled model for one target (cached), or None if no model exists
+    """
+    if model_bundle is not None and model_bundle.has(elo_range, time_control, target):
+        return model_bundle.booster(elo_range, time_control, target)
+
+    model_path = os.path.join(MODEL_DIR, f"model_{elo_range}_{time_control}_{target}.pkl")
+    model = _pickled_models.get(model_path)
+    if model is None:
+        if not os.path.exists(model_path):
+            return None
+        import joblib
+        model = _pickled_models[model_path] = joblib.load(model_path)
+    return model
+
+def predict_rows(elo_range, time_control, target, rows, timings=None):
+    """
+    Predicted 0-1 scores for a 2D array of model input rows, or None if no model exists
+    """
+    if timings is None:
+        model = load_model(elo_range, time_control, target)
+    else:
+        with timings.stage("model_load"):
+            model = load_model(elo_range, time_control, target)
+    if model is None:
+        return None
+
+    if model_bundle is not None and model_bundle.has(elo_range, time_control, target):
+        X = np.asarray(rows, dtype=np.float32)
+        if timings is None:
+            return model.inplace_predict(X)
+        with timings.stage("predict"):
+            return model.inplace_predict(X)
+
+    # Prepare input & predict
+    import pandas as pd
+    X = pd.DataFrame(rows, columns=select_feature_cols(elo_range, time_control, target))
+    if timings is None:
+        return model.predict(X)
+    with timings.stage("predict"):
+        return model.predict(X)
+
+def predict_target(elo_range, time_control, target, features, timings=None):
+    """
+    Predicted 0-1 score for one target, or None if no model exists for it
+    """
+    if timings is None:
+        index = select_feature_index(elo_range, time_control, target)
+    else:
+        with timings.stage("model_lookup"):
+            index = select_feature_index(elo_range, time_control, target)
+    scores = predict_rows(elo_range, time_control, target, features.select(index)[None, :], timings)
+    return None if scores is None else scores[0]
+
+def build_result(elo_range, time_control, features, raw_scores, tier="full"):
+    """
+    Response dict from the features and {target: predicted score or None}
+    """
+    predicted_scores = {}
+    eval_bars = {}
+
+    for target in TARGETS:
+        predicted_score = raw_scores.get(target)
+        if predicted_score is None:
+            # If model doesn't exist, use a fallback value
+            predicted_score = 0.5  # neutral
+            eval_bar = 0.0
+        else:
+            # Convert to eval bar
+            eval_bar = score_to_eval_bar(predicted_score, max_eval=10, extreme_scale=3)
+
+        # Convert to native Python types for JSON serialization
+        predicted_scores[target] = convert_to_json_serializable(predicted_score)
+        eval_bars[target] = convert_to_json_serializable(eval_bar)
+
+    # --- Prepare features for display (copied from chess_analyser.py) ---
+    display_features = {}
+    for k, v in features.to_dict().items():
+        try:
+            # Convert to native Python types for JSON serialization
+            display_features[k] = convert_to_json_serializable(v)
+        except (ValueError, TypeError):
+            display_features[k] = str(v)
+
+    return {
+        "success": True,
+        "position_quality": eval_bars.get("label_position_quality", 0.0),
+        "move_ease": eval_bars.get("label_move_ease", 0.0),
+        "features": display_features,
+        "elo_range": elo_range,
+        "time_control": time_control,
+        "tier": tier,
+        "model_version": model_bundle.version if model_bundle is not None else None,
+        "raw_scores": {
+            "position_quality": predicted_scores.get("label_position_quality", 0.5),
+            "move_ease": predicted_scores.get("label_move_ease", 0.5)
+        }
+    }
+
+def analyze_position_progressive(fen, avg_elo=1500, time_control="blitz", engine=None,
+                                 depths=PROGRESSIVE_DEPTHS, width=None, tier="full", timings=False, deadline_ms=None):
+    """
+    Generator of analyze_position() results, one per search depth in `depths`:
+    a shallow result almost immediately, then refined ones. Each result also has
+    "depth" and "final"; on error a single {"success": False} result ends it.
+    With timings=True every result has the "timings" so far (its "total" is the
+    time to that result); the final ones are added to the running histograms.
+    With deadline_ms, the depths are DEADLINE_DEPTHS and deepening stops at the
+    deadline; the last result is always marked final, repeated as such if the
+    search that would have refined it was cut off.
     """
     try:
+        stage_timings = StageTimings() if timings else None
+        start = time.perf_counter()
+        deadline = None
+        if deadline_ms is not None:
+            deadline = start + (deadline_ms - DEADLINE_RESERVE_MS) / 1000
+            depths = DEADLINE_DEPTHS
+
+        def finish(result):
+            if deadline_ms is not None:
+                result["deadline_ms"] = deadline_ms
+            if stage_timings is not None:
+                elapsed = (time.perf_counter() - start) * 1000
+                if result["final"]:
+                    stage_timings.add("total", elapsed)
+                    record_timings(stage_timings)
+                    result["timings"] = stage_timings.to_dict()
+                else:
+                    result["timings"] = dict(stage_timings.to_dict(), total=round(elapsed, 3))
+            return result
+
         elo_range = categorize_elo(avg_elo)
-        
-        # --- Start Stockfish & extract features (copied from chess_analyser.py) ---
         board = chess.Board(fen)
-        with chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH) as engine:
-            features = compute_features(board, engine)
-        
-        # --- Targets (copied from chess_analyser.py) ---
-        targets = ["label_position_quality", "label_move_ease"]
-        predicted_scores = {}
-        eval_bars = {}
-        
-        # --- Predict each target (copied from chess_analyser.py) ---
-        for target in targets:
-            # Select feature columns (fall back to default if not specified for this elo range)
-            if elo_range in FEATURE_SETS and target in FEATURE_SETS[elo_range]:
-                feature_cols = FEATURE_SETS[elo_range][target]
-            else:
-                feature_cols = FEATURE_SETS["default"][target]
+        model_targets = tier_targets(tier)
+        indexed = lookup_opening(board, elo_range, time_control, tier, stage_timings)
+        if indexed is not None:
+            features, raw_scores = indexed
+            result = build_result(elo_range, time_control, features, raw_scores, tier)
+            result.update(source="opening_index", depth=opening_index.depth, final=True)
+            yield finish(result)
+            return
+        result = None
+        for depth, features, final in iter_features(board, elo_range, time_control, engine, depths, width, tier,
+                                                    deadline, stage_timings):
+            raw_scores = {target: predict_target(elo_range, time_control, model_target, features, stage_timings)
+                          for target, model_target in zip(TARGETS, model_targets)}
+            result = build_result(elo_range, time_control, features, raw_scores, tier)
+            result["depth"] = depth
+            result["final"] = final
+            yield finish(result)
+        if result is not None and not result["final"]:
+            # The next depth was cut off by the deadline: the last result stands
+            yield finish(dict(result, final=True))
+    except Exception as e:
+        yield {
+            "success": False,
+            "error": str(e)
+        }
 
-            # Prepare input
-            X = pd.DataFrame([{k: features[k] for k in feature_cols}])
+def analyze_position(fen, avg_elo=1500, time_control="blitz", engine=None, timings=False, width=None, tier="full",
+                     progressive=False, deadline_ms=None):
+    """
+    Analyze a chess position using the exact logic from chess_analyser.py.
+    Pass a running engine to reuse it; otherwise Stockfish is started for this call.
+    With timings=True the result gets a "timings" object (ms per stage), which is
+    also added to this process's running histograms. A width runs the selective
+    multipv search and is echoed back as "search_width" when it ran. tier="fast" predicts from
+    the static features only, without Stockfish; the result's "tier" says which was used.
+    With progressive=True, returns the analyze_position_progressive() generator instead.
+    With deadline_ms, the search deepens one depth at a time and the call returns
+    within about deadline_ms using the deepest completed depth ("depth_reached").
+    """
+    if progressive:
+        return analyze_position_progressive(fen, avg_elo, time_control, engine, width=width, tier=tier,
+                                            timings=timings, deadline_ms=deadline_ms)
+    try:
+        stage_timings = StageTimings() if timings else None
+        start = time.perf_counter()
+        elo_range = categorize_elo(avg_elo)
 
-            # Load model
-            model_path = os.path.join(MODEL_DIR, f"model_{elo_range}_{time_control}_{target}.pkl")
-            if not os.path.exists(model_path):
-                # If model doesn't exist, use a fallback value
-                predicted_score = 0.5  # neutral
-                eval_bar = 0.0
+        # --- Extract only the features the models need ---
+        board = chess.Board(fen)
+        indexed = lookup_opening(board, elo_range, time_control, tier, stage_timings)
+        if indexed is not None:
+            # --- Precomputed: no search, no model calls ---
+            features, raw_scores = indexed
+            depth = opening_index.depth
+        else:
+            if deadline_ms is None:
+                features = extract_features(board, elo_range, time_control, engine, stage_timings, width, tier)
             else:
-                model = joblib.load(model_path)
-                # Predict
-                predicted_score = model.predict(X)[0]
-                # Convert to eval bar
-                eval_bar = score_to_eval_bar(predicted_score, max_eval=10, extreme_scale=3)
+                deadline = start + (deadline_ms - DEADLINE_RESERVE_MS) / 1000
+                features, depth = extract_features_by_deadline(
+                    board, elo_range, time_control, engine, deadline, width, tier, stage_timings)
 
-            # Convert to native Python types for JSON serialization
-            predicted_scores[target] = convert_to_json_serializable(predicted_score)
-            eval_bars[target] = convert_to_json_serializable(eval_bar)
-
-        # --- Prepare features for display (copied from chess_analyser.py) ---
-        display_features = {}
-        for k, v in features.items():
-            if k not in ["top_moves", "evals_dict"]:
-                try:
-                    # Convert to native Python types for JSON serialization
-                    display_features[k] = convert_to_json_serializable(v)
-                except (ValueError, TypeError):
-                    display_features[k] = str(v)
+            # --- Predict each target (copied from chess_analyser.py) ---
+            raw_scores = {target: predict_target(elo_range, time_control, model_target, features, stage_timings)
+                          for target, model_target in zip(TARGETS, tier_targets(tier))}
+        result = build_result(elo_range, time_control, features, raw_scores, tier)
+        if indexed is not None:
+            result["source"] = "opening_index"
+        if width is not None and indexed is None and tier == "full":
+            # Only when a search actually ran at that width (not for index hits or the engine-free tier)
+            result["search_width"] = width
+        if deadline_ms is not None:
+            result["deadline_ms"] = deadline_ms
+            result["depth_reached"] = depth
 
-        return {
-            "success": True,
-            "position_quality": eval_bars.get("label_position_quality", 0.0),
-            "move_ease": eval_bars.get("label_move_ease", 0.0),
-            "features": display_features,
-            "elo_range": elo_range,
-            "time_control": time_control,
-            "raw_scores": {
-                "position_quality": predicted_scores.get("label_position_quality", 0.5),
-                "move_ease": predicted_scores.get("label_move_ease", 0.5)
-            }
-        }
+        if stage_timings is not None:
+            stage_timings.add("total", (time.perf_counter() - start) * 1000)
+            record_timings(stage_timings)
+            result["timings"] = stage_timings.to_dict()
+        return result
 
     except Exception as e:
         return {
@@ -156,13 +518,31 @@ def analyze_position(fen, avg_elo=1500, time_control="blitz"):
         }
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    width = next((int(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--width=")), None)
+    tier = next((a.split("=", 1)[1] for a in sys.argv[1:] if a.startswith("--tier=")), "full")
+    deadline_ms = next((float(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--deadline-ms=")), None)
+    if len(args) < 1:
         print(json.dumps({"success": False, "error": "No FEN provided"}))
         sys.exit(1)
     
-    fen = sys.argv[1]
-    avg_elo = int(sys.argv[2]) if len(sys.argv) > 2 else 1500
-    time_control = sys.argv[3] if len(sys.argv) > 3 else "blitz"
+    fen = args[0]
+    avg_elo = int(args[1]) if len(args) > 1 else 1500
+    time_control = args[2] if len(args) > 2 else "blitz"
     
-    result = analyze_position(fen, avg_elo, time_control)
+    if "--progressive" in sys.argv:
+        # JSON lines, flushed as soon as each depth is done
+        for result in analyze_position_progressive(fen, avg_elo, time_control, width=width, tier=tier,
+                                                   timings="--timings" in sys.argv, deadline_ms=deadline_ms):
+            print(json.dumps(result), flush=True)
+        sys.exit(0)
+
+    result = analyze_position(fen, avg_elo, time_control, timings="--timings" in sys.argv, width=width, tier=tier,
+                              deadline_ms=deadline_ms)
+    if _import_profiler is not None:
+        _import_profiler.uninstall()
+        result["startup_profile"] = dict(
+            _import_profiler.report(),
+            time_to_first_result_ms=round((time.perf_counter() - _START_TIME) * 1000, 1),
+        )
     print(json.dumps(result))
\ No newline at end of file
@@ -0,0 +1,358 @@
+# engine_replay.py
+"""
+Record-and-replay stand-in for Stockfish.
+
+RecordingEngine wraps a real engine and captures every depth-limited search
+result, keyed by (position, depth, multipv, searchmoves). ReplayEngine serves
+those results back deterministically, at near-zero cost, through the same
+analyse()/analysis() calls feature extraction and train_model.py make. Use it
+to benchmark the Python side in isolation or to re-derive features quickly.
+
+File format (gzip-compressed):
+    MAGIC | record count (uint32) | records
+    record = key length (uint16) | key (utf-8) | depth (uint16) | n (uint16) | n moves (uint16) | n scores (int32)
+Moves are packed like MoveEvals; scores are relative to the side to move, with
+mates stored as MATE_FLAG + moves-to-mate.
+
+Record positions from a FEN list (or a benchmarks corpus.json) with:
+    python ml_training/engine_replay.py record --engine stockfish --input fens.txt --output runs.replay
+
+open_engine(path) starts a real engine, or a ReplayEngine when path ends in .replay.
+With $STOCKFISH_RECORD set to a .replay path, every engine open_engine starts
+records its searches there, so real runs (train_model.py, score_games.py, the
+analysis service) can be recorded and later re-run from the file:
+    STOCKFISH_RECORD=runs.replay python ml_training/train_model.py
+    STOCKFISH_PATH=runs.replay python ml_training/train_model.py
+"""
+import argparse
+import gzip
+import json
+import os
+import struct
+import time
+from array import array
+from contextlib import contextmanager
+
+import chess
+import chess.engine
+
+try:
+    from ml_training.move_evals import decode_move, encode_move
+except ImportError:  # imported from inside ml_training/, e.g. by train_model.py
+    from move_evals import decode_move, encode_move
+
+REPLAY_SUFFIX = ".replay"
+# Replay file every engine started by open_engine records into
+RECORD_ENV = "STOCKFISH_RECORD"
+MAGIC = b"CARP"
+MATE_FLAG = 1 << 30
+_COUNT = struct.Struct("<I")
+_U16 = struct.Struct("<H")
+_SCORE_TYPECODE = "i" if array("i").itemsize == 4 else "l"
+
+
+def search_key(board, limit, multipv=None, root_moves=None):
+    """
+    Key of one search, or None if it cannot be replayed (not depth-limited).
+    A time cap on a depth-limited search (deadline mode) is not part of the key:
+    only searches that reached their depth are recorded, so replays always do.
+    """
+    if limit is None or limit.depth is None or limit.nodes or limit.mate:
+        return None
+    searchmoves = " ".join(sorted(m.uci() for m in root_moves)) if root_moves else ""
+    return f"{board.epd()}|{multipv or 0}|{searchmoves}|{limit.depth}"
+
+
+def _encode_score(score):
+    mate = score.mate()
+    if mate is not None:
+        return MATE_FLAG + mate
+    return score.score()
+
+
+def _decode_score(value):
+    if abs(value - MATE_FLAG) < MATE_FLAG // 2:
+        return chess.engine.Mate(value - MATE_FLAG)
+    return chess.engine.Cp(value)
+
+
+# --- File I/O ---
+def load_records(path):
+    """{key: (depth, moves, scores)} from a replay file."""
+    records = {}
+    with gzip.open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an engine replay file")
+    pos = len(MAGIC)
+    (count,) = _COUNT.unpack_from(data, pos)
+    pos += _COUNT.size
+    for _ in range(count):
+        (key_len,) = _U16.unpack_from(data, pos)
+        key = data[pos + 2:pos + 2 + key_len].decode("utf-8")
+        pos += 2 + key_len
+        depth, n = struct.unpack_from("<HH", data, pos)
+        pos += 4
+        moves = array("H", data[pos:pos + 2 * n])
+        pos += 2 * n
+        scores = array(_SCORE_TYPECODE, data[pos:pos + 4 * n])
+        pos += 4 * n
+        records[key] = (depth, moves, scores)
+    return records
+
+
+def save_records(path, records):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with gzip.open(tmp_path, "wb") as f:
+        f.write(MAGIC + _COUNT.pack(len(records)))
+        for key, (depth, moves, scores) in records.items():
+            encoded_key = key.encode("utf-8")
+            f.write(_U16.pack(len(encoded_key)) + encoded_key)
+            f.write(struct.pack("<HH", depth, len(moves)))
+            f.write(array("H", moves).tobytes() + array(_SCORE_TYPECODE, scores).tobytes())
+    os.replace(tmp_path, path)
+
+
+def _pack_infos(infos):
+    """(depth, moves, scores) from python-chess info dicts."""
+    infos = [info for info in infos if "score" in info]
+    depth = max((info.get("depth", 0) for info in infos), default=0)
+    moves = [encode_move(info["pv"][0] if info.get("pv") else None) for info in infos]
+    scores = [_encode_score(info["score"].relative) for info in infos]
+    return depth, moves, scores
+
+
+def _completed(infos, limit):
+    """False for a search stopped before its depth (by a time cap, or stopped early)."""
+    return all(info.get("depth", 0) >= limit.depth for info in infos if "score" in info)
+
+
+@contextmanager
+def _file_lock(path, timeout=30.0):
+    """Lock file held while merging into a replay file; a lock older than `timeout` is taken over."""
+    give_up = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.monotonic() > give_up:
+                fd = None
+                break
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        if fd is not None:
+            os.close(fd)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _unpack_infos(board, record):
+    depth, moves, scores = record
+    return [
+        {"pv": [decode_move(code)], "score": chess.engine.PovScore(_decode_score(value), board.turn),
+         "depth": depth, "multipv": i}
+        for i, (code, value) in enumerate(zip(moves, scores), 1)
+    ]
+
+
+class _FinishedAnalysis:
+    """Completed search with the SimpleAnalysisResult interface feature extraction uses."""
+
+    def __init__(self, infos):
+        self.multipv = infos
+        self.info = infos[0] if infos else {}
+
+    def wait(self):
+        return self.info
+
+    def stop(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class _RecordingAnalysis:
+    """
+    Wraps a running engine.analysis() and records its result once it has been
+    waited for, unless it was stopped first.
+    """
+
+    def __init__(self, analysis, records, key, limit):
+        self._analysis = analysis
+        self._records = records
+        self._key = key
+        self._limit = limit
+        self._stopped = False
+
+    @property
+    def multipv(self):
+        return self._analysis.multipv
+
+    @property
+    def info(self):
+        return self._analysis.info
+
+    def wait(self):
+        result = self._analysis.wait()
+        if self._key is not None and not self._stopped and _completed(self._analysis.multipv, self._limit):
+            self._records[self._key] = _pack_infos(self._analysis.multipv)
+        return result
+
+    def stop(self):
+        self._stopped = True
+        self._analysis.stop()
+
+    def __enter__(self):
+        self._analysis.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._analysis.__exit__(*exc)
+
+
+class RecordingEngine:
+    """
+    Delegates to a real engine and records depth-limited searches that reached
+    their depth; saved to `path` on quit(), merged with whatever other processes
+    recording into the same file saved meanwhile.
+    """
+
+    def __init__(self, engine, path):
+        self.engine = engine
+        self.path = path
+        self.records = load_records(path) if os.path.exists(path) else {}
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def analyse(self, board, limit, multipv=None, root_moves=None, **kwargs):
+        result = self.engine.analyse(board, limit, multipv=multipv, root_moves=root_moves, **kwargs)
+        key = search_key(board, limit, multipv, root_moves)
+        infos = result if multipv is not None else [result]
+        if key is not None and _completed(infos, limit):
+            self.records[key] = _pack_infos(infos)
+        return result
+
+    def analysis(self, board, limit=None, multipv=None, root_moves=None, **kwargs):
+        analysis = self.engine.analysis(board, limit, multipv=multipv, root_moves=root_moves, **kwargs)
+        return _RecordingAnalysis(analysis, self.records, search_key(board, limit, multipv, root_moves), limit)
+
+    def save(self):
+        with _file_lock(self.path + ".lock"):
+            records = load_records(self.path) if os.path.exists(self.path) else {}
+            records.update(self.records)
+            save_records(self.path, records)
+
+    def quit(self):
+        self.save()
+        self.engine.quit()
+
+    def close(self):
+        self.quit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.quit()
+
+
+class ReplayEngine:
+    """python-chess compatible engine answering from a replay file. Unrecorded searches raise EngineError."""
+
+    def __init__(self, path):
+        self.path = path
+        self.records = load_records(path)
+        self.id = {"name": f"replay:{os.path.basename(path)}"}
+
+    def _infos(self, board, limit, multipv, root_moves):
+        key = search_key(board, limit, multipv, root_moves)
+        record = self.records.get(key) if key is not None else None
+        if record is None:
+            raise chess.engine.EngineError(f"No recorded search for {key or board.fen()}")
+        return _unpack_infos(board, record)
+
+    def analyse(self, board, limit, multipv=None, root_moves=None, **kwargs):
+        infos = self._infos(board, limit, multipv, root_moves)
+        if multipv is None:
+            return infos[0] if infos else {}
+        return infos
+
+    def analysis(self, board, limit=None, multipv=None, root_moves=None, **kwargs):
+        return _FinishedAnalysis(self._infos(board, limit, multipv, root_moves))
+
+    def ping(self):
+        pass
+
+    def configure(self, options):
+        pass
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def open_engine(path, record_path=None):
+    """
+    Start the engine at `path` (a ReplayEngine for *.replay files). Its searches
+    are recorded to `record_path`, or to $STOCKFISH_RECORD when that is set.
+    """
+    if path.endswith(REPLAY_SUFFIX):
+        return ReplayEngine(path)
+    engine = chess.engine.SimpleEngine.popen_uci(path)
+    record_path = record_path or os.environ.get(RECORD_ENV)
+    if record_path:
+        return RecordingEngine(engine, record_path)
+    return engine
+
+
+def _read_fens(path):
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            corpus = json.load(f)
+        return [fen for fens in corpus.values() for fen in fens]
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    from feature_extraction import compute_features
+
+    parser = argparse.ArgumentParser(description="Record engine searches for ReplayEngine")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="Compute features for FENs with a real engine and record its searches")
+    record_parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"), required="STOCKFISH_PATH" not in os.environ)
+    record_parser.add_argument("--input", required=True, help="Text file with one FEN per line, or a benchmarks corpus.json")
+    record_parser.add_argument("--output", required=True, help="Replay file to create or extend (*.replay)")
+    info_parser = commands.add_parser("info", help="Summarize a replay file")
+    info_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        fens = _read_fens(args.input)
+        with RecordingEngine(chess.engine.SimpleEngine.popen_uci(args.engine), args.output) as engine:
+            for fen in fens:
+                compute_features(chess.Board(fen), engine)
+            print(f"Recorded {len(engine.records)} searches from {len(fens)} positions to {args.output}")
+    else:
+        records = load_records(args.path)
+        positions = {key.split("|", 1)[0] for key in records}
+        print(f"{args.path}: {len(records)} searches over {len(positions)} positions, "
+              f"{os.path.getsize(args.path)} bytes")
@@ -1,23 +1,143 @@
 #feature_extraction.py
 import os
+import time
+from functools import cached_property
 
 import chess
 import chess.engine
 import statistics
 
+try:
+    from ml_training.feature_vector import FEATURE_COLUMNS, FeatureVector
+    from ml_training.move_evals import MoveEvals
+except ImportError:  # imported from inside ml_training/, e.g. by train_model.py
+    from feature_vector import FEATURE_COLUMNS, FeatureVector
+    from move_evals import MoveEvals
+
 # ===== CONSTANTS =====
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 STOCKFISH_PATH = os.path.join(SCRIPT_DIR, "..", "stockfish-windows-x86-64-avx2.exe")
 DEPTH = 6
+LOWER_DEPTH = 1
+# Selective-width searches score moves outside the top `width` at this depth
+REDUCED_DEPTH = 2
 MATE_SCORE = 100000
 
-def evaluate_all_moves(board, engine, depth):
-    legal_moves = list(board.legal_moves)
-    n = len(legal_moves)
+PIECE_WEIGHTS = {
+    chess.QUEEN: 1.0,
+    chess.ROOK: 0.8,
+    chess.BISHOP: 0.7,
+    chess.KNIGHT: 0.5,
+    chess.PAWN: 0.7,
+    chess.KING: 0.9
+}
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+
+def evaluate_all_moves(board, engine, depth, width=None, reduced_depth=REDUCED_DEPTH, time_limit=None):
+    return collect_move_evals(board, start_all_moves_search(board, engine, depth, width, reduced_depth, time_limit))
+
+
+def start_all_moves_search(board, engine, depth, width=None, reduced_depth=REDUCED_DEPTH, time_limit=None):
+    """
+    Send a multipv search over every legal move to the engine and return without
+    waiting for it, so the caller can do other work while Stockfish searches.
+    With a width, only the engine's top `width` moves get the full multipv search
+    (see SelectiveSearch). time_limit (seconds) stops the search early; check
+    depth_reached() afterwards.
+    """
+    n = board.legal_moves.count()
     if n == 0:
+        return None
+
+    if width is not None and width < n:
+        return SelectiveSearch(board, engine, depth, width, reduced_depth, time_limit)
+    return engine.analysis(board, chess.engine.Limit(depth=depth, time=time_limit), multipv=n)
+
+
+class DeadlineExceeded(Exception):
+    """A deadline-capped search was stopped before it completed its depth."""
+
+
+def depth_reached(analysis):
+    """Depth every line of a finished search completed (for a SelectiveSearch, its full-depth lines)."""
+    infos = analysis.top_multipv if isinstance(analysis, SelectiveSearch) else analysis.multipv
+    return min((info.get("depth", 0) for info in infos if "score" in info), default=0)
+
+
+class SelectiveSearch:
+    """
+    Cheaper stand-in for a full-width multipv search. The top `width` moves are
+    searched with multipv at full depth; the remaining moves are then scored in
+    one searchmoves batch at reduced_depth, capped at the weakest top move's score
+    so that a shallow search never ranks them above the moves the full search kept.
+    time_limit caps both searches together; wait() raises DeadlineExceeded if the
+    remaining moves could not be scored to reduced_depth within it.
+    Same wait()/multipv/stop() interface as engine.analysis().
+    """
+
+    def __init__(self, board, engine, depth, width, reduced_depth=REDUCED_DEPTH, time_limit=None):
+        self.board = board
+        self.engine = engine
+        self.reduced_depth = reduced_depth
+        self.multipv = None
+        self.top_multipv = None
+        self._stopped = False
+        self._deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self._top = engine.analysis(board, chess.engine.Limit(depth=depth, time=time_limit), multipv=width)
+
+    def wait(self):
+        if self.multipv is not None:
+            return self.multipv[0] if self.multipv else {}
+
+        with self._top:
+            self._top.wait()
+            infos = [info for info in self._top.multipv if "score" in info]
+        self.top_multipv = list(infos)
+        searched = {info["pv"][0] for info in infos if info.get("pv")}
+        rest = [move for move in self.board.legal_moves if move not in searched]
+
+        if rest and infos and not self._stopped:
+            # The engine may only return some of the moves asked for; unscored ones default to 0
+            cap = min((info["score"] for info in infos), key=lambda score: score.relative)
+            limit = chess.engine.Limit(depth=self.reduced_depth)
+            if self._deadline is not None:
+                limit.time = self._deadline - time.perf_counter()
+                if limit.time <= 0:
+                    raise DeadlineExceeded(f"No time left to search the remaining moves to depth {self.reduced_depth}")
+            rest_infos = self.engine.analyse(self.board, limit, multipv=len(rest), root_moves=rest)
+            if self._deadline is not None and any(
+                    info.get("depth", 0) < self.reduced_depth for info in rest_infos if "score" in info):
+                raise DeadlineExceeded(f"Search stopped at the deadline before depth {self.reduced_depth}")
+            for info in rest_infos:
+                if info.get("pv") and info["pv"][0] in searched:
+                    continue
+                if "score" in info and info["score"].relative > cap.relative:
+                    info = dict(info, score=cap)
+                infos.append(info)
+
+        self.multipv = infos
+        return infos[0] if infos else {}
+
+    def stop(self):
+        self._stopped = True
+        self._top.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def collect_move_evals(board, analysis):
+    """Wait for a search started by start_all_moves_search and score every legal move."""
+    if analysis is None:
         return 0, {}
 
-    infos = engine.analyse(board, chess.engine.Limit(depth=depth), multipv=n)
+    with analysis:
+        analysis.wait()
+        infos = analysis.multipv
 
     results = {}
     for info in infos:
@@ -31,104 +151,74 @@ def evaluate_all_moves(board, engine, depth):
         results[move] = score
 
     # Fill missing moves with score 0
-    for m in legal_moves:
+    for m in board.legal_moves:
         results.setdefault(m, 0)
 
     best_eval = max(results.values()) if results else 0
     return best_eval, results
 
 
+# ===== STATIC FEATURES =====
+def compute_king_exposure(board, king_square):
+    # Define king zone (3×3 squares around king)
+    king_zone = [sq for sq in chess.SQUARES if chess.square_distance(king_square, sq) <= 1]
 
-def compute_features(board, engine, depth=DEPTH):
-    """
-    Compute human-playability metrics for a given board state.
-    Optimized to use a single engine call for all move evaluations.
-    """
-    legal_moves = list(board.legal_moves)
-    n_moves = len(legal_moves)
+    exposure_score = 0
+    for sq in king_zone:
+        attackers = board.attackers(not board.turn, sq)
+        for attacker_sq in attackers:
+            piece_type = board.piece_type_at(attacker_sq)
+            if piece_type:
+                exposure_score += PIECE_WEIGHTS.get(piece_type, 0.5)  # Default weight 0.5
 
+    return exposure_score
 
-    pins = sum(
-        1 for sq, piece in board.piece_map().items()
-        if board.is_pinned(piece.color, sq)
-    )
-    pins = 0 #incomplete feature
-    tactical_motifs = pins
-
-    PIECE_WEIGHTS = {
-        chess.QUEEN: 1.0,
-        chess.ROOK: 0.8,
-        chess.BISHOP: 0.7,
-        chess.KNIGHT: 0.5,
-        chess.PAWN: 0.7,
-        chess.KING: 0.9
-    }
-    king_square = board.king(board.turn)
 
-    def compute_king_exposure(board):
+def compute_castling_status(board):
+    if board.turn == chess.WHITE:
+        kingside = board.has_kingside_castling_rights(chess.WHITE)
+        queenside = board.has_queenside_castling_rights(chess.WHITE)
+    else:
+        kingside = board.has_kingside_castling_rights(chess.BLACK)
+        queenside = board.has_queenside_castling_rights(chess.BLACK)
+
+    if kingside and queenside:
+        return 3
+    elif kingside:
+        return 2
+    elif queenside:
+        return 1
+    else:
+        return 0
 
-        # Define king zone (3×3 squares around king)
-        king_zone = [sq for sq in chess.SQUARES if chess.square_distance(king_square, sq) <= 1]
 
-        exposure_score = 0
-        for sq in king_zone:
-            attackers = board.attackers(not board.turn, sq)
-            for attacker_sq in attackers:
-                piece_type = board.piece_type_at(attacker_sq)
-                if piece_type:
-                    exposure_score += PIECE_WEIGHTS.get(piece_type, 0.5)  # Default weight 0.5
+def compute_defending_pieces(board, king_square):
+    piece_weights = {
+        chess.PAWN: 0.7,
+        chess.KNIGHT: 1.0,
+        chess.BISHOP: 1.2,
+        chess.ROOK: 1.5,
+        chess.QUEEN: 2.0
+    }
 
-        return exposure_score
-    king_exposure = compute_king_exposure(board)
+    defending_score = 0
+    for piece_type, weight in piece_weights.items():
+        for sq in board.pieces(piece_type, board.turn):
+            if chess.square_distance(sq, king_square) <= 2:
+                defending_score += weight
 
-    has_kingside = board.has_kingside_castling_rights(board.turn)
-    has_queenside = board.has_queenside_castling_rights(board.turn)
+    return defending_score
 
-    def compute_castling_status(board):
-        if board.turn == chess.WHITE:
-            kingside = board.has_kingside_castling_rights(chess.WHITE)
-            queenside = board.has_queenside_castling_rights(chess.WHITE)
-        else:
-            kingside = board.has_kingside_castling_rights(chess.BLACK)
-            queenside = board.has_queenside_castling_rights(chess.BLACK)
-
-        if kingside and queenside:
-            return 3
-        elif kingside:
-            return 2
-        elif queenside:
-            return 1
-        else:
-            return 0
-    castling_status = compute_castling_status(board)
-
-    def compute_defending_pieces(board, king_square):
-        piece_weights = {
-            chess.PAWN: 0.7,
-            chess.KNIGHT: 1.0,
-            chess.BISHOP: 1.2,
-            chess.ROOK: 1.5,
-            chess.QUEEN: 2.0
-        }
-
-        defending_score = 0
-        for piece_type, weight in piece_weights.items():
-            for sq in board.pieces(piece_type, board.turn):
-                if chess.square_distance(sq, king_square) <= 2:
-                    defending_score += weight
-
-        return defending_score
-
-    defending_pieces = compute_defending_pieces(board, king_square)
-
-    # Pawn structure
-    doubled_pawns = sum(
+
+def compute_doubled_pawns(board):
+    return sum(
         [list(chess.square_file(sq) for sq in board.pieces(chess.PAWN, not board.turn)).count(f) - 1 for f in
          set(chess.square_file(sq) for sq in board.pieces(chess.PAWN, not board.turn))]) - sum(
         [list(chess.square_file(sq) for sq in board.pieces(chess.PAWN, board.turn)).count(f) - 1 for f in
          set(chess.square_file(sq) for sq in board.pieces(chess.PAWN, board.turn))])
 
-    # Backward pawn detection
+
+def compute_backward_pawns(board):
     backward_pawns = (
             sum(
                 1 for p in board.pieces(chess.PAWN, chess.WHITE)
@@ -150,172 +240,164 @@ def compute_features(board, engine, depth=DEPTH):
     # If it's Black's turn, invert the sign
     if not board.turn:
         backward_pawns = -backward_pawns
+    return backward_pawns
 
-    def pawn_islands(pawns):
-        """Return list of islands, each island is a set of files occupied."""
-        if not pawns:
-            return []
-        files = sorted(set(chess.square_file(p) for p in pawns))
-        islands = []
-        current = [files[0]]
-
-        for f in files[1:]:
-            if f == current[-1] + 1:
-                current.append(f)
-            else:
-                islands.append(set(current))
-                current = [f]
-        islands.append(set(current))
-        return islands
 
-    def compute_pawn_majority(board):
-        side = board.turn
-        opponent = not side
+def pawn_islands(pawns):
+    """Return list of islands, each island is a set of files occupied."""
+    if not pawns:
+        return []
+    files = sorted(set(chess.square_file(p) for p in pawns))
+    islands = []
+    current = [files[0]]
 
-        side_pawns = list(board.pieces(chess.PAWN, side))
-        opp_pawns = list(board.pieces(chess.PAWN, opponent))
+    for f in files[1:]:
+        if f == current[-1] + 1:
+            current.append(f)
+        else:
+            islands.append(set(current))
+            current = [f]
+    islands.append(set(current))
+    return islands
 
-        side_islands = pawn_islands(side_pawns)
-        opp_islands = pawn_islands(opp_pawns)
 
-        score = 0.0
+def compute_pawn_majority(board):
+    side = board.turn
+    opponent = not side
 
-        # Define the weights for single-pawn advantages
-        weights = {1: 1.0, 2: 0.8, 3: 0.7, 4: 0.6, 5: 0.5}
+    side_pawns = list(board.pieces(chess.PAWN, side))
+    opp_pawns = list(board.pieces(chess.PAWN, opponent))
 
-        for isl in side_islands:
-            overlap = [o for o in opp_islands if not (max(o) < min(isl) or min(o) > max(isl))]
+    side_islands = pawn_islands(side_pawns)
+    opp_islands = pawn_islands(opp_pawns)
 
-            if overlap:
-                opp_count = max(len(o) for o in overlap)
-            else:
-                opp_count = 0
+    score = 0.0
 
-            my_count = len(isl)
-            diff = my_count - opp_count
+    # Define the weights for single-pawn advantages
+    weights = {1: 1.0, 2: 0.8, 3: 0.7, 4: 0.6, 5: 0.5}
 
-            if diff > 0:
-                # Use capped key for weights (max 5)
-                base = weights.get(my_count, 0.5)
+    for isl in side_islands:
+        overlap = [o for o in opp_islands if not (max(o) < min(isl) or min(o) > max(isl))]
 
-                # If advantage is 2 pawns, double the value
-                if diff == 2:
-                    score += 2.5 * base
-                elif diff >= 3:
-                    score += 4 * base
-                else:
-                    score += base
+        if overlap:
+            opp_count = max(len(o) for o in overlap)
+        else:
+            opp_count = 0
 
+        my_count = len(isl)
+        diff = my_count - opp_count
 
-        for isl in opp_islands:
-            overlap = [o for o in side_islands if not (max(o) < min(isl) or min(o) > max(isl))]
+        if diff > 0:
+            # Use capped key for weights (max 5)
+            base = weights.get(my_count, 0.5)
 
-            if overlap:
-                my_count = max(len(o) for o in overlap)
+            # If advantage is 2 pawns, double the value
+            if diff == 2:
+                score += 2.5 * base
+            elif diff >= 3:
+                score += 4 * base
             else:
-                my_count = 0
+                score += base
 
-            opp_count = len(isl)
-            diff = my_count - opp_count
 
-            if diff < 0:
-                # Opponent has majority → subtract
-                base = weights.get(opp_count, 0.5)
+    for isl in opp_islands:
+        overlap = [o for o in side_islands if not (max(o) < min(isl) or min(o) > max(isl))]
 
-                if diff == -2:
-                    score -= 2.5 * base
-                elif diff <= -3:
-                    score -= 4 * base
-                else:
-                    score -= base
+        if overlap:
+            my_count = max(len(o) for o in overlap)
+        else:
+            my_count = 0
 
-        return score
+        opp_count = len(isl)
+        diff = my_count - opp_count
 
-    pawn_majority = compute_pawn_majority(board)
+        if diff < 0:
+            # Opponent has majority → subtract
+            base = weights.get(opp_count, 0.5)
 
-    def compute_mobility(board):
-        safe_moves = 0
-        my_color = board.turn
+            if diff == -2:
+                score -= 2.5 * base
+            elif diff <= -3:
+                score -= 4 * base
+            else:
+                score -= base
 
-        piece_safe_moves = {}
+    return score
 
-        for move in board.generate_pseudo_legal_moves():
-            if board.piece_at(move.from_square).color != my_color:
-                continue
 
-            if is_safe_move(board, move.from_square, move.to_square, my_color):
-                safe_moves += 1
-                piece = board.piece_at(move.from_square)
-                piece_name = piece.symbol()
-                piece_safe_moves.setdefault(piece_name, 0)
-                piece_safe_moves[piece_name] += 1
-
-        # # Debug print: safe moves per piece
-        # for piece_name, count in piece_safe_moves.items():
-        #     print(f"Piece {piece_name} has {count} safe moves")
-        #
-        # print("Total mobility score:", safe_moves)
-        return safe_moves
-
-    def is_safe_move(board, from_square, to_square, my_color):
-        piece_value_map = {
-            chess.PAWN: 1,
-            chess.KNIGHT: 3,
-            chess.BISHOP: 3,
-            chess.ROOK: 5,
-            chess.QUEEN: 9,
-            chess.KING: 100
-        }
-
-        moving_piece = board.piece_at(from_square)
-        if not moving_piece:
-            return False
+def is_safe_move(board, from_square, to_square, my_color):
+    piece_value_map = {
+        chess.PAWN: 1,
+        chess.KNIGHT: 3,
+        chess.BISHOP: 3,
+        chess.ROOK: 5,
+        chess.QUEEN: 9,
+        chess.KING: 100
+    }
 
-        moving_value = piece_value_map[moving_piece.piece_type]
+    moving_piece = board.piece_at(from_square)
+    if not moving_piece:
+        return False
 
-        # If destination square occupied by same color → not safe
-        if board.piece_at(to_square) and board.piece_at(to_square).color == my_color:
-            return False
+    moving_value = piece_value_map[moving_piece.piece_type]
 
-        # Check threats to target square
-        attackers = list(board.attackers(not my_color, to_square))
-        if not attackers:
-            return True  # no threat at all
+    # If destination square occupied by same color → not safe
+    if board.piece_at(to_square) and board.piece_at(to_square).color == my_color:
+        return False
 
-        for attacker_square in attackers:
-            attacker = board.piece_at(attacker_square)
-            if not attacker:
-                continue
+    # Check threats to target square
+    attackers = list(board.attackers(not my_color, to_square))
+    if not attackers:
+        return True  # no threat at all
+
+    for attacker_square in attackers:
+        attacker = board.piece_at(attacker_square)
+        if not attacker:
+            continue
 
-            attacker_value = piece_value_map[attacker.piece_type]
+        attacker_value = piece_value_map[attacker.piece_type]
+
+        # Captured by less important piece → not safe
+        if attacker_value < moving_value:
+            return False
 
-            # Captured by less important piece → not safe
-            if attacker_value < moving_value:
+        # Captured by more important piece → safe only if defended
+        if attacker_value >= moving_value:
+            defenders = list(board.attackers(my_color, to_square))
+            if from_square in defenders:
+                defenders.remove(from_square)  # ignore self-attack
+
+            if not defenders:
                 return False
 
-            # Captured by more important piece → safe only if defended
-            if attacker_value >= moving_value:
-                defenders = list(board.attackers(my_color, to_square))
-                if from_square in defenders:
-                    defenders.remove(from_square)  # ignore self-attack
+    return True
+
+
+def compute_mobility(board):
+    safe_moves = 0
+    my_color = board.turn
+
+    for move in board.generate_pseudo_legal_moves():
+        if board.piece_at(move.from_square).color != my_color:
+            continue
 
-                if not defenders:
-                    return False
+        if is_safe_move(board, move.from_square, move.to_square, my_color):
+            safe_moves += 1
 
-        return True
+    return safe_moves
 
-    mobility = compute_mobility(board)
 
-    # Piece coordination
+def compute_piece_coordination(board):
     pieces = board.piece_map()
     my_pieces = {sq: piece for sq, piece in pieces.items() if piece.color == board.turn}
     connectedness = sum(
         1 for sq, piece in my_pieces.items()
         if len(board.attackers(piece.color, sq)) >= 1
     )
-    piece_coordination = connectedness / max(1, len(my_pieces))
+    return connectedness / max(1, len(my_pieces))
 
-    # Hanging pieces
+
+def compute_hanging_pieces(board):
     hanging_pieces = 0
     major_pieces = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
 
@@ -326,59 +408,152 @@ def compute_features(board, engine, depth=DEPTH):
     for square in board.pieces(chess.PAWN, board.turn):
         if not board.is_attacked_by(board.turn, square):
             hanging_pieces += 0.25
+    return hanging_pieces
+
 
+def compute_rooks_connected(board):
     rooks = list(board.pieces(chess.ROOK, board.turn))
-    rooks_connected = int(len(rooks) == 2 and board.is_attacked_by(board.turn, rooks[0]) and board.is_attacked_by(board.turn, rooks[1]))
-    bishop_pair = int(len(board.pieces(chess.BISHOP, board.turn)) == 2)
+    return int(len(rooks) == 2 and board.is_attacked_by(board.turn, rooks[0]) and board.is_attacked_by(board.turn, rooks[1]))
 
 
-    def overworked_pieces(board):
+def overworked_pieces(board):
+    """
+        Returns a list of squares where the piece protects 2 or more
+        major pieces (rook or queen) that are not defended by any other piece.
         """
-            Returns a list of squares where the piece protects 2 or more
-            major pieces (rook or queen) that are not defended by any other piece.
-            """
-        MAJOR_PIECES = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
-        count = 0
-        for square in chess.SQUARES:
-            piece = board.piece_at(square)
-            if piece is None:
+    MAJOR_PIECES = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
+    count = 0
+    for square in chess.SQUARES:
+        piece = board.piece_at(square)
+        if piece is None:
+            continue
+
+        protected_major_count = 0
+        attacked_squares = board.attacks(square)
+
+        for target_square in attacked_squares:
+            target_piece = board.piece_at(target_square)
+            if target_piece is None:
+                continue
+            if target_piece.color != piece.color:
+                continue
+            if target_piece.piece_type not in MAJOR_PIECES:
                 continue
 
-            protected_major_count = 0
-            attacked_squares = board.attacks(square)
+            # Check if target_piece is defended by any other piece
+            defenders = board.attackers(piece.color, target_square)
+            if len(defenders) == 1 and square in defenders:
+                protected_major_count += 1
+        if piece.color is board.turn and protected_major_count >= 2:
+            count += 1
+        if piece.color is not board.turn and protected_major_count >= 2:
+            count -= 1
 
-            for target_square in attacked_squares:
-                target_piece = board.piece_at(target_square)
-                if target_piece is None:
-                    continue
-                if target_piece.color != piece.color:
-                    continue
-                if target_piece.piece_type not in MAJOR_PIECES:
-                    continue
+    return count
 
-                # Check if target_piece is defended by any other piece
-                defenders = board.attackers(piece.color, target_square)
-                if len(defenders) == 1 and square in defenders:
-                    protected_major_count += 1
-            if piece.color is board.turn and protected_major_count >= 2:
-                count += 1
-            if piece.color is not board.turn and protected_major_count >= 2:
-                count -= 1
-
-        return count
-    overworked = overworked_pieces(board)
-
-    # Engine-heavy features
-    best_eval, evals_dict = evaluate_all_moves(board, engine, DEPTH)
-    stockfish_eval = best_eval
-    evals = list(evals_dict.values())
-    # print("Best eval:", best_eval)
-    # print("Legal moves and their evaluations:")
-    #
-    # for move_uci, score in evals_dict.items():
-    #     print(f"Move: {move_uci}, Eval: {score}")
+
+def compute_material_imbalance(board):
+    return sum(PIECE_VALUES[p.piece_type] if p.color == board.turn else -PIECE_VALUES[p.piece_type]
+               for p in board.piece_map().values())
+
+
+def compute_phase(board):
+    # Count total number of pieces for both sides
+    pieces_left = len(board.piece_map())
+
+    # Define phase based on number of pieces left
+    if pieces_left > 20:
+        return 0  # Opening
+    elif pieces_left > 10:
+        return 1  # Middlegame
+    else:
+        return 2  # Endgame
 
 
+def compute_space_control(board):
+    white_control = 0
+    black_control = 0
+
+    for square in chess.SQUARES:
+        white_attacks = len(board.attackers(chess.WHITE, square))
+        black_attacks = len(board.attackers(chess.BLACK, square))
+
+        # Add occupying piece to control
+        piece = board.piece_at(square)
+        if piece:
+            if piece.color == chess.WHITE:
+                white_attacks += 1
+            else:
+                black_attacks += 1
+
+        if white_attacks > black_attacks:
+            white_control += 1
+        elif black_attacks > white_attacks:
+            black_control += 1
+
+    return white_control - black_control
+
+
+def weighted_passed_pawns(board, color):
+    pawns = [p for p in board.pieces(chess.PAWN, color)]
+    files = {}
+
+    # Group passed pawns by file
+    for p in pawns:
+        f, r = chess.square_file(p), chess.square_rank(p)
+        ranks_ahead = range(r + 1, 8) if color == chess.WHITE else range(0, r)
+        blocked = any(
+            board.piece_at(chess.square(f + dx, r_target)) and
+            board.piece_at(chess.square(f + dx, r_target)).piece_type == chess.PAWN and
+            board.piece_at(chess.square(f + dx, r_target)).color != color
+            for dx in [-1, 0, 1] if 0 <= f + dx < 8
+            for r_target in ranks_ahead if 0 <= r_target < 8
+        )
+        if not blocked:
+            files.setdefault(f, []).append(p)
+
+    score = 0
+    counted_files = set()
+    for f in files:
+        # Check for connected passed pawns on adjacent files
+        if f - 1 in files or f + 1 in files:
+            score += 1.25
+            counted_files.add(f)
+        elif f not in counted_files:
+            # Only single passed pawns on this file
+            score += min(len(files[f]) * 0.6, 2.5)  # If multiple pawns on same file, cap at 2.5
+            counted_files.add(f)
+    return score
+
+
+def compute_passed_pawns(board):
+    passed_pawns = weighted_passed_pawns(board, chess.WHITE) - weighted_passed_pawns(board, chess.BLACK)
+    if not board.turn:
+        passed_pawns = -passed_pawns
+    return passed_pawns
+
+
+def compute_center_control(board):
+    center_squares = [chess.D4, chess.E4, chess.D5, chess.E5]
+
+    center_control = 0
+    for sq in center_squares:
+        white_attacks = len(board.attackers(chess.WHITE, sq))
+        black_attacks = len(board.attackers(chess.BLACK, sq))
+        piece = board.piece_at(sq)
+        if piece:
+            if piece.color == chess.WHITE:
+                white_attacks += 1
+            else:
+                black_attacks += 1
+        center_control += (white_attacks - black_attacks)/max(abs(white_attacks - black_attacks), 1)
+    return center_control
+
+
+# ===== ENGINE FEATURES =====
+def compute_volatility(best_eval, evals_dict):
+    evals = list(evals_dict.values())
+
     if len(evals) > 1:
         blunder_score = 0.0
         losses = []
@@ -425,228 +600,393 @@ def compute_features(board, engine, depth=DEPTH):
         variance = statistics.variance(evals) / (eval_range ** 2 + 1e-6) if eval_range > 0 else 0
 
         # combine into volatility
-        volatility = 0.7 * blunder_ratio + 0.3 * variance
+        return 0.7 * blunder_ratio + 0.3 * variance
     else:
-        volatility = 0.0
-
-    def compute_trap_susceptibility(board, engine, evals_dict, lower_depth=1):
-        # Step 1: Evaluate all moves at lower depth
-        lower_best_eval, lower_evals_dict = evaluate_all_moves(board, engine, lower_depth)
+        return 0.0
 
-        trap_moves = 0
-        candidate_moves = 0
 
-        # Step 2: Define threshold for "best moves" at depth 2
-        threshold = 0.7  # Keep at least 70% of advantage
+def compute_trap_susceptibility(board, engine, evals_dict, lower_depth=LOWER_DEPTH, lower_search=None):
+    # Step 1: Evaluate all moves at lower depth
+    if lower_search is None:
+        lower_search = evaluate_all_moves(board, engine, lower_depth)
+    lower_best_eval, lower_evals_dict = lower_search
 
-        for move_uci, eval_at_lower_depth in lower_evals_dict.items():
-            # Check if move is a "best move"
-            if lower_best_eval >= 0:
-                keeps_advantage = (eval_at_lower_depth >= lower_best_eval * threshold)
-            else:
-                keeps_advantage = eval_at_lower_depth >= lower_best_eval * (
-                            1 + 0.2) if lower_best_eval <= -300 else eval_at_lower_depth >= lower_best_eval * (1 + 0.4)
-
-            if eval_at_lower_depth == MATE_SCORE or -MATE_SCORE:
-                keeps_advantage = True
-            if keeps_advantage:
-                candidate_moves += 1
-
-                # Step 3: Check deeper evaluation
-                deeper_eval = evals_dict.get(chess.Move.from_uci(str(move_uci)))
-                if eval_at_lower_depth == MATE_SCORE:
-                    trap_moves += 1
-                    continue
-                if eval_at_lower_depth == -MATE_SCORE and deeper_eval < 200:
-                    trap_moves += 1
-                    continue
-                # Trap detection: deeper eval significantly worse
-                if deeper_eval < eval_at_lower_depth - 450 and deeper_eval < 500:  # drop ≥ 1.5 pawns
-                    trap_moves += 1
-                elif deeper_eval < eval_at_lower_depth - 600 and deeper_eval >= 500:
-                    trap_moves += 1
+    trap_moves = 0
+    candidate_moves = 0
 
-        # Step 4: Normalize
-        return trap_moves / max(1, candidate_moves)
+    # Step 2: Define threshold for "best moves" at depth 2
+    threshold = 0.7  # Keep at least 70% of advantage
 
-    trap_susceptibility = compute_trap_susceptibility(board, engine, evals_dict)
-
-
-    def compute_move_ease(board, legal_moves, best_eval, evals_dict):
-        top_moves, decent_moves = 0, 0
+    for move_uci, eval_at_lower_depth in lower_evals_dict.items():
+        # Check if move is a "best move"
+        if lower_best_eval >= 0:
+            keeps_advantage = (eval_at_lower_depth >= lower_best_eval * threshold)
+        else:
+            keeps_advantage = eval_at_lower_depth >= lower_best_eval * (
+                        1 + 0.2) if lower_best_eval <= -300 else eval_at_lower_depth >= lower_best_eval * (1 + 0.4)
+
+        if eval_at_lower_depth == MATE_SCORE or -MATE_SCORE:
+            keeps_advantage = True
+        if keeps_advantage:
+            candidate_moves += 1
+
+            # Step 3: Check deeper evaluation
+            deeper_eval = evals_dict.get(chess.Move.from_uci(str(move_uci)))
+            if eval_at_lower_depth == MATE_SCORE:
+                trap_moves += 1
+                continue
+            if eval_at_lower_depth == -MATE_SCORE and deeper_eval < 200:
+                trap_moves += 1
+                continue
+            # Trap detection: deeper eval significantly worse
+            if deeper_eval < eval_at_lower_depth - 450 and deeper_eval < 500:  # drop ≥ 1.5 pawns
+                trap_moves += 1
+            elif deeper_eval < eval_at_lower_depth - 600 and deeper_eval >= 500:
+                trap_moves += 1
+
+    # Step 4: Normalize
+    return trap_moves / max(1, candidate_moves)
+
+
+def compute_move_ease(board, legal_moves, best_eval, evals_dict):
+    top_moves, decent_moves = 0, 0
+
+    good_moves = 0
+    for move in legal_moves:
+        move_eval = evals_dict.get(move, None)
+        # Determine if it's a top move
+        if best_eval >= 0:
+            keeps_advantage = (move_eval >= best_eval * 0.7)
+            increases_disadvantage = False
+        else:
+            if best_eval <= -300:  # big disadvantage (< -3 pawns)
+                increases_disadvantage = (move_eval >= best_eval * 1.2)
+            elif best_eval <= -100:  # smaller disadvantage
+                increases_disadvantage = (move_eval >= best_eval * 1.4)
+            else:
+                increases_disadvantage = (move_eval >= best_eval * 1.8)
+            keeps_advantage = False
 
-        good_moves = 0
-        for move in legal_moves:
-            move_eval = evals_dict.get(move, None)
-            # Determine if it's a top move
+        is_top_move = keeps_advantage or increases_disadvantage
+        # Determine if it's a decent move
+        if not is_top_move:
             if best_eval >= 0:
-                keeps_advantage = (move_eval >= best_eval * 0.7)
-                increases_disadvantage = False
+                keeps_half_advantage = (move_eval >= best_eval * 0.5)
+                increases_disadvantage_decent = False
             else:
-                if best_eval <= -300:  # big disadvantage (< -3 pawns)
-                    increases_disadvantage = (move_eval >= best_eval * 1.2)
+                if best_eval <= -300:
+                    increases_disadvantage_decent = (move_eval >= best_eval * 1.6)
                 elif best_eval <= -100:  # smaller disadvantage
-                    increases_disadvantage = (move_eval >= best_eval * 1.4)
+                    increases_disadvantage_decent = (move_eval >= best_eval * 1.8)
                 else:
-                    increases_disadvantage = (move_eval >= best_eval * 1.8)
-                keeps_advantage = False
-
-            is_top_move = keeps_advantage or increases_disadvantage
-            # Determine if it's a decent move
-            if not is_top_move:
-                if best_eval >= 0:
-                    keeps_half_advantage = (move_eval >= best_eval * 0.5)
-                    increases_disadvantage_decent = False
-                else:
-                    if best_eval <= -300:
-                        increases_disadvantage_decent = (move_eval >= best_eval * 1.6)
-                    elif best_eval <= -100:  # smaller disadvantage
-                        increases_disadvantage_decent = (move_eval >= best_eval * 1.8)
-                    else:
-                        increases_disadvantage_decent = (move_eval >= best_eval * 2.2)
-                    keeps_half_advantage = False
-
-                is_decent_move = keeps_half_advantage or increases_disadvantage_decent
-            else:
-                is_decent_move = False
+                    increases_disadvantage_decent = (move_eval >= best_eval * 2.2)
+                keeps_half_advantage = False
 
-            # Score increases
-            if is_top_move:
-                good_moves += 1
-                if board.gives_check(move) or board.is_capture(move):
-                    top_moves += 1
-            elif is_decent_move:
-                good_moves += 1
-                if board.gives_check(move) or board.is_capture(move):
-                    decent_moves += 1
-        move_ease_score = (top_moves + 0.4 * decent_moves) / max(1, good_moves)
-
-        return move_ease_score
-
-    move_ease = compute_move_ease(board, legal_moves, best_eval, evals_dict)
+            is_decent_move = keeps_half_advantage or increases_disadvantage_decent
+        else:
+            is_decent_move = False
 
-    # Material imbalance
-    PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9, chess.KING: 0}
+        # Score increases
+        if is_top_move:
+            good_moves += 1
+            if board.gives_check(move) or board.is_capture(move):
+                top_moves += 1
+        elif is_decent_move:
+            good_moves += 1
+            if board.gives_check(move) or board.is_capture(move):
+                decent_moves += 1
+    move_ease_score = (top_moves + 0.4 * decent_moves) / max(1, good_moves)
 
-    player_color = board.turn
-    material_imbalance = sum(PIECE_VALUES[p.piece_type] if p.color == board.turn else -PIECE_VALUES[p.piece_type]
-                        for p in board.piece_map().values())
-    # Count total number of pieces for both sides
-    pieces_left = len(board.piece_map())
+    return move_ease_score
 
-    # Define phase based on number of pieces left
-    if pieces_left > 20:
-        phase = 0  # Opening
-    elif pieces_left > 10:
-        phase = 1  # Middlegame
-    else:
-        phase = 2  # Endgame
-
-    # Space and passed pawns
-    def compute_space_control(board):
-        white_control = 0
-        black_control = 0
-
-        for square in chess.SQUARES:
-            white_attacks = len(board.attackers(chess.WHITE, square))
-            black_attacks = len(board.attackers(chess.BLACK, square))
-
-            # Add occupying piece to control
-            piece = board.piece_at(square)
-            if piece:
-                if piece.color == chess.WHITE:
-                    white_attacks += 1
-                else:
-                    black_attacks += 1
-
-            if white_attacks > black_attacks:
-                white_control += 1
-            elif black_attacks > white_attacks:
-                black_control += 1
-
-        return white_control - black_control
-
-    space_control = compute_space_control(board)
-    if board.turn == chess.BLACK:
-        space_control = -space_control
-
-    def weighted_passed_pawns(board, color):
-        pawns = [p for p in board.pieces(chess.PAWN, color)]
-        files = {}
-
-        # Group passed pawns by file
-        for p in pawns:
-            f, r = chess.square_file(p), chess.square_rank(p)
-            ranks_ahead = range(r + 1, 8) if color == chess.WHITE else range(0, r)
-            blocked = any(
-                board.piece_at(chess.square(f + dx, r_target)) and
-                board.piece_at(chess.square(f + dx, r_target)).piece_type == chess.PAWN and
-                board.piece_at(chess.square(f + dx, r_target)).color != color
-                for dx in [-1, 0, 1] if 0 <= f + dx < 8
-                for r_target in ranks_ahead if 0 <= r_target < 8
-            )
-            if not blocked:
-                files.setdefault(f, []).append(p)
-
-        score = 0
-        counted_files = set()
-        for f in files:
-            # Check for connected passed pawns on adjacent files
-            if f - 1 in files or f + 1 in files:
-                score += 1.25
-                counted_files.add(f)
-            elif f not in counted_files:
-                # Only single passed pawns on this file
-                score += min(len(files[f]) * 0.6, 2.5)  # If multiple pawns on same file, cap at 2.5
-                counted_files.add(f)
-        return score
-
-    passed_pawns = weighted_passed_pawns(board, chess.WHITE) - weighted_passed_pawns(board, chess.BLACK)
-    if not board.turn:
-        passed_pawns = -passed_pawns
 
-    center_squares = [chess.D4, chess.E4, chess.D5, chess.E5]
+# ===== FEATURE REGISTRY =====
+class FeatureContext:
+    """
+    Per-position state shared between features. Everything here, including
+    the two engine searches, is computed on first use only.
+    With a StageTimings, the searches are timed and the time spent waiting
+    for them is tracked in search_wait_ms. With a deadline (a time.perf_counter()
+    timestamp) the full-depth search is capped to it, and reading `search` raises
+    DeadlineExceeded if the search could not complete its depth in time.
+    `searches` is a {(depth, width): result} dict that can be shared between
+    contexts for the same position (e.g. one per search depth), so a search
+    already completed, such as the depth-1 lower search, is not repeated.
+    """
 
-    center_control = 0
-    for sq in center_squares:
-        white_attacks = len(board.attackers(chess.WHITE, sq))
-        black_attacks = len(board.attackers(chess.BLACK, sq))
-        piece = board.piece_at(sq)
-        if piece:
-            if piece.color == chess.WHITE:
-                white_attacks += 1
-            else:
-                black_attacks += 1
-        center_control += (white_attacks - black_attacks)/max(abs(white_attacks - black_attacks), 1)
-    if board.turn == chess.BLACK:
-        space_control = -space_control
-
-    return {
-        "volatility": volatility,
-        "move_ease": move_ease,
-        "trap_susceptibility": trap_susceptibility,
-        "king_exposure": king_exposure,
-        # "castling_status": castling_status,
-        "defending_pieces": defending_pieces,
-        "doubled_pawns": doubled_pawns,
-        "backward_pawns": backward_pawns,
-        "pawn_majority": pawn_majority,
-        "mobility": mobility,
-        "piece_coordination": piece_coordination,
-        "hanging_pieces": hanging_pieces,
-        "rooks_connected": rooks_connected,
-        "bishop_pair": bishop_pair,
-        "overworked_defenders": overworked,
-        # "checks": checks,
-        # "captures": captures,
-        "pins": pins,
-        "tactical_motifs": tactical_motifs,
-        "material_imbalance": material_imbalance,
-        "phase": phase,
-        "space_control": space_control,
-        "passed_pawns": passed_pawns,
-        "center_control": center_control,
-        "stockfish_eval": stockfish_eval,
-        "top_moves": [m.uci() for m in legal_moves],
-        "evals_dict": {m.uci(): v for m, v in evals_dict.items()}
-    }
+    def __init__(self, board, engine, depth=DEPTH, timings=None, width=None, deadline=None, searches=None):
+        self.board = board
+        self.engine = engine
+        self.depth = depth
+        self.width = width
+        self.deadline = deadline
+        self.timings = timings
+        self.searches = {} if searches is None else searches
+        self.search_wait_ms = 0.0
+        self._pending_search = None
+        self._search_started = None
+
+    @cached_property
+    def legal_moves(self):
+        return list(self.board.legal_moves)
+
+    @cached_property
+    def king_square(self):
+        return self.board.king(self.board.turn)
+
+    @cached_property
+    def search(self):
+        """(best_eval, evals_dict) from the full-depth multipv search."""
+        key = (self.depth, self.width)
+        if key in self.searches:
+            return self.searches[key]
+        self.searches[key] = result = self._run_search()
+        return result
+
+    def _run_search(self):
+        if self.timings is None:
+            pending, self._pending_search = self._pending_search, None
+            if pending is None:
+                pending = start_all_moves_search(
+                    self.board, self.engine, self.depth, self.width, time_limit=self._time_left())
+            return self._collect(pending)
+
+        waiting = time.perf_counter()
+        if self._pending_search is None:
+            self.start_search()
+        pending, self._pending_search = self._pending_search, None
+        result = self._collect(pending)
+        done = time.perf_counter()
+        # Wall time from sending the search to collecting it (overlaps the static features)
+        self.timings.add("search_multipv", (done - self._search_started) * 1000)
+        self.search_wait_ms += (done - waiting) * 1000
+        return result
+
+    def _time_left(self):
+        """Seconds until the deadline (at least 1 ms), or None without one."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.perf_counter(), 0.001)
+
+    def _collect(self, pending):
+        result = collect_move_evals(self.board, pending)
+        if self.deadline is not None and pending is not None and depth_reached(pending) < self.depth:
+            raise DeadlineExceeded(f"Search stopped at the deadline before depth {self.depth}")
+        return result
+
+    @cached_property
+    def lower_search(self):
+        """(best_eval, evals_dict) from the depth-1 multipv search behind trap_susceptibility."""
+        key = (LOWER_DEPTH, None)
+        if key in self.searches:
+            return self.searches[key]
+        if key == (self.depth, self.width):
+            # At depth 1 the full-width search is the lower search
+            return self.search
+        self.searches[key] = result = self._run_lower_search()
+        return result
+
+    def _run_lower_search(self):
+        if self.timings is None:
+            return evaluate_all_moves(self.board, self.engine, LOWER_DEPTH, time_limit=self._time_left())
+
+        start = time.perf_counter()
+        result = evaluate_all_moves(self.board, self.engine, LOWER_DEPTH, time_limit=self._time_left())
+        elapsed = (time.perf_counter() - start) * 1000
+        self.timings.add("search_lower_depth", elapsed)
+        self.search_wait_ms += elapsed
+        return result
+
+    def start_search(self):
+        """Send the full-depth search to the engine now; reading `search` collects it."""
+        if (self._pending_search is None and "search" not in self.__dict__
+                and (self.depth, self.width) not in self.searches):
+            self._search_started = time.perf_counter()
+            self._pending_search = start_all_moves_search(
+                self.board, self.engine, self.depth, self.width, time_limit=self._time_left())
+
+    def cancel_search(self):
+        pending, self._pending_search = self._pending_search, None
+        if pending is not None:
+            pending.stop()
+            pending.wait()
+
+
+# Each feature is computed from a FeatureContext, in the order compute_features returns them.
+FEATURES = {
+    "volatility": lambda ctx: compute_volatility(*ctx.search),
+    "move_ease": lambda ctx: compute_move_ease(ctx.board, ctx.legal_moves, *ctx.search),
+    "trap_susceptibility": lambda ctx: compute_trap_susceptibility(
+        ctx.board, ctx.engine, ctx.search[1], lower_search=ctx.lower_search),
+    "king_exposure": lambda ctx: compute_king_exposure(ctx.board, ctx.king_square),
+    "castling_status": lambda ctx: compute_castling_status(ctx.board),
+    "defending_pieces": lambda ctx: compute_defending_pieces(ctx.board, ctx.king_square),
+    "doubled_pawns": lambda ctx: compute_doubled_pawns(ctx.board),
+    "backward_pawns": lambda ctx: compute_backward_pawns(ctx.board),
+    "pawn_majority": lambda ctx: compute_pawn_majority(ctx.board),
+    "mobility": lambda ctx: compute_mobility(ctx.board),
+    "piece_coordination": lambda ctx: compute_piece_coordination(ctx.board),
+    "hanging_pieces": lambda ctx: compute_hanging_pieces(ctx.board),
+    "rooks_connected": lambda ctx: compute_rooks_connected(ctx.board),
+    "bishop_pair": lambda ctx: int(len(ctx.board.pieces(chess.BISHOP, ctx.board.turn)) == 2),
+    "overworked_defenders": lambda ctx: overworked_pieces(ctx.board),
+    "pins": lambda ctx: 0,  # incomplete feature
+    "tactical_motifs": lambda ctx: 0,  # same as pins
+    "material_imbalance": lambda ctx: compute_material_imbalance(ctx.board),
+    "phase": lambda ctx: compute_phase(ctx.board),
+    # Always from White's perspective: the Black-to-move sign flip was applied twice in the
+    # pipeline the models were trained on
+    "space_control": lambda ctx: compute_space_control(ctx.board),
+    "passed_pawns": lambda ctx: compute_passed_pawns(ctx.board),
+    "center_control": lambda ctx: compute_center_control(ctx.board),
+    "stockfish_eval": lambda ctx: ctx.search[0],
+    # Packed {move: eval} for every legal move; call .to_dict() at the API edge
+    "move_evals": lambda ctx: MoveEvals.from_evals_dict(ctx.search[1]),
+}
+
+assert tuple(name for name in FEATURES if name != "move_evals") == FEATURE_COLUMNS
+
+# Stage names under which each feature is timed; engine-derived groups exclude the searches themselves
+FEATURE_GROUPS = {
+    "volatility": "features_engine_derived",
+    "move_ease": "features_engine_derived",
+    "trap_susceptibility": "features_engine_derived",
+    "stockfish_eval": "features_engine_derived",
+    "move_evals": "features_engine_derived",
+    "king_exposure": "features_king_safety",
+    "castling_status": "features_king_safety",
+    "defending_pieces": "features_king_safety",
+    "doubled_pawns": "features_pawn_structure",
+    "backward_pawns": "features_pawn_structure",
+    "pawn_majority": "features_pawn_structure",
+    "passed_pawns": "features_pawn_structure",
+    "mobility": "features_activity",
+    "piece_coordination": "features_activity",
+    "rooks_connected": "features_activity",
+    "space_control": "features_activity",
+    "center_control": "features_activity",
+    "hanging_pieces": "features_tactics",
+    "overworked_defenders": "features_tactics",
+    "pins": "features_tactics",
+    "tactical_motifs": "features_tactics",
+    "bishop_pair": "features_material",
+    "material_imbalance": "features_material",
+    "phase": "features_material",
+}
+assert FEATURE_GROUPS.keys() == FEATURES.keys()
+
+# Features that need the engine; everything else is computed from the board alone
+ENGINE_FEATURES = ("volatility", "move_ease", "trap_susceptibility", "stockfish_eval", "move_evals")
+
+# Columns returned when no explicit column set is requested
+DEFAULT_COLUMNS = tuple(name for name in FEATURES if name != "castling_status")
+
+# --- Fast tier: engine-free companion models, trained on the static columns only ---
+FAST_SUFFIX = "_fast"
+
+
+def fast_target(target):
+    return target + FAST_SUFFIX
+
+
+def base_target(target):
+    """Label a (possibly fast-tier) model target is trained on."""
+    return target[:-len(FAST_SUFFIX)] if target.endswith(FAST_SUFFIX) else target
+
+
+def with_fast_feature_sets(feature_sets):
+    """Copy of a feature_sets.json dict with a static-only "<target>_fast" set next to every target."""
+    result = {}
+    for elo_range, sets in feature_sets.items():
+        result[elo_range] = dict(sets)
+        for target, columns in sets.items():
+            if not target.endswith(FAST_SUFFIX):
+                result[elo_range].setdefault(
+                    fast_target(target), [c for c in columns if c not in ENGINE_FEATURES])
+    return result
+
+
+def _compute_into(store, board, engine, depth, columns, timings=None, width=None, deadline=None, searches=None):
+    """Compute the requested columns, passing each (name, value) to store; returns the names in order."""
+    if columns is None:
+        columns = DEFAULT_COLUMNS
+    unknown = [c for c in columns if c not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown feature columns: {unknown}")
+
+    ctx = FeatureContext(board, engine, depth, timings, width, deadline, searches)
+    requested = [name for name in FEATURES if name in columns]
+
+    # Stockfish runs in its own process: send it the search first, compute the static
+    # features while it works, then collect it for the engine-derived ones
+    if any(name in ENGINE_FEATURES for name in requested):
+        ctx.start_search()
+
+    if timings is not None:
+        _compute_timed(store, ctx, requested, timings)
+        return requested
+
+    try:
+        for name in requested:
+            if name not in ENGINE_FEATURES:
+                store(name, FEATURES[name](ctx))
+    except BaseException:
+        ctx.cancel_search()
+        raise
+
+    for name in requested:
+        if name in ENGINE_FEATURES:
+            store(name, FEATURES[name](ctx))
+    return requested
+
+
+def _compute_timed(store, ctx, requested, timings):
+    """_compute_into's feature loops, timing each feature group."""
+    perf_counter = time.perf_counter
+    try:
+        for name in requested:
+            if name not in ENGINE_FEATURES:
+                start = perf_counter()
+                store(name, FEATURES[name](ctx))
+                timings.add(FEATURE_GROUPS[name], (perf_counter() - start) * 1000)
+    except BaseException:
+        ctx.cancel_search()
+        raise
+
+    for name in requested:
+        if name in ENGINE_FEATURES:
+            waited = ctx.search_wait_ms
+            start = perf_counter()
+            store(name, FEATURES[name](ctx))
+            elapsed = (perf_counter() - start) * 1000
+            timings.add(FEATURE_GROUPS[name], elapsed - (ctx.search_wait_ms - waited))
+
+
+def compute_features(board, engine, depth=DEPTH, columns=None, timings=None, width=None, deadline=None,
+                     searches=None):
+    """
+    Compute human-playability metrics for a given board state.
+    Only the requested columns (and the engine searches they depend on) are computed;
+    by default every feature used for training is returned. The static features are
+    computed while the engine search is in flight, so latency approaches
+    max(static, engine) rather than their sum.
+    Pass a StageTimings to record per-stage timings (searches and feature groups).
+    With a width, only the top `width` moves get the full-depth multipv search
+    (faster in wide positions, at some accuracy cost; see SelectiveSearch).
+    A deadline (time.perf_counter() timestamp) caps the search; DeadlineExceeded
+    is raised if it cannot reach `depth` in time.
+    Pass the same `searches` dict to calls for one position at several depths to
+    reuse searches already done (see FeatureContext).
+    """
+    features = {}
+    requested = _compute_into(features.__setitem__, board, engine, depth, columns, timings, width, deadline,
+                              searches)
+    return {name: features[name] for name in requested}
+
+
+def compute_feature_vector(board, engine, depth=DEPTH, columns=None, timings=None, width=None, deadline=None,
+                           searches=None):
+    """Same as compute_features, written straight into a fixed-schema FeatureVector."""
+    vector = FeatureVector()
+    _compute_into(vector.__setitem__, board, engine, depth, columns, timings, width, deadline, searches)
+    return vector
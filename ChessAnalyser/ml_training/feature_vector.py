@@ -0,0 +1,93 @@
+# feature_vector.py
+"""
+Fixed-schema feature record.
+
+Every numeric feature has a fixed slot in FEATURE_COLUMNS, and a position's
+features live in one float32 array in that order (NaN where a feature was not
+computed). Model feature sets are compiled once into index arrays, so building
+a model input is a single fancy-index instead of per-column dict lookups.
+"""
+import numpy as np
+
+# Canonical column order; feature_extraction.FEATURES provides one function per column
+FEATURE_COLUMNS = (
+    "volatility",
+    "move_ease",
+    "trap_susceptibility",
+    "king_exposure",
+    "castling_status",
+    "defending_pieces",
+    "doubled_pawns",
+    "backward_pawns",
+    "pawn_majority",
+    "mobility",
+    "piece_coordination",
+    "hanging_pieces",
+    "rooks_connected",
+    "bishop_pair",
+    "overworked_defenders",
+    "pins",
+    "tactical_motifs",
+    "material_imbalance",
+    "phase",
+    "space_control",
+    "passed_pawns",
+    "center_control",
+    "stockfish_eval",
+)
+COLUMN_INDEX = {name: i for i, name in enumerate(FEATURE_COLUMNS)}
+
+
+def as_float(value):
+    """Python float of a float32 value at its shortest float32 repr (8.9, not 8.899999618530273)."""
+    return float(str(np.float32(value)))
+
+
+def column_index(columns):
+    """Index array selecting `columns` (in that order) from a feature vector."""
+    return np.array([COLUMN_INDEX[c] for c in columns], dtype=np.intp)
+
+
+def compile_feature_sets(feature_sets):
+    """{(elo_range, target): index array} for every entry of feature_sets.json."""
+    return {
+        (elo_range, target): column_index(columns)
+        for elo_range, targets in feature_sets.items()
+        for target, columns in targets.items()
+    }
+
+
+class FeatureVector:
+    """One position's features: float32 values in FEATURE_COLUMNS order plus its packed move evals."""
+
+    __slots__ = ("values", "move_evals")
+
+    def __init__(self, values=None, move_evals=None):
+        if values is None:
+            values = np.full(len(FEATURE_COLUMNS), np.nan, dtype=np.float32)
+        self.values = values
+        self.move_evals = move_evals
+
+    def __setitem__(self, name, value):
+        if name == "move_evals":
+            self.move_evals = value
+        else:
+            self.values[COLUMN_INDEX[name]] = value
+
+    def __getitem__(self, name):
+        if name == "move_evals":
+            return self.move_evals
+        return as_float(self.values[COLUMN_INDEX[name]])
+
+    def __contains__(self, name):
+        if name == "move_evals":
+            return self.move_evals is not None
+        return name in COLUMN_INDEX and not np.isnan(self.values[COLUMN_INDEX[name]])
+
+    def select(self, index):
+        """Model input row for a compiled index array."""
+        return self.values[index]
+
+    def to_dict(self):
+        """{name: float} for every computed column (move_evals excluded)."""
+        return {name: as_float(v) for name, v in zip(FEATURE_COLUMNS, self.values.tolist()) if v == v}
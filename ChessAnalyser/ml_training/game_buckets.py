@@ -0,0 +1,53 @@
+# game_buckets.py
+"""
+Time control and Elo range a game belongs to, from its PGN headers. The models
+are trained and looked up per (Elo range, time control) bucket, so
+train_model.py and score_games.py share these.
+"""
+
+
+def categorize_time_control(game_headers):
+    if "TimeControl" not in game_headers:
+        return "unknown"
+    tc = game_headers["TimeControl"]
+    try:
+        tc = int(tc.split("+")[0])
+    except ValueError:
+        return "unknown"
+
+    if tc < 180:
+        return "bullet"
+    elif tc < 600:
+        return "blitz"
+    else:
+        return "rapid_classical"
+
+
+def average_elo(game_headers):
+    if "WhiteElo" not in game_headers or "BlackElo" not in game_headers:
+        return None
+    try:
+        return (int(game_headers["WhiteElo"]) + int(game_headers["BlackElo"])) / 2
+    except ValueError:
+        return None
+
+
+def categorize_elo(avg_elo):
+    if avg_elo is None:
+        return "unknown"
+    if avg_elo < 800:
+        return "800-"
+    elif avg_elo <= 1100:
+        return "800-1100"
+    elif avg_elo <= 1400:
+        return "1100-1400"
+    elif avg_elo <= 1600:
+        return "1400-1600"
+    elif avg_elo <= 1800:
+        return "1600-1800"
+    elif avg_elo <= 2000:
+        return "1800-2000"
+    elif avg_elo <= 2200:
+        return "2000-2200"
+    else:
+        return "2200+"
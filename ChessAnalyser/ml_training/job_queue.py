@@ -0,0 +1,326 @@
+# job_queue.py
+"""
+Feature extraction spread over any number of machines through a job queue.
+
+The coordinator splits the training archive into game-range jobs stored in a
+SQLite database on shared storage. Workers, started on any host that sees
+the database, the archive and the shard directory, repeatedly:
+
+    claim   the oldest pending job, or one whose lease has expired, under a lease of --lease seconds
+    process its games with train_model.process_plies on the worker's one engine (the lease is renewed after every game)
+    commit  the rows to a per-job feature shard, shards/job-<id>.csv, and mark the job done
+
+A worker that dies simply stops renewing its lease, and the job is handed
+to the next worker that asks. A job that fails MAX_ATTEMPTS times is marked
+failed. Shards are only published by the worker that still holds the
+lease, so a late worker whose job was requeued cannot overwrite the
+shard of its successor.
+
+    python ml_training/job_queue.py init --queue /shared/jobs.sqlite --games-per-job 200 --max-games 100000
+    python ml_training/job_queue.py work --queue /shared/jobs.sqlite       # on every host, as many as wanted
+    python ml_training/job_queue.py status --queue /shared/jobs.sqlite
+    python ml_training/job_queue.py merge --queue /shared/jobs.sqlite --output ml_training/features.csv
+
+For a local test, run several `work` processes on one box. Leases use each
+host's wall clock, so the hosts' clocks need to be in sync (NTP). SQLite locking
+works on most shared filesystems, but check that yours honours POSIX locks.
+A seekable archive (pgn_index.py) lets every job start reading at its first game.
+"""
+import argparse
+import io
+import os
+import socket
+import sqlite3
+import time
+
+import chess.pgn
+import pandas as pd
+import zstandard as zstd
+
+from engine_replay import open_engine
+from pgn_index import load_pgn_index
+import train_model
+from train_model import DATA_PATH, PrefilterBuilder, process_plies, stitch_game
+
+# --- Defaults ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+QUEUE_PATH = os.path.join(SCRIPT_DIR, "jobs.sqlite")
+SHARD_DIR_NAME = "shards"
+GAMES_PER_JOB = 200
+LEASE_SECONDS = 600
+MAX_ATTEMPTS = 3
+# Seconds an idle worker waits before asking again while other workers still hold leases
+POLL_SECONDS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    first_game INTEGER NOT NULL,
+    last_game INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    rows INTEGER,
+    error TEXT,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+STATUSES = ("pending", "leased", "done", "failed")
+
+
+def connect(queue_path):
+    # Autocommit mode: every write takes the database lock explicitly with BEGIN IMMEDIATE
+    db = sqlite3.connect(queue_path, timeout=60, isolation_level=None)
+    db.row_factory = sqlite3.Row
+    return db
+
+
+def shard_path(shard_dir, job_id):
+    return os.path.join(shard_dir, f"job-{job_id:06d}.csv")
+
+
+def count_games(data_path):
+    pgn_index = load_pgn_index(data_path)
+    if pgn_index is not None:
+        return len(pgn_index)
+    n = 0
+    with open_games(data_path, 1) as text_stream:
+        while chess.pgn.skip_game(text_stream):
+            n += 1
+    return n
+
+
+def open_games(data_path, first_game):
+    """Text stream of the archive positioned at game `first_game` (numbered from 1)."""
+    pgn_index = load_pgn_index(data_path)
+    if pgn_index is not None:
+        return pgn_index.open_text(first_game)
+    text_stream = io.TextIOWrapper(zstd.ZstdDecompressor().stream_reader(open(data_path, "rb"), closefd=True),
+                                   encoding="utf-8")
+    for _ in range(first_game - 1):
+        if not chess.pgn.skip_game(text_stream):
+            break
+    return text_stream
+
+
+# --- Coordinator ---
+def create_jobs(queue_path, data_path, n_games, games_per_job=GAMES_PER_JOB, shard_dir=None):
+    """Write one pending job per range of games_per_job games. Returns the number of jobs."""
+    shard_dir = shard_dir or os.path.join(os.path.dirname(os.path.abspath(queue_path)), SHARD_DIR_NAME)
+    db = connect(queue_path)
+    try:
+        db.executescript(SCHEMA)
+        db.execute("BEGIN IMMEDIATE")
+        if db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]:
+            db.execute("ROLLBACK")
+            raise ValueError(f"{queue_path} already has jobs")
+        db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                       [("data_path", os.path.abspath(data_path)), ("shard_dir", os.path.abspath(shard_dir))])
+        db.executemany("INSERT INTO jobs (first_game, last_game) VALUES (?, ?)",
+                       [(first, min(first + games_per_job - 1, n_games))
+                        for first in range(1, n_games + 1, games_per_job)])
+        db.execute("COMMIT")
+        return db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+    finally:
+        db.close()
+
+
+def queue_meta(db):
+    return {row["key"]: row["value"] for row in db.execute("SELECT key, value FROM meta")}
+
+
+def queue_status(db):
+    counts = dict.fromkeys(STATUSES, 0)
+    counts.update(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+    counts["expired"] = db.execute("SELECT COUNT(*) FROM jobs WHERE status = 'leased' AND lease_expires < ?",
+                                   (time.time(),)).fetchone()[0]
+    return counts
+
+
+# --- Worker ---
+def claim_job(db, worker, lease_seconds=LEASE_SECONDS):
+    """Lease the next pending or expired job to `worker`; None if there is none right now."""
+    now = time.time()
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        # Jobs whose worker stopped renewing the lease go back to the pool, or fail for good
+        db.execute("UPDATE jobs SET status = 'failed', error = 'lease expired ' || attempts || ' times' "
+                   "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+        job = db.execute("SELECT * FROM jobs WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                         "ORDER BY id LIMIT 1", (now,)).fetchone()
+        if job is not None:
+            db.execute("UPDATE jobs SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 "
+                       "WHERE id = ?", (worker, now + lease_seconds, job["id"]))
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    return job
+
+
+def renew_lease(db, job_id, worker, lease_seconds=LEASE_SECONDS):
+    """Extend the lease; False if the job is no longer leased to this worker."""
+    cursor = db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+                        (time.time() + lease_seconds, job_id, worker))
+    return cursor.rowcount == 1
+
+
+def commit_job(db, job_id, worker, df, shard_dir):
+    """Publish the job's shard and mark it done, if the lease is still ours. Returns whether it was."""
+    path = shard_path(shard_dir, job_id)
+    tmp_path = f"{path}.{worker}.tmp"
+    df.to_csv(tmp_path, index=False)
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        owned = db.execute("SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND status = 'leased'",
+                           (job_id, worker)).fetchone()
+        if owned:
+            os.replace(tmp_path, path)
+            db.execute("UPDATE jobs SET status = 'done', rows = ?, finished = ?, error = NULL WHERE id = ?",
+                       (len(df), time.time(), job_id))
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return bool(owned)
+
+
+def release_job(db, job_id, worker, error):
+    """Give a failed job back to the pool (or fail it for good after MAX_ATTEMPTS)."""
+    db.execute("UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+               "worker = NULL, lease_expires = NULL, error = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+               (MAX_ATTEMPTS, error, job_id, worker))
+
+
+def process_job(db, job, worker, data_path, engine, lease_seconds=LEASE_SECONDS):
+    """
+    Feature rows for the job's games, as in features.csv, analyzed with `engine`.
+    Returns None if the lease was lost along the way.
+    """
+    frames = []
+    game_number = job["first_game"]
+    with open_games(data_path, game_number) as text_stream:
+        while game_number <= job["last_game"]:
+            # Games without Elo or of untrained time controls are skipped unparsed (no quotas per job)
+            read = chess.pgn.read_game(text_stream, Visitor=lambda: PrefilterBuilder({}))
+            if read is None:
+                break
+            game, _ = read
+            if game is not None:
+                df_game = stitch_game([process_plies((game_number, str(game), 0, None), engine)])
+                if df_game is not None:
+                    frames.append(df_game)
+            if not renew_lease(db, job["id"], worker, lease_seconds):
+                return None
+            game_number += 1
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def run_worker(queue_path, worker=None, lease_seconds=LEASE_SECONDS, max_jobs=None):
+    """Claim and process jobs until none are left. Returns the number of jobs this worker committed."""
+    worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+    db = connect(queue_path)
+    meta = queue_meta(db)
+    os.makedirs(meta["shard_dir"], exist_ok=True)
+    committed = 0
+    # One engine for every job this worker runs, replaced only if a job fails
+    engine = open_engine(train_model.STOCKFISH_PATH)
+    try:
+        while max_jobs is None or committed < max_jobs:
+            job = claim_job(db, worker, lease_seconds)
+            if job is None:
+                if queue_status(db)["leased"]:
+                    # Others still hold leases that may yet expire and be requeued
+                    time.sleep(POLL_SECONDS)
+                    continue
+                break
+            print(f"[{worker}] job {job['id']}: games {job['first_game']}-{job['last_game']}", flush=True)
+            try:
+                df = process_job(db, job, worker, meta["data_path"], engine, lease_seconds)
+            except Exception as e:
+                release_job(db, job["id"], worker, f"{type(e).__name__}: {e}")
+                print(f"[{worker}] job {job['id']} failed: {e}", flush=True)
+                # The failure may have been the engine itself
+                try:
+                    engine.quit()
+                except Exception:
+                    pass
+                engine = open_engine(train_model.STOCKFISH_PATH)
+                continue
+            if df is not None and commit_job(db, job["id"], worker, df, meta["shard_dir"]):
+                committed += 1
+            else:
+                print(f"[{worker}] job {job['id']}: lease lost, result discarded", flush=True)
+    finally:
+        engine.quit()
+        db.close()
+    return committed
+
+
+# --- Results ---
+def merge_shards(db, output_path):
+    """Concatenate the shards of every done job, in game order, into one features CSV. Returns its rows."""
+    shard_dir = queue_meta(db)["shard_dir"]
+    job_ids = [row["id"] for row in db.execute("SELECT id FROM jobs WHERE status = 'done' ORDER BY first_game")]
+    frames = [pd.read_csv(shard_path(shard_dir, job_id)) for job_id in job_ids
+              if os.path.getsize(shard_path(shard_dir, job_id)) > 1]
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    df.to_csv(output_path, index=False)
+    return len(df)
+
+
+if __name__ == "__main__":
+    from multiprocessing import freeze_support
+    freeze_support()
+
+    parser = argparse.ArgumentParser(description="Multi-machine feature extraction through a SQLite job queue")
+    commands = parser.add_subparsers(dest="command", required=True)
+    init_parser = commands.add_parser("init", help="Coordinator: write game-range jobs for an archive")
+    init_parser.add_argument("--queue", default=QUEUE_PATH)
+    init_parser.add_argument("--data", default=DATA_PATH, help="PGN .zst archive (seekable ones start jobs faster)")
+    init_parser.add_argument("--games-per-job", type=int, default=GAMES_PER_JOB)
+    init_parser.add_argument("--max-games", type=int, default=None, help="Only queue the first N games")
+    init_parser.add_argument("--shards", default=None, help="Shard directory (default: shards/ next to the queue)")
+    work_parser = commands.add_parser("work", help="Worker: claim and process jobs until the queue is drained")
+    work_parser.add_argument("--queue", default=QUEUE_PATH)
+    work_parser.add_argument("--engine", default=None, help="UCI engine binary or *.replay file (default: $STOCKFISH_PATH)")
+    work_parser.add_argument("--lease", type=float, default=LEASE_SECONDS, help="Seconds a job stays leased without renewal")
+    work_parser.add_argument("--worker-id", default=None, help="Default: hostname:pid")
+    work_parser.add_argument("--max-jobs", type=int, default=None)
+    status_parser = commands.add_parser("status", help="Job counts by status")
+    status_parser.add_argument("--queue", default=QUEUE_PATH)
+    merge_parser = commands.add_parser("merge", help="Concatenate the finished shards into one features CSV")
+    merge_parser.add_argument("--queue", default=QUEUE_PATH)
+    merge_parser.add_argument("--output", default=train_model.FEATURES_CSV)
+    args = parser.parse_args()
+
+    if args.command == "init":
+        n_games = count_games(args.data)
+        if args.max_games is not None:
+            n_games = min(n_games, args.max_games)
+        n_jobs = create_jobs(args.queue, args.data, n_games, args.games_per_job, args.shards)
+        print(f"Queued {n_jobs} jobs over {n_games} games in {args.queue}")
+    elif args.command == "work":
+        if args.engine:
+            train_model.STOCKFISH_PATH = args.engine
+        n = run_worker(args.queue, args.worker_id, args.lease, args.max_jobs)
+        print(f"Committed {n} jobs")
+    elif args.command == "status":
+        db = connect(args.queue)
+        counts = queue_status(db)
+        rows = db.execute("SELECT COALESCE(SUM(rows), 0) FROM jobs WHERE status = 'done'").fetchone()[0]
+        print(", ".join(f"{status}: {n}" for status, n in counts.items()) + f" | {rows} feature rows")
+        for job in db.execute("SELECT id, first_game, last_game, attempts, error FROM jobs WHERE status = 'failed'"):
+            print(f"  failed job {job['id']} (games {job['first_game']}-{job['last_game']}, "
+                  f"{job['attempts']} attempts): {job['error']}")
+        db.close()
+    else:
+        db = connect(args.queue)
+        n = merge_shards(db, args.output)
+        db.close()
+        print(f"Wrote {n} rows to {args.output}")
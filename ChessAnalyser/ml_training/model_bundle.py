@@ -0,0 +1,210 @@
+# model_bundle.py
+"""
+Single-file model bundle built from XGBoost native UBJSON boosters.
+
+Layout:
+    MAGIC (4 bytes) | format version (uint32) | header length (uint32) | header JSON | booster blobs
+
+The header maps every model key to the offset/length of its booster blob, the
+feature columns the booster was trained on and its training metrics. The file is
+memory-mapped, so forked workers share its pages and boosters are only parsed
+when first used.
+
+Convert the existing pickles with:
+    python ml_training/model_bundle.py
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+try:
+    from ml_training.feature_extraction import fast_target, with_fast_feature_sets
+except ImportError:  # imported from inside ml_training/, e.g. by train_model.py
+    from feature_extraction import fast_target, with_fast_feature_sets
+
+# --- Paths ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(SCRIPT_DIR, "elo_models")
+METRICS_FILE = os.path.join(MODEL_DIR, "model_metrics.json")
+FEATURE_SETS_FILE = os.path.join(SCRIPT_DIR, "feature_sets.json")
+BUNDLE_FILE = os.path.join(MODEL_DIR, "models.bundle")
+
+# --- Format ---
+MAGIC = b"CAMB"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGNMENT = 8
+
+ELO_RANGES = ["800-", "800-1100", "1100-1400", "1400-1600", "1600-1800", "1800-2000", "2000-2200", "2200+"]
+TIME_CONTROLS = ["blitz", "rapid_classical"]
+TARGETS = ["label_position_quality", "label_move_ease"]
+# Engine-free models of the fast tier, keyed like the full ones
+FAST_TARGETS = [fast_target(target) for target in TARGETS]
+
+
+def model_key(elo_range, time_control, target):
+    return f"{elo_range}_{time_control}_{target}"
+
+
+def pickle_path(elo_range, time_control, target, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"model_{model_key(elo_range, time_control, target)}.pkl")
+
+
+def _padding(length):
+    return (-length) % _ALIGNMENT
+
+
+class ModelBundle:
+    """Read-only view over a bundle file. Boosters are loaded lazily and cached."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, format_version, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        if format_version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model bundle format {format_version} in {path}")
+
+        header_start = _PREAMBLE.size
+        header = json.loads(self._mm[header_start:header_start + header_len].decode("utf-8"))
+        self._data_start = header_start + header_len + _padding(header_start + header_len)
+
+        self.version = header["version"]
+        self.models = header["models"]
+        self._boosters = {}
+        self.loads = 0  # boosters parsed so far
+
+    def __contains__(self, key):
+        return key in self.models
+
+    def has(self, elo_range, time_control, target):
+        return model_key(elo_range, time_control, target) in self.models
+
+    def feature_cols(self, elo_range, time_control, target):
+        return self.models[model_key(elo_range, time_control, target)]["feature_cols"]
+
+    def metrics(self, elo_range, time_control, target):
+        return self.models[model_key(elo_range, time_control, target)].get("metrics", {})
+
+    def booster(self, elo_range, time_control, target):
+        key = model_key(elo_range, time_control, target)
+        booster = self._boosters.get(key)
+        if booster is None:
+            import xgboost as xgb
+
+            entry = self.models[key]
+            start = self._data_start + entry["offset"]
+            booster = xgb.Booster()
+            booster.load_model(bytearray(self._mm[start:start + entry["length"]]))
+            self._boosters[key] = booster
+            self.loads += 1
+        return booster
+
+    def predict(self, elo_range, time_control, target, rows):
+        """Predict for a 2D sequence of rows ordered as feature_cols()."""
+        import numpy as np
+
+        X = np.asarray(rows, dtype=np.float32)
+        return self.booster(elo_range, time_control, target).inplace_predict(X)
+
+    def preload(self):
+        """Parse every booster now, e.g. before forking so children share them copy-on-write."""
+        for key in self.models:
+            elo_range, time_control, target = _split_key(key)
+            self.booster(elo_range, time_control, target)
+
+    def close(self):
+        self._boosters.clear()
+        self._mm.close()
+        self._file.close()
+
+
+def _split_key(key):
+    for target in TARGETS + FAST_TARGETS:
+        if key.endswith("_" + target):
+            rest = key[:-len(target) - 1]
+            for tc in TIME_CONTROLS:
+                if rest.endswith("_" + tc):
+                    return rest[:-len(tc) - 1], tc, target
+    raise ValueError(f"Malformed model key: {key}")
+
+
+def load_bundle(path=BUNDLE_FILE):
+    """Open the bundle at path, or return None if it has not been built."""
+    if not os.path.exists(path):
+        return None
+    return ModelBundle(path)
+
+
+def build_bundle(model_dir=MODEL_DIR, output_path=BUNDLE_FILE,
+                 metrics_file=METRICS_FILE, feature_sets_file=FEATURE_SETS_FILE):
+    """Convert every model_*.pkl in model_dir into a single bundle file."""
+    import joblib
+
+    with open(feature_sets_file, "r") as f:
+        feature_sets = with_fast_feature_sets(json.load(f))
+    if os.path.exists(metrics_file):
+        with open(metrics_file, "r") as f:
+            model_metrics = json.load(f)
+    else:
+        model_metrics = {}
+
+    models = {}
+    blobs = []
+    offset = 0
+    for elo_range in ELO_RANGES:
+        for tc in TIME_CONTROLS:
+            for target in TARGETS + FAST_TARGETS:
+                path = pickle_path(elo_range, tc, target, model_dir)
+                if not os.path.exists(path):
+                    continue
+                booster = joblib.load(path).get_booster()
+                raw = bytes(booster.save_raw("ubj"))
+
+                feature_cols = booster.feature_names or \
+                    feature_sets.get(elo_range, {}).get(target, feature_sets["default"][target])
+                models[model_key(elo_range, tc, target)] = {
+                    "offset": offset,
+                    "length": len(raw),
+                    "feature_cols": list(feature_cols),
+                    "metrics": model_metrics.get(elo_range, {}).get(tc, {}).get(target, {}),
+                }
+                blobs.append(raw + b"\0" * _padding(len(raw)))
+                offset += len(raw) + _padding(len(raw))
+
+    if not models:
+        raise FileNotFoundError(f"No model_*.pkl files found in {model_dir}")
+
+    digest = hashlib.sha256(json.dumps(models, sort_keys=True).encode("utf-8"))
+    for blob in blobs:
+        digest.update(blob)
+    header = json.dumps({"version": digest.hexdigest()[:16], "models": models}).encode("utf-8")
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * _padding(_PREAMBLE.size + len(header)))
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp_path, output_path)
+    return len(models)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert elo_models/*.pkl into a single model bundle")
+    parser.add_argument("--model-dir", default=MODEL_DIR)
+    parser.add_argument("--output", default=BUNDLE_FILE)
+    args = parser.parse_args()
+
+    n_models = build_bundle(args.model_dir, args.output,
+                            metrics_file=os.path.join(args.model_dir, "model_metrics.json"))
+    bundle = ModelBundle(args.output)
+    print(f"Wrote {n_models} models to {args.output} (version {bundle.version})")
+    bundle.close()
@@ -0,0 +1,101 @@
+# move_evals.py
+"""
+Compact per-position move evaluation record.
+
+Moves are packed into uint16 (from square | to square << 6 | promotion << 12)
+and evaluations into int32, in two parallel arrays. A record serializes to
+2 + 6 * n bytes, versus a list of UCI strings plus a {uci: eval} dict.
+Convert to dicts only where a caller actually needs them.
+"""
+import base64
+import struct
+import sys
+from array import array
+
+import chess
+
+_COUNT = struct.Struct("<H")
+_EVAL_TYPECODE = "i" if array("i").itemsize == 4 else "l"
+
+
+def encode_move(move):
+    """chess.Move -> uint16. The null move (and a missing move) encodes to 0."""
+    if not move:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code):
+    if code == 0:
+        return chess.Move.null()
+    return chess.Move(code & 0x3F, (code >> 6) & 0x3F, (code >> 12) or None)
+
+
+class MoveEvals:
+    """Parallel uint16 move / int32 eval arrays for one position."""
+
+    __slots__ = ("moves", "evals")
+
+    def __init__(self, moves=(), evals=()):
+        self.moves = array("H", moves)
+        self.evals = array(_EVAL_TYPECODE, evals)
+        if len(self.moves) != len(self.evals):
+            raise ValueError("moves and evals must have the same length")
+
+    @classmethod
+    def from_evals_dict(cls, evals_dict):
+        """From {chess.Move: eval}, as returned by evaluate_all_moves."""
+        return cls((encode_move(m) for m in evals_dict), (int(v) for v in evals_dict.values()))
+
+    @classmethod
+    def from_dict(cls, uci_evals):
+        """From {uci: eval}, the format older feature files stored."""
+        return cls((encode_move(chess.Move.from_uci(u)) for u in uci_evals), (int(v) for v in uci_evals.values()))
+
+    def __len__(self):
+        return len(self.moves)
+
+    def __eq__(self, other):
+        return isinstance(other, MoveEvals) and self.moves == other.moves and self.evals == other.evals
+
+    def __repr__(self):
+        return f"MoveEvals({self.to_dict()!r})"
+
+    def items(self):
+        """(chess.Move, eval) pairs."""
+        return zip((decode_move(code) for code in self.moves), self.evals)
+
+    def uci_moves(self):
+        return [decode_move(code).uci() for code in self.moves]
+
+    def to_dict(self):
+        """{uci: eval}, for API responses."""
+        return {decode_move(code).uci(): ev for code, ev in zip(self.moves, self.evals)}
+
+    # --- Serialization ---
+    def to_bytes(self):
+        moves, evals = self.moves, self.evals
+        if sys.byteorder != "little":
+            moves, evals = array("H", moves), array(_EVAL_TYPECODE, evals)
+            moves.byteswap()
+            evals.byteswap()
+        return _COUNT.pack(len(moves)) + moves.tobytes() + evals.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data):
+        (n,) = _COUNT.unpack_from(data, 0)
+        record = cls()
+        record.moves.frombytes(data[_COUNT.size:_COUNT.size + 2 * n])
+        record.evals.frombytes(data[_COUNT.size + 2 * n:_COUNT.size + 6 * n])
+        if sys.byteorder != "little":
+            record.moves.byteswap()
+            record.evals.byteswap()
+        return record
+
+    def to_text(self):
+        """Base64 of to_bytes(), for text formats such as the features CSV."""
+        return base64.b64encode(self.to_bytes()).decode("ascii")
+
+    @classmethod
+    def from_text(cls, text):
+        return cls.from_bytes(base64.b64decode(text))
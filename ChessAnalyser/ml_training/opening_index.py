@@ -0,0 +1,279 @@
+# opening_index.py
+"""
+Precomputed analyses of common opening positions.
+
+Positions from the first plies recur across thousands of games. The index
+stores, for every position seen at least --min-count times in the training
+PGN corpus, its features and the model predictions for every Elo range and
+time control, so the analysis path can answer them without an engine search.
+
+File layout:
+    MAGIC (4 bytes) | format version (uint32) | header length (uint32) | header JSON | records
+
+Records are fixed-size and sorted by Zobrist hash (chess.polyglot):
+    key (uint64) | features (float32 per FEATURE_COLUMNS) | scores (float32 per elo range x time control x target)
+Missing models score NaN. The file is memory-mapped and looked up by binary
+search over the key column, so a lookup costs a few microseconds and forked
+workers share the pages.
+
+Build with:
+    python ml_training/opening_index.py build --min-count 50 --max-plies 15
+"""
+import argparse
+import io
+import json
+import os
+import struct
+import time
+
+import chess
+import chess.pgn
+import chess.polyglot
+import numpy as np
+
+try:
+    from ml_training.engine_replay import open_engine
+    from ml_training.feature_extraction import DEPTH, compute_feature_vector
+    from ml_training.feature_vector import FEATURE_COLUMNS, FeatureVector, column_index
+    from ml_training.model_bundle import BUNDLE_FILE, ELO_RANGES, MODEL_DIR, TARGETS, TIME_CONTROLS, ModelBundle
+except ImportError:  # imported from inside ml_training/, e.g. by train_model.py
+    from engine_replay import open_engine
+    from feature_extraction import DEPTH, compute_feature_vector
+    from feature_vector import FEATURE_COLUMNS, FeatureVector, column_index
+    from model_bundle import BUNDLE_FILE, ELO_RANGES, MODEL_DIR, TARGETS, TIME_CONTROLS, ModelBundle
+
+# --- Paths ---
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(SCRIPT_DIR, "data", "lichess_data.zst")
+INDEX_FILE = os.path.join(MODEL_DIR, "openings.index")
+
+# --- Format ---
+MAGIC = b"CAOI"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGNMENT = 8
+
+DEFAULT_MIN_COUNT = 50
+DEFAULT_MAX_PLIES = 15
+
+
+def _padding(length):
+    return (-length) % _ALIGNMENT
+
+
+def record_dtype(n_features, n_scores):
+    return np.dtype([("key", "<u8"), ("features", "<f4", (n_features,)), ("scores", "<f4", (n_scores,))])
+
+
+def position_key(board):
+    return chess.polyglot.zobrist_hash(board)
+
+
+class OpeningIndex:
+    """Read-only, memory-mapped view over an index file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            preamble = f.read(_PREAMBLE.size)
+            magic, format_version, header_len = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an opening index")
+            if format_version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported opening index format {format_version} in {path}")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        self.model_version = header["model_version"]
+        self.depth = header["depth"]
+        self.elo_ranges = header["elo_ranges"]
+        self.time_controls = header["time_controls"]
+        self.targets = header["targets"]
+        self._feature_index = column_index(header["feature_columns"])
+        self._buckets = {
+            (elo_range, tc): (i * len(self.time_controls) + j) * len(self.targets)
+            for i, elo_range in enumerate(self.elo_ranges) for j, tc in enumerate(self.time_controls)
+        }
+
+        data_start = _PREAMBLE.size + header_len + _padding(_PREAMBLE.size + header_len)
+        dtype = record_dtype(len(header["feature_columns"]), len(self._buckets) * len(self.targets))
+        count = header["count"]
+        if count:
+            self.records = np.memmap(path, dtype=dtype, mode="r", offset=data_start, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=dtype)
+        self.keys = self.records["key"]
+
+    def __len__(self):
+        return len(self.records)
+
+    def find(self, board):
+        """Record number of the position, or None."""
+        key = position_key(board)
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return None
+
+    def lookup(self, board, elo_range, time_control):
+        """(FeatureVector, {target: score or None}) for an indexed position, or None."""
+        offset = self._buckets.get((elo_range, time_control))
+        if offset is None:
+            return None
+        i = self.find(board)
+        if i is None:
+            return None
+
+        record = self.records[i]
+        values = np.full(len(FEATURE_COLUMNS), np.nan, dtype=np.float32)
+        values[self._feature_index] = record["features"]
+        scores = record["scores"][offset:offset + len(self.targets)]
+        return FeatureVector(values), {
+            target: None if np.isnan(score) else float(score) for target, score in zip(self.targets, scores)}
+
+    def close(self):
+        mm = getattr(self.records, "_mmap", None)
+        if mm is not None:
+            mm.close()
+
+
+def load_index(path=INDEX_FILE):
+    """Open the index at path, or return None if it has not been built."""
+    if not os.path.exists(path):
+        return None
+    return OpeningIndex(path)
+
+
+# --- Build ---
+def read_games(path, max_games=None):
+    """Games from a .pgn or zstd-compressed .pgn.zst file."""
+    if path.endswith(".zst"):
+        import zstandard as zstd
+
+        f = open(path, "rb")
+        text_stream = io.TextIOWrapper(zstd.ZstdDecompressor().stream_reader(f), encoding="utf-8")
+    else:
+        f = text_stream = open(path, "r", encoding="utf-8")
+    try:
+        n = 0
+        while max_games is None or n < max_games:
+            game = chess.pgn.read_game(text_stream)
+            if game is None:
+                break
+            n += 1
+            yield game
+    finally:
+        f.close()
+
+
+def count_positions(games, max_plies=DEFAULT_MAX_PLIES):
+    """{zobrist key: [count, fen]} over the first max_plies positions of every game."""
+    counts = {}
+    for game in games:
+        board = game.board()
+        for ply, move in enumerate(game.mainline_moves()):
+            if ply >= max_plies:
+                break
+            entry = counts.get(position_key(board))
+            if entry is None:
+                counts[position_key(board)] = [1, board.fen()]
+            else:
+                entry[0] += 1
+            board.push(move)
+    return counts
+
+
+def build_index(output_path, positions, engine, bundle, depth=DEPTH):
+    """
+    Write an index for `positions` ({zobrist key: fen}): features from `engine`,
+    predictions from every model in `bundle`. Returns the number of records.
+    """
+    keys = sorted(positions)
+    n_scores = len(ELO_RANGES) * len(TIME_CONTROLS) * len(TARGETS)
+    dtype = record_dtype(len(FEATURE_COLUMNS), n_scores)
+    records = np.zeros(len(keys), dtype=dtype)
+    records["key"] = keys
+
+    for i, key in enumerate(keys):
+        records["features"][i] = compute_feature_vector(chess.Board(positions[key]), engine, depth=depth).values
+        if (i + 1) % 100 == 0:
+            print(f"  features for {i + 1}/{len(keys)} positions")
+
+    # One batched prediction per model over every position
+    records["scores"] = np.nan
+    k = 0
+    for elo_range in ELO_RANGES:
+        for tc in TIME_CONTROLS:
+            for target in TARGETS:
+                if keys and bundle.has(elo_range, tc, target):
+                    rows = records["features"][:, column_index(bundle.feature_cols(elo_range, tc, target))]
+                    records["scores"][:, k] = bundle.predict(elo_range, tc, target, rows)
+                k += 1
+
+    header = json.dumps({
+        "count": len(keys),
+        "depth": depth,
+        "model_version": bundle.version,
+        "feature_columns": list(FEATURE_COLUMNS),
+        "elo_ranges": ELO_RANGES,
+        "time_controls": TIME_CONTROLS,
+        "targets": TARGETS,
+    }).encode("utf-8")
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * _padding(_PREAMBLE.size + len(header)))
+        f.write(records.tobytes())
+    os.replace(tmp_path, output_path)
+    return len(keys)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precomputed opening-position analysis index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Build the index from a PGN corpus")
+    build_parser.add_argument("--data", default=DATA_PATH, help="PGN or .pgn.zst corpus")
+    build_parser.add_argument("--output", default=INDEX_FILE)
+    build_parser.add_argument("--min-count", type=int, default=DEFAULT_MIN_COUNT,
+                              help="Keep positions seen at least this many times")
+    build_parser.add_argument("--max-plies", type=int, default=DEFAULT_MAX_PLIES,
+                              help="Only count positions from the first N plies of each game")
+    build_parser.add_argument("--max-games", type=int, default=None)
+    build_parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"),
+                              required="STOCKFISH_PATH" not in os.environ,
+                              help="UCI engine binary or *.replay file (default: $STOCKFISH_PATH)")
+    build_parser.add_argument("--bundle", default=BUNDLE_FILE)
+    build_parser.add_argument("--depth", type=int, default=DEPTH)
+    info_parser = commands.add_parser("info", help="Summarize an index")
+    info_parser.add_argument("path", nargs="?", default=INDEX_FILE)
+    lookup_parser = commands.add_parser("lookup", help="Look up a FEN and time the lookup")
+    lookup_parser.add_argument("fen")
+    lookup_parser.add_argument("--path", default=INDEX_FILE)
+    lookup_parser.add_argument("--elo-range", default="1400-1600")
+    lookup_parser.add_argument("--time-control", default="blitz")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        counts = count_positions(read_games(args.data, args.max_games), args.max_plies)
+        positions = {key: fen for key, (count, fen) in counts.items() if count >= args.min_count}
+        print(f"{len(counts)} distinct positions, {len(positions)} seen at least {args.min_count} times")
+        bundle = ModelBundle(args.bundle)
+        with open_engine(args.engine) as engine:
+            n = build_index(args.output, positions, engine, bundle, args.depth)
+        print(f"Wrote {n} positions to {args.output} (model version {bundle.version})")
+    elif args.command == "info":
+        index = OpeningIndex(args.path)
+        print(f"{args.path}: {len(index)} positions, depth {index.depth}, model version {index.model_version}, "
+              f"{os.path.getsize(args.path)} bytes")
+    else:
+        index = OpeningIndex(args.path)
+        board = chess.Board(args.fen)
+        start = time.perf_counter()
+        result = index.lookup(board, args.elo_range, args.time_control)
+        elapsed_us = (time.perf_counter() - start) * 1e6
+        if result is None:
+            print(f"Not indexed ({elapsed_us:.1f} us)")
+        else:
+            features, scores = result
+            print(json.dumps({"scores": scores, "features": features.to_dict(), "lookup_us": round(elapsed_us, 1)}))
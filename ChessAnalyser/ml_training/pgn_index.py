@@ -0,0 +1,239 @@
+# pgn_index.py
+"""
+Seekable PGN archives: random access to any game of a compressed dump.
+
+A plain .pgn.zst is one zstd frame, so reaching game N means decompressing and
+parsing every game before it. `build` re-frames an archive into independent
+zstd frames of FRAME_GAMES games each (still a valid .pgn.zst that any zstd
+reader streams as usual) and writes a sidecar index, <archive>.idx, with the
+compressed offset of every frame and, for every game, its frame and its byte
+offset inside the decompressed frame. Opening the archive at game N then costs
+one seek plus decompressing at most one frame, whatever N is.
+
+Index layout:
+    MAGIC (4 bytes) | format version (uint32) | header length (uint32) | header JSON | frames | games
+    frames: offset (uint64), size (uint64) of every compressed frame
+    games:  frame (uint32), offset in decompressed frame (uint32) of every game
+
+Game numbers start at 1, as train_model.py's game_number does.
+
+    python ml_training/pgn_index.py build data/lichess_db_2024-01.pgn.zst --output data/lichess_data.zst
+    python ml_training/pgn_index.py show data/lichess_data.zst 250000
+"""
+import argparse
+import io
+import json
+import os
+import struct
+
+import numpy as np
+
+# --- Format ---
+MAGIC = b"CAPI"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<4sII")
+_ALIGNMENT = 8
+INDEX_SUFFIX = ".idx"
+
+FRAME_DTYPE = np.dtype([("offset", "<u8"), ("size", "<u8")])
+GAME_DTYPE = np.dtype([("frame", "<u4"), ("offset", "<u4")])
+
+# Games per zstd frame: larger frames compress slightly better, smaller ones seek faster
+FRAME_GAMES = 1000
+COMPRESSION_LEVEL = 10
+
+
+def _padding(length):
+    return (-length) % _ALIGNMENT
+
+
+def index_path(archive_path):
+    return archive_path + INDEX_SUFFIX
+
+
+class PgnIndex:
+    """Read-only, memory-mapped game-offset index of a re-framed archive."""
+
+    def __init__(self, archive_path):
+        self.archive_path = archive_path
+        self.path = index_path(archive_path)
+        with open(self.path, "rb") as f:
+            magic, format_version, header_len = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a PGN index")
+            if format_version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported PGN index format {format_version} in {self.path}")
+            header = json.loads(f.read(header_len).decode("utf-8"))
+
+        self.frame_games = header["frame_games"]
+        archive_size = os.path.getsize(archive_path)
+        if archive_size != header["archive_size"]:
+            raise ValueError(f"{archive_path} has changed since {self.path} was built")
+
+        offset = _PREAMBLE.size + header_len + _padding(_PREAMBLE.size + header_len)
+        self.frames = self._map(FRAME_DTYPE, offset, header["frames"])
+        offset += FRAME_DTYPE.itemsize * header["frames"]
+        self.games = self._map(GAME_DTYPE, offset, header["games"])
+
+    def _map(self, dtype, offset, count):
+        if not count:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self.path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+    def __len__(self):
+        return len(self.games)
+
+    def open_text(self, game_number):
+        """
+        Text stream positioned at the start of game `game_number` that reads on
+        to the end of the archive. Past the last game it is empty.
+        """
+        import zstandard as zstd
+
+        if game_number > len(self.games):
+            return io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+        frame, skip = self.games[max(game_number, 1) - 1]
+        skip = int(skip)
+        f = open(self.archive_path, "rb")
+        f.seek(int(self.frames[frame]["offset"]))
+        stream = zstd.ZstdDecompressor().stream_reader(f, read_across_frames=True, closefd=True)
+        while skip:
+            skip -= len(stream.read(skip))
+        return io.TextIOWrapper(stream, encoding="utf-8")
+
+    def game_text(self, game_number):
+        """PGN text of one game."""
+        import zstandard as zstd
+
+        if not 1 <= game_number <= len(self.games):
+            raise IndexError(f"game {game_number} is not in {self.archive_path} ({len(self.games)} games)")
+        frame, start = self.games[game_number - 1]
+        with open(self.archive_path, "rb") as f:
+            f.seek(int(self.frames[frame]["offset"]))
+            data = zstd.ZstdDecompressor().decompress(f.read(int(self.frames[frame]["size"])))
+        end = len(data)
+        if game_number < len(self.games) and self.games[game_number]["frame"] == frame:
+            end = int(self.games[game_number]["offset"])
+        return data[int(start):end].decode("utf-8")
+
+    def close(self):
+        for table in (self.frames, self.games):
+            mm = getattr(table, "_mmap", None)
+            if mm is not None:
+                mm.close()
+
+
+def load_pgn_index(archive_path):
+    """The index of a re-framed archive, or None if it has no (up to date) index."""
+    if not os.path.exists(index_path(archive_path)):
+        return None
+    try:
+        return PgnIndex(archive_path)
+    except ValueError:
+        return None
+
+
+# --- Build ---
+def _open_binary(path):
+    if path.endswith(".zst"):
+        import zstandard as zstd
+
+        return io.BufferedReader(
+            zstd.ZstdDecompressor().stream_reader(open(path, "rb"), read_across_frames=True, closefd=True))
+    return open(path, "rb")
+
+
+def iter_game_texts(stream):
+    """
+    Raw bytes of every game in a PGN byte stream. A game starts at a tag line
+    ("[...") that follows movetext; text before the first tag line is dropped.
+    """
+    game = []
+    in_movetext = False
+    for line in stream:
+        if line.startswith(b"["):
+            if in_movetext:
+                yield b"".join(game)
+                game = []
+                in_movetext = False
+            game.append(line)
+        elif game:
+            game.append(line)
+            if line.strip():
+                in_movetext = True
+    if game:
+        yield b"".join(game)
+
+
+def build_seekable(input_path, output_path, frame_games=FRAME_GAMES, level=COMPRESSION_LEVEL):
+    """
+    Re-frame a .pgn or .pgn.zst archive into `output_path` (a .pgn.zst of
+    frame_games games per frame) and write its index. Returns the number of games.
+    """
+    import zstandard as zstd
+
+    if os.path.abspath(input_path) == os.path.abspath(output_path):
+        raise ValueError("Re-framing in place is not supported; write to another path")
+    compressor = zstd.ZstdCompressor(level=level)
+    frames = []
+    games = []
+    tmp_path = output_path + ".tmp"
+    with _open_binary(input_path) as source, open(tmp_path, "wb") as out:
+        def flush(chunk):
+            data = compressor.compress(b"".join(chunk))
+            frames.append((out.tell(), len(data)))
+            out.write(data)
+
+        chunk, chunk_len = [], 0
+        for text in iter_game_texts(source):
+            if chunk_len + len(text) >= 2 ** 32 or len(chunk) >= frame_games:
+                flush(chunk)
+                chunk, chunk_len = [], 0
+            games.append((len(frames), chunk_len))
+            chunk.append(text)
+            chunk_len += len(text)
+        if chunk:
+            flush(chunk)
+    os.replace(tmp_path, output_path)
+
+    header = json.dumps({
+        "games": len(games),
+        "frames": len(frames),
+        "frame_games": frame_games,
+        "archive_size": os.path.getsize(output_path),
+        "source": os.path.basename(input_path),
+    }).encode("utf-8")
+    tmp_path = index_path(output_path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        f.write(b"\0" * _padding(_PREAMBLE.size + len(header)))
+        f.write(np.array(frames, dtype=FRAME_DTYPE).tobytes())
+        f.write(np.array(games, dtype=GAME_DTYPE).tobytes())
+    os.replace(tmp_path, index_path(output_path))
+    return len(games)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Seekable, game-indexed PGN archives")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Re-frame an archive into a seekable .pgn.zst and index it")
+    build_parser.add_argument("input", help=".pgn or .pgn.zst archive")
+    build_parser.add_argument("--output", required=True, help="Seekable .pgn.zst to write (its index goes next to it)")
+    build_parser.add_argument("--frame-games", type=int, default=FRAME_GAMES)
+    build_parser.add_argument("--level", type=int, default=COMPRESSION_LEVEL, help="zstd compression level")
+    info_parser = commands.add_parser("info", help="Summarize an indexed archive")
+    info_parser.add_argument("archive")
+    show_parser = commands.add_parser("show", help="Print one game")
+    show_parser.add_argument("archive")
+    show_parser.add_argument("game_number", type=int)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        n = build_seekable(args.input, args.output, args.frame_games, args.level)
+        print(f"Wrote {n} games to {args.output} ({os.path.getsize(args.output)} bytes), index {index_path(args.output)}")
+    elif args.command == "info":
+        index = PgnIndex(args.archive)
+        print(f"{args.archive}: {len(index)} games in {len(index.frames)} frames of up to {index.frame_games} games")
+    else:
+        print(PgnIndex(args.archive).game_text(args.game_number))
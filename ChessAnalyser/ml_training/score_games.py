@@ -0,0 +1,336 @@
+# score_games.py
+"""
+Bulk scoring of PGN archives (.pgn or zstd-compressed .pgn.zst, e.g. the
+monthly lichess dumps).
+
+Games are streamed from the archive and spread over a process pool. Every
+worker keeps one engine and the memory-mapped model bundle open for its whole
+lifetime, and returns, for every ply of a game, the features of the position
+before the move and the position quality / move ease predictions
+(pred_position_quality / pred_move_ease) of the models for the game's Elo
+range and time control (null where no model exists).
+
+Output is one row per ply, as JSON lines (*.jsonl) or as a Parquet dataset
+directory of part files (*.parquet, needs pyarrow or fastparquet). Rerunning
+the same command resumes: games already in the output are skipped.
+
+    python ml_training/score_games.py data/lichess_db_2024-01.pgn.zst --output scores.parquet --workers 8
+"""
+import argparse
+import glob
+import json
+import math
+import multiprocessing.util
+import os
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chess
+import chess.engine
+import chess.pgn
+import numpy as np
+from tqdm import tqdm
+
+try:
+    from ml_training.engine_replay import open_engine
+    from ml_training.feature_extraction import DEFAULT_COLUMNS, DEPTH, compute_feature_vector
+    from ml_training.feature_vector import as_float, column_index
+    from ml_training.game_buckets import average_elo, categorize_elo, categorize_time_control
+    from ml_training.model_bundle import BUNDLE_FILE, TARGETS, ModelBundle
+    from ml_training.opening_index import read_games
+    from ml_training.pgn_index import load_pgn_index
+except ImportError:  # imported from inside ml_training/, e.g. by train_model.py
+    from engine_replay import open_engine
+    from feature_extraction import DEFAULT_COLUMNS, DEPTH, compute_feature_vector
+    from feature_vector import as_float, column_index
+    from game_buckets import average_elo, categorize_elo, categorize_time_control
+    from model_bundle import BUNDLE_FILE, TARGETS, ModelBundle
+    from opening_index import read_games
+    from pgn_index import load_pgn_index
+
+# Numeric feature columns written per ply (move_evals is written as its text form)
+FEATURE_COLUMNS = [c for c in DEFAULT_COLUMNS if c != "move_evals"]
+FEATURE_INDEX = column_index(FEATURE_COLUMNS)
+# Output column of each target's prediction (prefixed: "move_ease" is also a feature column)
+PREDICTION_COLUMNS = {"label_position_quality": "pred_position_quality", "label_move_ease": "pred_move_ease"}
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+# Games buffered per Parquet part file
+DEFAULT_FLUSH_GAMES = 200
+# Games queued per worker ahead of the one being scored
+QUEUE_DEPTH = 4
+PART_PATTERN = "part-*.parquet"
+
+
+# --- Worker process state: one engine and one bundle per worker, for the pool's lifetime ---
+_engine = None
+_engine_path = None
+_bundle = None
+_depth = DEPTH
+
+
+def init_worker(engine_path, bundle_path, depth):
+    global _engine, _engine_path, _bundle, _depth
+    _engine_path = engine_path
+    _engine = open_engine(engine_path)
+    # Quit the engine when the worker exits (whichever one it has by then)
+    multiprocessing.util.Finalize(None, lambda: _engine.quit(), exitpriority=10)
+    _bundle = ModelBundle(bundle_path) if bundle_path and os.path.exists(bundle_path) else None
+    _depth = depth
+
+
+def score_game(game_data, engine=None, bundle=None, depth=None):
+    """
+    One row dict per ply of a game given as (game_number, headers, [uci moves]).
+    Uses the worker's engine and bundle unless others are passed.
+    """
+    game_number, headers, moves = game_data
+    engine = engine or _engine
+    bundle = bundle if bundle is not None else _bundle
+    depth = depth or _depth
+
+    avg_elo = average_elo(headers)
+    elo_range = categorize_elo(avg_elo)
+    time_control = categorize_time_control(headers)
+
+    board = chess.Board(headers.get("FEN", chess.STARTING_FEN)) if headers.get("SetUp") == "1" else chess.Board()
+    rows = []
+    vectors = []
+    for ply, uci in enumerate(moves):
+        vector = compute_feature_vector(board, engine, depth=depth)
+        vectors.append(vector.values)
+        rows.append({
+            "game_number": game_number,
+            "ply": ply,
+            "fen": board.fen(),
+            "move": uci,
+            "avg_elo": avg_elo,
+            "elo_range": elo_range,
+            "time_control": time_control,
+            "move_evals": vector.move_evals.to_text(),
+        })
+        board.push_uci(uci)
+    if not rows:
+        return rows
+
+    # One batched prediction per model over the whole game
+    values = np.vstack(vectors)
+    for target in TARGETS:
+        column = PREDICTION_COLUMNS[target]
+        if bundle is not None and bundle.has(elo_range, time_control, target):
+            scores = bundle.predict(elo_range, time_control, target,
+                                    values[:, column_index(bundle.feature_cols(elo_range, time_control, target))])
+        else:
+            scores = [None] * len(rows)
+        for row, score in zip(rows, scores):
+            row[column] = None if score is None else as_float(score)
+
+    for row, features in zip(rows, values[:, FEATURE_INDEX].tolist()):
+        row.update((name, None if math.isnan(value) else as_float(value))
+                   for name, value in zip(FEATURE_COLUMNS, features))
+    return rows
+
+
+# --- Output ---
+class JsonlWriter:
+    """Appends one JSON line per ply; every game is written with a single write."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = self._recover()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _recover(self):
+        """Game numbers already written. Drops the last game, which may have been cut off mid-write."""
+        if not os.path.exists(self.path):
+            return set()
+        done = set()
+        last_game, last_start, offset = None, 0, 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    game_number = json.loads(line)["game_number"]
+                except (ValueError, KeyError):
+                    break
+                if game_number != last_game:
+                    if last_game is not None:
+                        done.add(last_game)
+                    last_game, last_start = game_number, offset
+                offset += len(line)
+        with open(self.path, "r+b") as f:
+            f.truncate(last_start)
+        return done
+
+    def write(self, game_number, rows):
+        if rows:
+            self._file.write("".join(json.dumps(row) + "\n" for row in rows))
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """Buffers games and writes them as numbered part files into a dataset directory."""
+
+    def __init__(self, path, flush_games=DEFAULT_FLUSH_GAMES):
+        import pandas as pd
+
+        self.path = path
+        self.flush_games = flush_games
+        os.makedirs(path, exist_ok=True)
+        parts = sorted(glob.glob(os.path.join(path, PART_PATTERN)))
+        self.done = set()
+        for part in parts:
+            self.done.update(pd.read_parquet(part, columns=["game_number"])["game_number"].tolist())
+        self._next_part = len(parts)
+        self._rows = []
+        self._games = 0
+
+    def write(self, game_number, rows):
+        self._rows.extend(rows)
+        self._games += 1
+        if self._games >= self.flush_games:
+            self.flush()
+
+    def flush(self):
+        import pandas as pd
+
+        if self._rows:
+            part = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+            pd.DataFrame(self._rows).to_parquet(part + ".tmp", index=False)
+            os.replace(part + ".tmp", part)
+            self._next_part += 1
+        self._rows = []
+        self._games = 0
+
+    def close(self):
+        self.flush()
+
+
+def open_writer(path, flush_games=DEFAULT_FLUSH_GAMES):
+    if path.endswith(".parquet"):
+        return ParquetWriter(path, flush_games)
+    return JsonlWriter(path)
+
+
+# --- Scheduling ---
+def iter_game_data(path, skip=(), max_games=None):
+    """
+    (game_number, headers, [uci moves]) for every game not in `skip`; game numbers start at 1.
+    A seekable archive (pgn_index.py) is opened straight at the first game not yet done.
+    """
+    pgn_index = load_pgn_index(path)
+    if pgn_index is None:
+        games = enumerate(read_games(path, max_games), start=1)
+    else:
+        first = 1
+        while first in skip:
+            first += 1
+        games = _read_from(pgn_index.open_text(first), first, max_games)
+    for game_number, game in games:
+        if game_number in skip:
+            continue
+        yield game_number, dict(game.headers), [move.uci() for move in game.mainline_moves()]
+
+
+def _read_from(text_stream, game_number, max_games=None):
+    with text_stream:
+        while max_games is None or game_number <= max_games:
+            game = chess.pgn.read_game(text_stream)
+            if game is None:
+                break
+            yield game_number, game
+            game_number += 1
+
+
+def score_archive(input_path, writer, engine_path, bundle_path=BUNDLE_FILE, workers=DEFAULT_WORKERS,
+                  depth=DEPTH, max_games=None):
+    """
+    Score every game not yet in `writer`. A game that fails is logged and left
+    out, so rerunning the same command retries it.
+    Returns (games scored, positions scored, games failed, seconds).
+    """
+    games = positions = failed = 0
+    start = time.perf_counter()
+    pending = set()
+    game_numbers = {}
+    progress = tqdm(desc="Scoring games", unit="game")
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=(engine_path, bundle_path, depth)) as executor:
+        def collect(block):
+            nonlocal games, positions, failed
+            finished, still_pending = wait(pending, return_when=FIRST_COMPLETED if block else ALL_COMPLETED)
+            for future in finished:
+                game_number = game_numbers.pop(future)
+                try:
+                    _, rows = future.result()
+                except Exception as e:
+                    failed += 1
+                    tqdm.write(f"Game {game_number} failed: {type(e).__name__}: {e}")
+                    continue
+                writer.write(game_number, rows)
+                games += 1
+                positions += len(rows)
+            progress.update(len(finished))
+            progress.set_postfix(positions_per_s=f"{positions / (time.perf_counter() - start):.1f}")
+            return still_pending
+
+        # Keep a bounded number of games in flight so the archive is streamed, not loaded
+        for game_data in iter_game_data(input_path, writer.done, max_games):
+            future = executor.submit(_score_numbered, game_data)
+            game_numbers[future] = game_data[0]
+            pending.add(future)
+            if len(pending) >= workers * QUEUE_DEPTH:
+                pending = collect(block=True)
+        if pending:
+            collect(block=False)
+    progress.close()
+    return games, positions, failed, time.perf_counter() - start
+
+
+def _score_numbered(game_data):
+    global _engine
+    try:
+        return game_data[0], score_game(game_data)
+    except chess.engine.EngineTerminatedError:
+        # The engine died on this game: the worker's later games get a new one
+        _engine = open_engine(_engine_path)
+        raise
+
+
+if __name__ == "__main__":
+    from multiprocessing import freeze_support
+    freeze_support()
+
+    parser = argparse.ArgumentParser(description="Score every ply of a PGN archive with features and model predictions")
+    parser.add_argument("input", help=".pgn or .pgn.zst archive")
+    parser.add_argument("--output", required=True, help="*.jsonl file or *.parquet dataset directory")
+    parser.add_argument("--engine", default=os.environ.get("STOCKFISH_PATH"), required="STOCKFISH_PATH" not in os.environ,
+                        help="UCI engine binary or *.replay file (default: $STOCKFISH_PATH)")
+    parser.add_argument("--bundle", default=BUNDLE_FILE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--depth", type=int, default=DEPTH)
+    parser.add_argument("--max-games", type=int, default=None, help="Only read the first N games of the archive")
+    parser.add_argument("--flush-games", type=int, default=DEFAULT_FLUSH_GAMES, help="Games per Parquet part file")
+    args = parser.parse_args()
+
+    if args.output.endswith(".parquet"):
+        import importlib.util
+        if not any(importlib.util.find_spec(name) for name in ("pyarrow", "fastparquet")):
+            parser.error("Parquet output needs pyarrow or fastparquet; install one or write *.jsonl")
+    if not os.path.exists(args.bundle):
+        print(f"No model bundle at {args.bundle}; predictions will be null")
+
+    writer = open_writer(args.output, args.flush_games)
+    if writer.done:
+        print(f"Resuming: {len(writer.done)} games already in {args.output}")
+    try:
+        games, positions, failed, seconds = score_archive(args.input, writer, args.engine, args.bundle,
+                                                          args.workers, args.depth, args.max_games)
+    finally:
+        writer.close()
+    print(f"Scored {games} games, {positions} positions in {seconds:.1f}s "
+          f"({positions / seconds if seconds else 0:.1f} positions/s, {args.workers} workers)")
+    if failed:
+        print(f"{failed} games failed; rerun the same command to retry them")
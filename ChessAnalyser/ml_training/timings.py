@@ -0,0 +1,118 @@
+# timings.py
+"""
+Optional per-stage timings for the analysis pipeline.
+
+A StageTimings collects wall-clock milliseconds per named stage for one
+analysis; pass one to compute_features / analyze_position to enable it. When
+none is passed the pipeline takes its untimed code path, so disabled timings
+cost nothing beyond an `is None` check.
+
+record_timings() folds a finished StageTimings into process-wide running
+histograms (fixed millisecond buckets), read with histogram_snapshot().
+"""
+import threading
+import time
+from bisect import bisect_left
+
+# Upper bounds (ms) of the histogram buckets; the last bucket is unbounded
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class StageTimings:
+    """Milliseconds per stage for one analysis. Repeated stages accumulate."""
+
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages = {}
+
+    def add(self, stage, ms):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def to_dict(self, digits=3):
+        return {stage: round(ms, digits) for stage, ms in self.stages.items()}
+
+
+class _Stage:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings.add(self.name, (time.perf_counter() - self.start) * 1000)
+
+
+class Histogram:
+    """Running count/sum plus per-bucket counts of one stage's durations."""
+
+    __slots__ = ("count", "sum_ms", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_ms = 0.0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def record(self, ms):
+        self.count += 1
+        self.sum_ms += ms
+        self.buckets[bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding quantile q (None if empty or in the open bucket)."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKET_BOUNDS_MS, self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum_ms / self.count, 3) if self.count else None,
+            "p50_ms": self.quantile(0.5),
+            "p90_ms": self.quantile(0.9),
+            "p99_ms": self.quantile(0.99),
+            "buckets": dict(zip([*map(str, BUCKET_BOUNDS_MS), "+Inf"], self.buckets)),
+        }
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def record_timings(timings):
+    """Add every stage of a finished StageTimings to the process-wide histograms."""
+    with _histograms_lock:
+        for stage, ms in timings.stages.items():
+            histogram = _histograms.get(stage)
+            if histogram is None:
+                histogram = _histograms[stage] = Histogram()
+            histogram.record(ms)
+
+
+def histograms():
+    """Copy of {stage: Histogram} for exporters."""
+    with _histograms_lock:
+        result = {}
+        for stage, histogram in _histograms.items():
+            copy = result[stage] = Histogram()
+            copy.count, copy.sum_ms, copy.buckets = histogram.count, histogram.sum_ms, list(histogram.buckets)
+        return result
+
+
+def histogram_snapshot():
+    """{stage: summary dict} of everything recorded so far in this process."""
+    return {stage: histogram.to_dict() for stage, histogram in histograms().items()}
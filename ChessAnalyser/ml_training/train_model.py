@@ -1,15 +1,23 @@
 # train_model.py
 import os
+import ast
 import chess
 import chess.pgn
 import pandas as pd
 import zstandard as zstd
 import io
+import multiprocessing.util
 import xgboost as xgb
 import json
 import joblib
 from tqdm import tqdm
-from feature_extraction import compute_features
+from feature_extraction import compute_feature_vector, DEFAULT_COLUMNS, base_target, fast_target, with_fast_feature_sets
+from feature_vector import column_index
+from game_buckets import average_elo, categorize_elo, categorize_time_control
+from engine_replay import open_engine
+from model_bundle import ELO_RANGES, build_bundle
+from move_evals import MoveEvals
+from pgn_index import load_pgn_index
 from sklearn.metrics import mean_squared_error, r2_score
 from sklearn.model_selection import train_test_split, RandomizedSearchCV
 import numpy as np
@@ -22,36 +30,34 @@ warnings.filterwarnings("ignore", category=UserWarning)
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 FEATURE_SETS_PATH = os.path.join(SCRIPT_DIR, "feature_sets.json")
 with open(FEATURE_SETS_PATH, "r") as f:
-    FEATURE_SETS = json.load(f)
+    FEATURE_SETS = with_fast_feature_sets(json.load(f))
 
-STOCKFISH_PATH = os.path.join(SCRIPT_DIR, "..", "stockfish-windows-x86-64-avx2.exe")
+# $STOCKFISH_PATH may name another engine binary, or a *.replay file to re-derive features from recorded searches
+# (record one by running with $STOCKFISH_RECORD=<file>.replay; see engine_replay.py)
+STOCKFISH_PATH = os.environ.get("STOCKFISH_PATH", os.path.join(SCRIPT_DIR, "..", "stockfish-windows-x86-64-avx2.exe"))
 DATA_PATH = os.path.join(SCRIPT_DIR, "data", "lichess_data.zst")
 FEATURES_CSV = os.path.join(SCRIPT_DIR, "features.csv")
+# First game the next run has to read: games dropped for the Elo quota are read again once others fill up
+RESUME_PATH = os.path.join(SCRIPT_DIR, "features_resume.json")
 MODEL_DIR = os.path.join(SCRIPT_DIR, "elo_models")
 os.makedirs(MODEL_DIR, exist_ok=True)
 
 MAX_GAMES = 5000
+# Cap per Elo range, so the common 1400-2000 games don't crowd out the rest
+MAX_GAMES_PER_ELO_RANGE = 1000
+# Time controls models are trained for; other games are dropped on their headers
+TRAINED_TIME_CONTROLS = ["blitz", "rapid_classical"]
 N_CORES = 6
+# Games are analyzed in ranges of at most this many plies, so a long game doesn't become a straggler
+CHUNK_PLIES = 40
 DEPTH = 6
 MATE_SCORE1 = 40000
 
-# --- Functions ---
-def categorize_time_control(game_headers):
-    if "TimeControl" not in game_headers:
-        return "unknown"
-    tc = game_headers["TimeControl"]
-    try:
-        tc = int(tc.split("+")[0])
-    except ValueError:
-        return "unknown"
-
-    if tc < 180:
-        return "bullet"
-    elif tc < 600:
-        return "blitz"
-    else:
-        return "rapid_classical"
+# Numeric feature columns written to features.csv, and where they sit in a FeatureVector
+DEFAULT_FEATURE_COLUMNS = [c for c in DEFAULT_COLUMNS if c != "move_evals"]
+DEFAULT_FEATURE_INDEX = column_index(DEFAULT_FEATURE_COLUMNS)
 
+# --- Functions ---
 def eval_change_score(eval_list_json, move_index, lookahead=20):
     eval_list = json.loads(eval_list_json)
     current_eval = eval_list[move_index]
@@ -60,105 +66,161 @@ def eval_change_score(eval_list_json, move_index, lookahead=20):
     eval_diff = future_eval - current_eval
     return float(1 / (1 + abs(eval_diff) / 100))
 
-def categorize_elo(avg_elo):
-    if avg_elo is None:
-        return "unknown"
-    if avg_elo < 800:
-        return "800-"
-    elif avg_elo <= 1100:
-        return "800-1100"
-    elif avg_elo <= 1400:
-        return "1100-1400"
-    elif avg_elo <= 1600:
-        return "1400-1600"
-    elif avg_elo <= 1800:
-        return "1600-1800"
-    elif avg_elo <= 2000:
-        return "1800-2000"
-    elif avg_elo <= 2200:
-        return "2000-2200"
-    else:
-        return "2200+"
-
-def process_game(game_data):
-    """Analyze a single game with its own Stockfish engine."""
-    game_index, game_text = game_data
+# --- Worker process state: one engine per worker for the whole run ---
+_worker_engine = None
+
+def init_worker():
+    global _worker_engine
+    _worker_engine = open_engine(STOCKFISH_PATH)
+    # Quit the engine when the worker exits
+    multiprocessing.util.Finalize(None, _worker_engine.quit, exitpriority=10)
+
+def split_game(game_index, game_text, n_plies, chunk_plies=CHUNK_PLIES):
+    """(game_index, game_text, first_ply, last_ply) ranges of at most chunk_plies plies covering one game"""
+    return [(game_index, game_text, first, min(first + chunk_plies, n_plies)) for first in range(0, n_plies, chunk_plies)]
+
+def process_plies(chunk, engine=None):
+    """
+    Analyze plies first_ply..last_ply - 1 of a game given as (game_index, game_text, first_ply, last_ply),
+    last_ply None meaning to the end. Returns one DataFrame row per position without the game-wide
+    eval_list, which stitch_game() adds once every range of the game is in; None if the game is not
+    used for training. Uses the given engine, else the worker's, else starts its own.
+    """
+    game_index, game_text, first_ply, last_ply = chunk
     import chess
     import chess.pgn
     import chess.engine
     import io
-    import json
-    from feature_extraction import compute_features
+    from feature_extraction import compute_feature_vector
+
+    engine = engine or _worker_engine
+    if engine is None:
+        with open_engine(STOCKFISH_PATH) as engine:
+            return process_plies(chunk, engine)
 
     board = chess.Board()
+    vectors = []
+    move_evals = []
     game_positions = []
-    eval_list = []
 
     game = chess.pgn.read_game(io.StringIO(game_text))
     if game is None:
-        return []
-
-    with chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH) as engine:
-        avg_elo = None
-        if "WhiteElo" in game.headers and "BlackElo" in game.headers:
-            try:
-                white_elo = int(game.headers["WhiteElo"])
-                black_elo = int(game.headers["BlackElo"])
-                avg_elo = (white_elo + black_elo) / 2
-            except ValueError:
-                avg_elo = None
-
-        if avg_elo is None:
-            return []
-
-        time_control = categorize_time_control(game.headers)
-        if time_control == "bullet":
-            return []
-
-        for move in game.mainline_moves():
-            info = engine.analyse(board, chess.engine.Limit(depth=DEPTH))
-            eval_score = info["score"].pov(board.turn).score(mate_score=MATE_SCORE1)
-            eval_list.append(eval_score)
-
-            features = compute_features(board, engine)
-            human_move = move.uci()
-            features.update({
-                "human_move": human_move,
-                "game_number": game_index,
-                "eval_score": eval_score,
-                "avg_elo": avg_elo,
-                "time_control": time_control
-            })
-
-            # --- Move ease label ---
-            best_move = info["pv"][0] if "pv" in info else None
-            if best_move is not None:
-                # Evaluate after the human move
-                board.push(move)
-                info_human = engine.analyse(board, chess.engine.Limit(depth=DEPTH))
-                eval_human = info_human["score"].pov(board.turn).score(mate_score=MATE_SCORE1)
-                board.pop()
-
-                # Evaluate after Stockfish's best move
-                board.push(best_move)
-                info_best = engine.analyse(board, chess.engine.Limit(depth=DEPTH))
-                eval_best = info_best["score"].pov(board.turn).score(mate_score=MATE_SCORE1)
-                board.pop()
-
-                # Difference between the two resulting positions
-                diff = abs(eval_best - eval_human)
-                move_ease = 1 / (1 + diff / 100)
-            else:
-                move_ease = 0.5
-
-            features["label_move_ease"] = move_ease
-            game_positions.append(features)
-            board.push(move)  # finally play the human move
-
-        for pos_features in game_positions:
-            pos_features["eval_list"] = json.dumps(eval_list)
-
-    return game_positions
+        return None
+
+    avg_elo = average_elo(game.headers)
+    if avg_elo is None:
+        return None
+
+    time_control = categorize_time_control(game.headers)
+    if time_control == "bullet":
+        return None
+
+    for ply, move in enumerate(game.mainline_moves()):
+        if last_ply is not None and ply >= last_ply:
+            break
+        if ply < first_ply:
+            board.push(move)
+            continue
+
+        info = engine.analyse(board, chess.engine.Limit(depth=DEPTH))
+        eval_score = info["score"].pov(board.turn).score(mate_score=MATE_SCORE1)
+
+        vector = compute_feature_vector(board, engine)
+        vectors.append(vector.values)
+        move_evals.append(vector.move_evals.to_text())
+        human_move = move.uci()
+        features = {
+            "human_move": human_move,
+            "game_number": game_index,
+            "eval_score": eval_score,
+            "avg_elo": avg_elo,
+            "time_control": time_control
+        }
+
+        # --- Move ease label ---
+        best_move = info["pv"][0] if "pv" in info else None
+        if best_move is not None:
+            # Evaluate after the human move
+            board.push(move)
+            info_human = engine.analyse(board, chess.engine.Limit(depth=DEPTH))
+            eval_human = info_human["score"].pov(board.turn).score(mate_score=MATE_SCORE1)
+            board.pop()
+
+            # Evaluate after Stockfish's best move
+            board.push(best_move)
+            info_best = engine.analyse(board, chess.engine.Limit(depth=DEPTH))
+            eval_best = info_best["score"].pov(board.turn).score(mate_score=MATE_SCORE1)
+            board.pop()
+
+            # Difference between the two resulting positions
+            diff = abs(eval_best - eval_human)
+            move_ease = 1 / (1 + diff / 100)
+        else:
+            move_ease = 0.5
+
+        features["label_move_ease"] = move_ease
+        game_positions.append(features)
+        board.push(move)  # finally play the human move
+
+    if not game_positions:
+        return None
+
+    # Feature columns come straight from the stacked float32 vectors
+    df_game = pd.DataFrame(np.vstack(vectors)[:, DEFAULT_FEATURE_INDEX], columns=DEFAULT_FEATURE_COLUMNS)
+    df_game["move_evals"] = move_evals
+    return pd.concat([df_game, pd.DataFrame(game_positions)], axis=1)
+
+def stitch_game(parts):
+    """
+    One game's rows from its ply-range results in ply order, with the eval_list the
+    position quality label looks ahead in; None if the game is not used for training.
+    """
+    if not parts or any(part is None for part in parts):
+        return None
+    df_game = pd.concat(parts, ignore_index=True)
+    df_game["eval_list"] = json.dumps(df_game["eval_score"].tolist())
+    return df_game
+
+def process_game(game_data):
+    """Analyze a single game with its own Stockfish engine; returns one DataFrame row per position."""
+    game_index, game_text = game_data
+    return stitch_game([process_plies((game_index, game_text, 0, None))])
+
+
+# Why header_verdict() dropped a game
+DROP_REASONS = ("no_elo", "time_control", "elo_quota")
+
+def header_verdict(game_headers, taken):
+    """The game's Elo range if it should be analyzed, otherwise one of DROP_REASONS"""
+    avg_elo = average_elo(game_headers)
+    if avg_elo is None:
+        return "no_elo"
+    if categorize_time_control(game_headers) not in TRAINED_TIME_CONTROLS:
+        return "time_control"
+    elo_range = categorize_elo(avg_elo)
+    if taken.get(elo_range, 0) >= MAX_GAMES_PER_ELO_RANGE:
+        return "elo_quota"
+    return elo_range
+
+class PrefilterBuilder(chess.pgn.GameBuilder):
+    """
+    GameBuilder that decides from the headers alone whether a game is worth parsing.
+    With it read_game() returns (game, verdict): dropped games come back as
+    (None, reason) and their movetext is skipped without parsing any move.
+    `taken` counts the games already kept per Elo range, for the quotas.
+    """
+
+    def __init__(self, taken):
+        super().__init__()
+        self.taken = taken
+        self.verdict = None
+
+    def end_headers(self):
+        self.verdict = header_verdict(self.game.headers, self.taken)
+        return chess.pgn.SKIP if self.verdict in DROP_REASONS else None
+
+    def result(self):
+        return (None if self.verdict in DROP_REASONS else self.game), self.verdict
 
 
 # -------------------- MAIN SCRIPT --------------------
@@ -168,46 +230,111 @@ if __name__ == "__main__":
     warnings.filterwarnings("ignore", category=UserWarning)
 
     # --- Load already processed features ---
+    done_games = set()
     if os.path.exists(FEATURES_CSV):
         df_features = pd.read_csv(FEATURES_CSV)
         if "game_number" in df_features.columns:
             df_features["game_number"] = pd.to_numeric(df_features["game_number"], errors="coerce")
             processed_games = int(df_features["game_number"].max())
+            done_games = set(df_features["game_number"].dropna().astype(int))
         else:
             processed_games = 0
     else:
         df_features = pd.DataFrame()
         processed_games = 0
 
-    print(f"Already processed games: {processed_games}")
-
-    # --- Read games into memory ---
+    # Resume at the first game a previous run dropped for the Elo quota (or did not reach);
+    # without a record of that, after the last processed game
+    resume_from = processed_games + 1
+    if done_games and os.path.exists(RESUME_PATH):
+        with open(RESUME_PATH, "r") as f:
+            resume_from = json.load(f)["resume_from"]
+
+    # --- Repack the top_moves/evals_dict text columns of older feature files ---
+    if "evals_dict" in df_features.columns:
+        repacked = df_features["evals_dict"].map(
+            lambda d: MoveEvals.from_dict(ast.literal_eval(d)).to_text() if isinstance(d, str) else None)
+        if "move_evals" in df_features.columns:
+            repacked = df_features["move_evals"].fillna(repacked)
+        df_features["move_evals"] = repacked
+        df_features = df_features.drop(columns=[c for c in ("top_moves", "evals_dict") if c in df_features.columns])
+
+    print(f"Already processed games: {processed_games}, resuming at game {resume_from}")
+
+    # --- Read games into memory, filtering on headers before any move is parsed ---
     games_to_process = []
-    with open(DATA_PATH, "rb") as f:
-        dctx = zstd.ZstdDecompressor()
-        stream = dctx.stream_reader(f)
-        text_stream = io.TextIOWrapper(stream, encoding="utf-8")
+    taken = {}
+    dropped = dict.fromkeys(DROP_REASONS, 0)
+    first_quota_dropped = None
+    pgn_index = load_pgn_index(DATA_PATH)
+    if pgn_index is not None:
+        # Seekable archive (pgn_index.py build): start right at the first game to read
+        text_stream = pgn_index.open_text(resume_from)
+        current_game_index = min(resume_from - 1, len(pgn_index))
+    else:
+        text_stream = io.TextIOWrapper(zstd.ZstdDecompressor().stream_reader(open(DATA_PATH, "rb"), closefd=True),
+                                       encoding="utf-8")
         current_game_index = 0
 
+        # Games before it are skipped unparsed
+        while current_game_index < resume_from - 1 and chess.pgn.skip_game(text_stream):
+            current_game_index += 1
+
+    with text_stream:
         while len(games_to_process) < MAX_GAMES:
-            game = chess.pgn.read_game(text_stream)
-            if game is None:
+            if all(taken.get(elo_range, 0) >= MAX_GAMES_PER_ELO_RANGE for elo_range in ELO_RANGES):
+                break
+            if current_game_index + 1 in done_games:
+                # Already in features.csv (reached again while re-reading quota-dropped games)
+                if not chess.pgn.skip_game(text_stream):
+                    break
+                current_game_index += 1
+                continue
+            read = chess.pgn.read_game(text_stream, Visitor=lambda: PrefilterBuilder(taken))
+            if read is None:
                 break
             current_game_index += 1
-            if current_game_index <= processed_games:
+            game, verdict = read
+            if game is None:
+                dropped[verdict] += 1
+                if verdict == "elo_quota" and first_quota_dropped is None:
+                    first_quota_dropped = current_game_index
                 continue
-            games_to_process.append((current_game_index, str(game)))
+            taken[verdict] = taken.get(verdict, 0) + 1
+            games_to_process.append((current_game_index, str(game), sum(1 for _ in game.mainline_moves())))
+
+    print(f"Kept {len(games_to_process)} games {taken}, dropped on headers: {dropped}")
+
+    # --- Split games into ply ranges; longest first, so the last ones to finish are short ---
+    chunks = [chunk for game_index, game_text, n_plies in games_to_process
+              for chunk in split_game(game_index, game_text, n_plies)]
+    chunks.sort(key=lambda chunk: chunk[3] - chunk[2], reverse=True)
+    chunks_per_game = {}
+    for chunk in chunks:
+        chunks_per_game[chunk[0]] = chunks_per_game.get(chunk[0], 0) + 1
 
     # --- Run parallel Stockfish analysis ---
+    # Idle workers pull the next range from the executor's shared queue, each with its own engine
     positions = []
-    with ProcessPoolExecutor(max_workers=N_CORES) as executor:
-        futures = [executor.submit(process_game, g) for g in games_to_process]
-        for f in tqdm(as_completed(futures), total=len(futures), desc="Processing games"):
-            positions.extend(f.result())
+    game_parts = {}
+    with ProcessPoolExecutor(max_workers=N_CORES, initializer=init_worker) as executor:
+        futures = {executor.submit(process_plies, chunk): chunk for chunk in chunks}
+        with tqdm(total=sum(n_plies for _, _, n_plies in games_to_process), unit="ply",
+                  desc="Processing positions") as progress:
+            for f in as_completed(futures):
+                game_index, _, first_ply, last_ply = futures[f]
+                parts = game_parts.setdefault(game_index, {})
+                parts[first_ply] = f.result()
+                progress.update(last_ply - first_ply)
+                if len(parts) == chunks_per_game[game_index]:
+                    df_game = stitch_game([parts[ply] for ply in sorted(parts)])
+                    del game_parts[game_index]
+                    if df_game is not None:
+                        positions.append(df_game)
 
     # --- Append new features ---
     if positions:
-        df_new = pd.DataFrame(positions)
+        df_new = pd.concat(positions, ignore_index=True)
         if not df_features.empty:
             df_features = pd.concat([df_features, df_new], ignore_index=True)
         else:
@@ -215,6 +342,10 @@ if __name__ == "__main__":
         df_features.to_csv(FEATURES_CSV, index=False)
         print(f"Features saved to {FEATURES_CSV}, total games now: {df_features['game_number'].max()}")
 
+    # The next run starts at the first game dropped for the quota, or else where this one stopped reading
+    with open(RESUME_PATH, "w") as f:
+        json.dump({"resume_from": first_quota_dropped or current_game_index + 1}, f)
+
     # --- Compute position quality labels ---
     df_features["move_index"] = df_features.groupby("game_number").cumcount()
     df_features["label_position_quality"] = [
@@ -225,8 +356,10 @@ if __name__ == "__main__":
 
     # --- Training models ---
     targets = ["label_position_quality", "label_move_ease"]
+    # Fast-tier companions: the same labels, predicted from the static features only
+    targets += [fast_target(target) for target in targets]
     elo_ranges = df_features["elo_range"].unique()
-    time_controls = ["blitz", "rapid_classical"]
+    time_controls = TRAINED_TIME_CONTROLS
 
     model_metrics = {}
 
@@ -242,7 +375,7 @@ if __name__ == "__main__":
             for target in targets:
                 feature_cols = FEATURE_SETS.get(elo_range, {}).get(target, FEATURE_SETS["default"][target])
                 X = df_range[feature_cols].select_dtypes(include=[np.number]).fillna(0)
-                y = df_range[target]
+                y = df_range[base_target(target)]
                 X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=0.2, random_state=42)
 
                 param_grid = {
@@ -301,5 +434,9 @@ if __name__ == "__main__":
     with open(os.path.join(MODEL_DIR, "model_metrics.json"), "w") as f:
         json.dump(model_metrics, f, indent=2)
 
+    # --- Rebuild the single-file model bundle ---
+    n_bundled = build_bundle(MODEL_DIR)
+    print(f"Bundled {n_bundled} models into {os.path.join(MODEL_DIR, 'models.bundle')}")
+
     print("\n--- Training complete ---")
     print("Model metrics:", model_metrics)
@@ -0,0 +1,89 @@
+# startup_profile.py
+"""
+Cold-start profiling for the wrapper's --profile-startup flag.
+
+ImportProfiler sits first on sys.meta_path and times every module that is
+executed while it is installed. Time is attributed to the module's top-level
+package as self time (nested imports of other packages are subtracted), so the
+per-package numbers add up to the total import time.
+"""
+import sys
+import time
+
+
+class _TimedLoader:
+    """Wraps a module's loader to time create_module/exec_module."""
+
+    def __init__(self, profiler, loader):
+        self._profiler = profiler
+        self._loader = loader
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        create = getattr(self._loader, "create_module", None)
+        if create is None:
+            return None
+        # Extension modules do most of their work (loading the shared library) here
+        return self._profiler.timed(spec.name, create, spec)
+
+    def exec_module(self, module):
+        return self._profiler.timed(module.__name__, self._loader.exec_module, module)
+
+
+class ImportProfiler:
+    def __init__(self):
+        self.self_times = {}
+        self.total = 0.0
+        self._stack = []
+        self._finding = False
+
+    # --- Meta path hook ---
+    def find_spec(self, name, path, target=None):
+        if self._finding:
+            return None
+        self._finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                        spec.loader = _TimedLoader(self, spec.loader)
+                    return spec
+            return None
+        finally:
+            self._finding = False
+
+    def timed(self, name, func, arg):
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return func(arg)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            root = name.partition(".")[0]
+            self.self_times[root] = self.self_times.get(root, 0.0) + elapsed - children
+            if self._stack:
+                self._stack[-1] += elapsed
+            else:
+                self.total += elapsed
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def report(self, min_ms=1.0):
+        """{package: self time in ms} for packages above min_ms, slowest first, plus the total."""
+        imports = {
+            root: round(seconds * 1000, 1)
+            for root, seconds in sorted(self.self_times.items(), key=lambda item: -item[1])
+            if seconds * 1000 >= min_ms
+        }
+        return {"import_total_ms": round(self.total * 1000, 1), "imports_ms": imports}
@@ -3,45 +3,15 @@ import tkinter as tk
 from PIL import Image, ImageTk
 import os
 import chess
-import chess.engine
-import pandas as pd
-import joblib
-import json
-import threading
-from ml_training.feature_extraction import compute_features
+from analysis_worker import AnalysisWorker
 
 # --- Paths ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-MODEL_DIR = os.path.join(SCRIPT_DIR, "ml_training", "elo_models")
-METRICS_FILE = os.path.join(MODEL_DIR, "model_metrics.json")
-FEATURE_SETS_FILE = os.path.join(SCRIPT_DIR, "ml_training", "feature_sets.json")
 STOCKFISH_PATH = os.path.join(SCRIPT_DIR, "..", "stockfish-windows-x86-64-avx2.exe")
 PIECE_PATH = os.path.join(SCRIPT_DIR, "pieces")  # PNG images: wP.png, bK.png, etc.
 
-# Load metrics and feature sets
-with open(METRICS_FILE, "r") as f:
-    model_metrics = json.load(f)
-with open(FEATURE_SETS_FILE, "r") as f:
-    FEATURE_SETS = json.load(f)
-
-
-def categorize_elo(avg_elo):
-    if avg_elo < 800:
-        return "800-"
-    elif avg_elo <= 1100:
-        return "800-1100"
-    elif avg_elo <= 1400:
-        return "1100-1400"
-    elif avg_elo <= 1600:
-        return "1400-1600"
-    elif avg_elo <= 1800:
-        return "1600-1800"
-    elif avg_elo <= 2000:
-        return "1800-2000"
-    elif avg_elo <= 2200:
-        return "2000-2200"
-    else:
-        return "2200+"
+# How often the main loop checks the analysis worker for results
+ANALYSIS_POLL_MS = 50
 
 
 # Set modern dark theme
@@ -69,9 +39,25 @@ class ChessAnalyserUI(ctk.CTk):
         self.create_sidebar()
         self.create_main_content_area()
 
+        # Analysis runs in a worker process; results are polled from the main loop
+        self.analysis_worker = AnalysisWorker(STOCKFISH_PATH)
+        self.after(ANALYSIS_POLL_MS, self.poll_analysis)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
         # Initialize with home page
         self.show_page("home")
 
+    def poll_analysis(self):
+        """Deliver worker messages to the current page, on the Tk main thread"""
+        for request_id, kind, payload in self.analysis_worker.poll():
+            if isinstance(self.current_page, HomePage):
+                self.current_page.on_analysis_message(request_id, kind, payload)
+        self.after(ANALYSIS_POLL_MS, self.poll_analysis)
+
+    def on_close(self):
+        self.analysis_worker.close()
+        self.destroy()
+
     def create_sidebar(self):
         """Create modern navigation sidebar"""
         self.sidebar_frame = ctk.CTkFrame(self, corner_radius=0, width=200,
@@ -166,9 +152,12 @@ class HomePage(ctk.CTkFrame):
         self.selected_square = None
         self.last_move = None
         self.piece_images = {}
+        self.square_items = {}  # square -> canvas ids, created once by create_board_items()
+        self.rendered = {}  # square -> (color, legal target, piece) currently on the canvas
         self.move_history = []
         self.redo_stack = []
         self.is_analyzing = False
+        self.pending_request_id = None
 
         self.setup_home_page()
 
@@ -199,6 +188,7 @@ class HomePage(ctk.CTkFrame):
                                       bg="#F8F9FA", highlightthickness=0, relief='flat')
         self.board_canvas.pack(padx=12, pady=12)
         self.board_canvas.bind("<Button-1>", self.on_square_click)
+        self.load_piece_images()
 
         # Modern control buttons
         self.control_buttons_frame = ctk.CTkFrame(self.board_frame, fg_color="transparent")
@@ -352,6 +342,7 @@ class HomePage(ctk.CTkFrame):
         self.move_history.clear()
         self.redo_stack.clear()
         self.is_analyzing = False
+        self.pending_request_id = None
         self.draw_board()
         self.result_text.delete("0.0", tk.END)
         self.fen_entry.delete(0, tk.END)
@@ -385,9 +376,7 @@ class HomePage(ctk.CTkFrame):
         self.redo_stack.clear()
         self.draw_board()
 
-        # Disable analyze button during analysis
-        self.analyse_button.configure(state="disabled", text="🔄 Analyzing...")
-        threading.Thread(target=self.run_analysis, daemon=True).start()
+        self.start_analysis()
 
     # --- Click-to-move ---
     def on_square_click(self, event):
@@ -431,8 +420,7 @@ class HomePage(ctk.CTkFrame):
                 self.selected_square = None
                 self.draw_board()
                 self.update_status(f"Move played: {move}", "info")
-                self.analyse_button.configure(state="disabled", text="🔄 Analyzing...")
-                threading.Thread(target=self.run_analysis, daemon=True).start()
+                self.start_analysis()
             else:
                 # If invalid move, deselect the piece
                 self.selected_square = None
@@ -451,8 +439,7 @@ class HomePage(ctk.CTkFrame):
             self.last_move = self.move_history[-1] if self.move_history else None
             self.draw_board()
             self.update_status(f"Undid move: {move}", "info")
-            self.analyse_button.configure(state="disabled", text="🔄 Analyzing...")
-            threading.Thread(target=self.run_analysis, daemon=True).start()
+            self.start_analysis()
         else:
             self.update_status("No moves to undo", "info")
 
@@ -468,14 +455,24 @@ class HomePage(ctk.CTkFrame):
             self.last_move = move
             self.draw_board()
             self.update_status(f"Redid move: {move}", "info")
-            self.analyse_button.configure(state="disabled", text="🔄 Analyzing...")
-            threading.Thread(target=self.run_analysis, daemon=True).start()
+            self.start_analysis()
         else:
             self.update_status("No moves to redo", "info")
 
     # --- Draw Board ---
-    def draw_board(self):
-        self.board_canvas.delete("all")
+    def load_piece_images(self, size=60):
+        """Load and scale every piece image once, up front"""
+        for color in "wb":
+            for symbol in "PNBRQK":
+                filename = f"{color}{symbol}.png"
+                img_path = os.path.join(PIECE_PATH, filename)
+                if os.path.exists(img_path):
+                    self.piece_images[filename] = ImageTk.PhotoImage(
+                        Image.open(img_path).resize((size, size), Image.Resampling.LANCZOS)
+                    )
+
+    def create_board_items(self):
+        """Create every canvas item once; draw_board() only reconfigures them afterwards"""
         size = 60
         offset = 20  # Space for coordinates
 
@@ -496,93 +493,124 @@ class HomePage(ctk.CTkFrame):
                 font=("Segoe UI", 11, "normal")
             )
 
-        # Draw board squares
-        for r in range(8):
-            for c in range(8):
-                square = chess.square(c, 7 - r)
-                x1, y1 = offset + c * size, offset + r * size
-                x2, y2 = x1 + size, y1 + size
-
-                # Base colors - modern but visible
-                if (r + c) % 2 == 0:
-                    light_color = "#F0F9FF"  # Light squares - subtle blue tint
-                    selected_light = "#DBEAFE"  # Selected light - blue
-                else:
-                    light_color = "#E0E7FF"  # Dark squares - light indigo
-                    selected_light = "#C7D2FE"  # Selected dark - indigo
-
-                base_color = light_color
-
-                # Highlight last move - visible but modern
-                if self.last_move and (square == self.last_move.from_square or square == self.last_move.to_square):
-                    base_color = "#FEF08A" if (r + c) % 2 == 0 else "#FDE047"
-
-                # Highlight selected piece
-                if self.selected_square == square:
-                    base_color = selected_light
-
-                # Draw square without border for minimal look
-                self.board_canvas.create_rectangle(
-                    x1, y1, x2, y2,
-                    fill=base_color, outline=base_color, width=0
-                )
+        # Squares first, then legal move dots, then pieces, so the stacking order matches
+        positions = {}
+        for square in chess.SQUARES:
+            x1 = offset + chess.square_file(square) * size
+            y1 = offset + (7 - chess.square_rank(square)) * size
+            positions[square] = (x1, y1)
+            # Draw square without border for minimal look
+            self.square_items[square] = {
+                "rect": self.board_canvas.create_rectangle(x1, y1, x1 + size, y1 + size, width=0)
+            }
+
+        for square, (x1, y1) in positions.items():
+            # Modern legal move indicator, hidden until its square is a target
+            center_x, center_y = x1 + size // 2, y1 + size // 2
+            radius = 8
+            self.square_items[square]["dot"] = self.board_canvas.create_oval(
+                center_x - radius, center_y - radius,
+                center_x + radius, center_y + radius,
+                fill="#3B82F6", outline="#2563EB", width=2, state="hidden"
+            )
 
-                # Add legal move indicators for selected piece
-                if self.selected_square is not None:
-                    for move in self.board.legal_moves:
-                        if move.from_square == self.selected_square and move.to_square == square:
-                            # Draw modern legal move indicators
-                            center_x, center_y = x1 + size // 2, y1 + size // 2
-                            radius = 8
-                            self.board_canvas.create_oval(
-                                center_x - radius, center_y - radius,
-                                center_x + radius, center_y + radius,
-                                fill="#3B82F6", outline="#2563EB", width=2
-                            )
-
-        # Draw pieces
-        for square, piece in self.board.piece_map().items():
-            row = 7 - chess.square_rank(square)
-            col = chess.square_file(square)
-            x = offset + col * size
-            y = offset + row * size
-
-            filename = f"{piece.color and 'w' or 'b'}{piece.symbol().upper()}.png"
-            if filename not in self.piece_images:
-                img_path = os.path.join(PIECE_PATH, filename)
-                if os.path.exists(img_path):
-                    self.piece_images[filename] = ImageTk.PhotoImage(
-                        Image.open(img_path).resize((size, size), Image.Resampling.LANCZOS)
-                    )
-                else:
-                    # Fallback to text if image not found
-                    piece_text = piece.symbol().upper() if piece.color else piece.symbol().lower()
-                    self.board_canvas.create_text(
-                        x + size // 2, y + size // 2,
-                        text=piece_text, fill="black" if piece.color else "white",
-                        font=("Arial", 24, "bold")
-                    )
-                    continue
+        for square, (x1, y1) in positions.items():
+            self.square_items[square]["image"] = self.board_canvas.create_image(
+                x1, y1, anchor="nw", state="hidden")
+            # Fallback to text if image not found
+            self.square_items[square]["text"] = self.board_canvas.create_text(
+                x1 + size // 2, y1 + size // 2,
+                font=("Arial", 24, "bold"), state="hidden"
+            )
+
+    def square_color(self, square, highlighted):
+        r, c = 7 - chess.square_rank(square), chess.square_file(square)
+
+        # Base colors - modern but visible
+        if (r + c) % 2 == 0:
+            light_color = "#F0F9FF"  # Light squares - subtle blue tint
+            selected_light = "#DBEAFE"  # Selected light - blue
+        else:
+            light_color = "#E0E7FF"  # Dark squares - light indigo
+            selected_light = "#C7D2FE"  # Selected dark - indigo
+
+        # Highlight selected piece
+        if self.selected_square == square:
+            return selected_light
+        # Highlight last move - visible but modern
+        if square in highlighted:
+            return "#FEF08A" if (r + c) % 2 == 0 else "#FDE047"
+        return light_color
+
+    def draw_board(self):
+        """Bring the canvas in line with the board, updating only squares whose look changed"""
+        if not self.square_items:
+            self.create_board_items()
+
+        highlighted = set()
+        if self.last_move:
+            highlighted = {self.last_move.from_square, self.last_move.to_square}
+
+        # Legal move targets for the selected piece, computed once
+        targets = set()
+        if self.selected_square is not None:
+            targets = {move.to_square for move in
+                       self.board.generate_legal_moves(from_mask=chess.BB_SQUARES[self.selected_square])}
+
+        pieces = self.board.piece_map()
+        for square in chess.SQUARES:
+            state = (self.square_color(square, highlighted), square in targets, pieces.get(square))
+            if self.rendered.get(square) == state:
+                continue
+            previous = self.rendered.get(square, (None, None, None))
+            self.rendered[square] = state
+            color, is_target, piece = state
+            items = self.square_items[square]
+
+            if color != previous[0]:
+                self.board_canvas.itemconfigure(items["rect"], fill=color, outline=color)
+            if is_target != previous[1]:
+                self.board_canvas.itemconfigure(items["dot"], state="normal" if is_target else "hidden")
+            if piece != previous[2]:
+                self.draw_piece(items, piece)
+
+    def draw_piece(self, items, piece):
+        if piece is None:
+            self.board_canvas.itemconfigure(items["image"], state="hidden")
+            self.board_canvas.itemconfigure(items["text"], state="hidden")
+            return
 
-            self.board_canvas.create_image(x, y, anchor="nw", image=self.piece_images[filename])
+        filename = f"{piece.color and 'w' or 'b'}{piece.symbol().upper()}.png"
+        if filename in self.piece_images:
+            self.board_canvas.itemconfigure(items["image"], image=self.piece_images[filename], state="normal")
+            self.board_canvas.itemconfigure(items["text"], state="hidden")
+        else:
+            piece_text = piece.symbol().upper() if piece.color else piece.symbol().lower()
+            self.board_canvas.itemconfigure(items["image"], state="hidden")
+            self.board_canvas.itemconfigure(items["text"], text=piece_text,
+                                            fill="black" if piece.color else "white", state="normal")
 
     # --- Analysis ---
-    def run_analysis(self):
+    def start_analysis(self):
+        """Send the current position to the analysis worker; only the latest request is shown"""
         self.is_analyzing = True
+        # Disable analyze button during analysis
+        self.analyse_button.configure(state="disabled", text="🔄 Analyzing...")
         self.update_status("🔍 Starting analysis...", "loading")
+        self.pending_request_id = self.main_app.analysis_worker.submit(
+            self.board.fen(), self.main_app.default_elo, self.time_var.get())
 
-        try:
-            avg_elo = self.main_app.default_elo  # Use default from settings
-            time_control = self.time_var.get()
-            elo_range = categorize_elo(avg_elo)
-
-            self.update_status("⚙️ Computing position features...", "loading")
-
-            with chess.engine.SimpleEngine.popen_uci(STOCKFISH_PATH) as engine:
-                features = compute_features(self.board, engine)
+    def on_analysis_message(self, request_id, kind, payload):
+        """Handle a worker message; called on the Tk main thread"""
+        if request_id != self.pending_request_id:
+            return  # superseded by a newer position
 
-            self.update_status("🧠 Running ML predictions...", "loading")
+        if kind == "status":
+            message, status_type = payload
+            self.update_status(message, status_type)
+            return
 
+        if kind == "result":
             targets = [("label_position_quality", "Position Quality"),
                        ("label_move_ease", "Move Ease")]
             results = []
@@ -591,22 +619,12 @@ class HomePage(ctk.CTkFrame):
 
             analysis_found = False
             for target, label_name in targets:
-                feature_cols = FEATURE_SETS.get(elo_range, {}).get(target, FEATURE_SETS["default"][target])
-                X = pd.DataFrame([{k: features[k] for k in feature_cols}])
-                model_path = os.path.join(MODEL_DIR, f"model_{elo_range}_{time_control}_{target}.pkl")
-
-                if not os.path.exists(model_path):
+                predicted_score = payload.get(target)
+                if predicted_score is None:
                     results.append(f"{label_name}: No model available\n")
                     continue
 
                 analysis_found = True
-                model = joblib.load(model_path)
-                predicted_score = model.predict(X)[0]
-
-                metrics = model_metrics.get(elo_range, {}).get(time_control, {}).get(target, {})
-                rmse = metrics.get("rmse", None)
-                certainty = max(0.0, 1.0 - rmse) if rmse else 0.0
-
                 result_line = f"{label_name}: {predicted_score:.3f}\n"
                 results.append(result_line)
 
@@ -615,25 +633,19 @@ class HomePage(ctk.CTkFrame):
             else:
                 self.update_status("No models available", "error")
                 results.append("No models found for this configuration\n")
-
-        except ValueError as e:
-            error_msg = "Invalid Elo rating"
-            results = [error_msg]
-            self.update_status("Invalid input", "error")
-
-        except Exception as e:
-            error_msg = f"Analysis failed: {str(e)}"
+        else:
+            error_msg, status_msg = payload
             results = [error_msg]
-            self.update_status("Analysis failed", "error")
+            self.update_status(status_msg, "error")
 
-        finally:
-            self.is_analyzing = False
-            # Re-enable analyze button
-            self.analyse_button.configure(state="normal", text="📊 Analyze Position")
+        self.is_analyzing = False
+        self.pending_request_id = None
+        # Re-enable analyze button
+        self.analyse_button.configure(state="normal", text="📊 Analyze Position")
 
-            # Update results display
-            self.result_text.delete("0.0", tk.END)
-            self.result_text.insert(tk.END, "".join(results))
+        # Update results display
+        self.result_text.delete("0.0", tk.END)
+        self.result_text.insert(tk.END, "".join(results))
 
 
 class SettingsPage(ctk.CTkFrame):